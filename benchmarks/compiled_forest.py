@@ -0,0 +1,79 @@
+""" Benchmark the compiled forest against the sklearn forest it was compiled from.
+
+Run as a module from the repository root, after training: python -m benchmarks.compiled_forest
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import pickle
+import time
+from typing import Callable
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.compiled_forest import CompiledForest, compiled_forest_path
+from src.preprocessing import Preprocessor, preprocessor_path
+from src.train import BASE_DIR, MODEL_PATH
+
+
+def latency_ms(function: Callable[[np.ndarray], np.ndarray], features: np.ndarray, iterations: int) -> np.ndarray:
+    """ Latency of repeated calls.
+
+    :param function: prediction function
+    :param features: features given at each call
+    :param iterations: number of measured calls
+    :return: latencies in milliseconds
+    """
+    function(features)
+    latencies = np.empty(iterations)
+    for iteration in range(iterations):
+        start = time.perf_counter()
+        function(features)
+        latencies[iteration] = time.perf_counter() - start
+    return latencies * 1000
+
+
+def main() -> None:
+    """ Print latency, throughput, footprint and load time of both forests.
+    :return: None
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument("--iterations", default=200, type=int)
+    argument = parser.parse_args()
+
+    start = time.perf_counter()
+    forest = joblib.load(argument.model_path)
+    sklearn_load = time.perf_counter() - start
+    forest_path = compiled_forest_path(argument.model_path)
+    start = time.perf_counter()
+    compiled = CompiledForest.load(forest_path)
+    compiled_load = time.perf_counter() - start
+
+    test_df = pd.read_csv(os.path.join(BASE_DIR, "data", "test_df.csv"), index_col=0)
+    features = Preprocessor.load(preprocessor_path(argument.model_path)).transform(test_df).to_numpy()
+    assert np.array_equal(forest.predict_proba(features), compiled.predict_proba(features)), "Predictions differ"
+
+    print(f"{'':<28}{'sklearn':>12}{'compiled':>12}")
+    print(f"{'file size MB':<28}{os.path.getsize(argument.model_path) / 1e6:>12.1f}"
+          f"{os.path.getsize(forest_path) / 1e6:>12.1f}")
+    print(f"{'in-memory size MB':<28}{len(pickle.dumps(forest)) / 1e6:>12.1f}{compiled.nbytes / 1e6:>12.1f}")
+    print(f"{'load time ms':<28}{sklearn_load * 1000:>12.1f}{compiled_load * 1000:>12.1f}")
+    for rows in [1, 64]:
+        for stat in ["p50", "p99"]:
+            values = [
+                np.percentile(latency_ms(predict, features[:rows], argument.iterations), int(stat[1:]))
+                for predict in (forest.predict, compiled.predict)
+            ]
+            print(f"{f'{rows} rows {stat} ms':<28}{values[0]:>12.3f}{values[1]:>12.3f}")
+    values = [
+        len(features) / latency_ms(predict, features, 5).mean() * 1000 for predict in (forest.predict, compiled.predict)
+    ]
+    print(f"{f'{len(features)} rows, rows/s':<28}{values[0]:>12.0f}{values[1]:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
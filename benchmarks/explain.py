@@ -0,0 +1,63 @@
+""" Benchmark explanations of the trained model against its predictions, for one client and for batches.
+
+Run as a module from the repository root: python -m benchmarks.explain --rows 1,64,1000
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Callable, List
+
+import numpy as np
+
+from benchmarks.load_generator import load_clients
+from src.artifacts import load_explainer, load_model
+from src.inference import explain_fields, score_fields
+from src.prediction_cache import PredictionCache
+
+
+def seconds(function: Callable[[], object], repeat: int) -> float:
+    """ Median duration of repeated calls.
+
+    :param function: function to call
+    :param repeat: number of calls
+    :return: seconds
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        durations.append(time.perf_counter() - start)
+    return float(np.median(durations))
+
+
+def main() -> None:
+    """ Print time per call of predictions, explanations and cached explanations.
+    :return: None
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", default="1,64,1000", help="clients per call, comma separated")
+    parser.add_argument("--repeat", default=50, type=int)
+    argument = parser.parse_args()
+
+    model = load_model()
+    start = time.perf_counter()
+    explainer = load_explainer(model)
+    print(f"path statistics: {time.perf_counter() - start:.3f} s, {explainer.nbytes / 2 ** 20:.1f} MB")
+
+    clients = load_clients()
+    print(f"{'rows':>6}{'predict ms':>14}{'explain ms':>14}{'cached ms':>14}")
+    for rows in [int(count) for count in argument.rows.split(",")]:
+        records: List = clients[:rows]
+        cache = PredictionCache(max_entries=rows)
+        explain_fields(records, model=model, cache=cache)
+        timings = [
+            seconds(lambda: score_fields(records, model=model), argument.repeat),
+            seconds(lambda: explain_fields(records, model=model), argument.repeat),
+            seconds(lambda: explain_fields(records, model=model, cache=cache), argument.repeat),
+        ]
+        print(f"{rows:>6}" + "".join(f"{timing * 1000:>14.3f}" for timing in timings))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+""" Asynchronous load generator reporting latency percentiles and throughput of the serving app.
+
+Run as a module from the repository root, against the app in-process (default) or a running server:
+    python -m benchmarks.load_generator --profile closed --concurrency 16 --requests 2000
+    python -m benchmarks.load_generator --url http://localhost:8000 --profile open --rate 200 --duration 30
+    python -m benchmarks.load_generator --save-baseline baseline.json
+    python -m benchmarks.load_generator --baseline baseline.json --max-regression 0.2  # exit code 1 on regression
+
+Closed loop: concurrency clients each send a request as soon as the previous one is answered, measures capacity.
+Open loop: requests arrive at a given rate whatever the response times, latency is measured from the scheduled
+arrival time so a slow server is not hidden by fewer requests (coordinated omission).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional
+
+import httpx
+import numpy as np
+import pandas as pd
+
+from src.preprocessing import CLIENT_FIELDS, FEATURES, Preprocessor
+from src.train import BASE_DIR
+
+TEST_DATA_PATH = os.path.join(BASE_DIR, "data", "test_df.csv")
+ENDPOINTS = ["predict_score_no_ui", "predict_batch", "predict_stream", "predict_with_ui"]
+# Compared with a baseline: higher is worse for latencies, lower is worse for throughput
+LATENCY_KEYS = ["p50_ms", "p90_ms", "p99_ms"]
+# Arguments saved with a baseline, a run with other values is not comparable
+LOAD_ARGUMENTS = ["url", "profile", "concurrency", "requests", "rate", "duration", "mix", "batch_size", "unique_clients"]
+
+
+class Result(NamedTuple):
+    """ Outcome of one request."""
+    endpoint: str
+    latency: float  # seconds
+    status: int  # HTTP status, 0 if the request failed without response
+
+
+def load_clients(path: str = TEST_DATA_PATH) -> List[Dict[str, float]]:
+    """ Clients of the test set as request payloads: encoded categories, missing values imputed.
+
+    :param path: csv file of clients
+    :return: list of client fields, lowercase names as in Client
+    """
+    data_df = pd.read_csv(path, index_col=0)
+    # Payloads are JSON, which has no NaN: missing values are imputed as the app would
+    features = Preprocessor().fit(data_df).transform(data_df)[FEATURES]
+    features.columns = CLIENT_FIELDS
+    return features.to_dict(orient="records")
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """ Parse a payload mix, e.g. "predict_score_no_ui=0.9,predict_batch=0.1".
+
+    :param mix: comma separated endpoint=weight pairs
+    :return: weight of each endpoint
+    """
+    weights = {}
+    for item in mix.split(","):
+        endpoint, _, weight = item.partition("=")
+        if endpoint not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {endpoint}, expected one of {ENDPOINTS}")
+        weights[endpoint] = float(weight or 1)
+    return weights
+
+
+class LoadGenerator:
+    """ Send requests drawn from a payload mix, under closed-loop or open-loop load."""
+
+    def __init__(
+        self, client: httpx.AsyncClient, clients: List[Dict[str, float]], mix: Dict[str, float],
+        batch_size: int = 32, unique_clients: Optional[int] = None, seed: int = 0,
+    ) -> None:
+        """ Instantiate LoadGenerator.
+
+        :param client: HTTP client, its base_url is the app
+        :param clients: client fields to draw payloads from
+        :param mix: weight of each endpoint
+        :param batch_size: number of clients of predict_batch and predict_stream requests
+        :param unique_clients: draw from the first unique_clients only, to control prediction cache hits
+        :param seed: seed of the random draws
+        """
+        self.client = client
+        self.clients = clients[:unique_clients] if unique_clients else clients
+        self.endpoints = list(mix)
+        self.weights = list(mix.values())
+        self.batch_size = batch_size
+        self.random = random.Random(seed)
+
+    def _request(self, endpoint: str) -> Dict:
+        """ Arguments of a request to an endpoint, with randomly drawn clients.
+
+        :param endpoint: name of the endpoint
+        :return: keyword arguments of httpx.AsyncClient.post
+        """
+        if endpoint == "predict_score_no_ui":
+            return {"json": self.random.choice(self.clients)}
+        if endpoint == "predict_with_ui":
+            return {"data": {key: str(value) for key, value in self.random.choice(self.clients).items()}}
+        clients = self.random.choices(self.clients, k=self.batch_size)
+        if endpoint == "predict_batch":
+            return {"json": clients}
+        return {
+            "content": "".join(json.dumps(client) + "\n" for client in clients).encode(),
+            "headers": {"Content-Type": "application/x-ndjson"},
+        }
+
+    async def send(self, endpoint: str, start: Optional[float] = None) -> Result:
+        """ Send one request and wait for the whole response.
+
+        :param endpoint: name of the endpoint
+        :param start: time the request was due, now if None
+        :return: result of the request
+        """
+        kwargs = self._request(endpoint)
+        start = time.perf_counter() if start is None else start
+        try:
+            response = await self.client.post(f"/{endpoint}", **kwargs)
+            status = response.status_code
+        except httpx.HTTPError:
+            status = 0
+        return Result(endpoint=endpoint, latency=time.perf_counter() - start, status=status)
+
+    def pick(self) -> str:
+        """ Draw an endpoint from the mix.
+
+        :return: name of the endpoint
+        """
+        return self.random.choices(self.endpoints, weights=self.weights)[0]
+
+    async def closed_loop(
+        self, concurrency: int, requests: Optional[int] = None, duration: Optional[float] = None,
+    ) -> List[Result]:
+        """ Keep concurrency requests in flight until requests were sent or duration is over.
+
+        :param concurrency: number of concurrent virtual users
+        :param requests: total number of requests
+        :param duration: seconds of load, used if requests is None
+        :return: results of all requests
+        """
+        results: List[Result] = []
+        deadline = time.perf_counter() + (duration or 0)
+        sent = 0
+
+        async def user() -> None:
+            nonlocal sent
+            while sent < requests if requests is not None else time.perf_counter() < deadline:
+                sent += 1
+                results.append(await self.send(self.pick()))
+
+        await asyncio.gather(*(user() for _ in range(concurrency)))
+        return results
+
+    async def open_loop(self, rate: float, duration: float, poisson: bool = True) -> List[Result]:
+        """ Start requests at a given rate whatever the response times.
+
+        :param rate: requests per second
+        :param duration: seconds of load
+        :param poisson: exponential inter-arrival times if True, evenly spaced otherwise
+        :return: results of all requests
+        """
+        tasks = []
+        start = time.perf_counter()
+        due = start
+        while due < start + duration:
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.ensure_future(self.send(self.pick(), start=due)))
+            due += self.random.expovariate(rate) if poisson else 1 / rate
+        return list(await asyncio.gather(*tasks))
+
+
+def summarize(results: List[Result], elapsed: float) -> Dict[str, Dict[str, float]]:
+    """ Latency percentiles, throughput and error rate per endpoint and for all requests.
+
+    :param results: results of requests
+    :param elapsed: seconds of load
+    :return: metrics by endpoint, "all" for all requests
+    """
+    groups = {"all": results}
+    for result in results:
+        groups.setdefault(result.endpoint, []).append(result)
+
+    report = {}
+    for name, group in groups.items():
+        latencies = np.array([result.latency for result in group]) * 1000
+        errors = sum(not 200 <= result.status < 300 for result in group)
+        report[name] = {
+            "requests": len(group),
+            "error_rate": errors / len(group) if group else 0.0,
+            "throughput_rps": len(group) / elapsed if elapsed > 0 else 0.0,
+            "mean_ms": float(latencies.mean()) if group else 0.0,
+            **{key: float(np.percentile(latencies, int(key[1:-3]))) if group else 0.0 for key in LATENCY_KEYS},
+            "max_ms": float(latencies.max()) if group else 0.0,
+        }
+    return report
+
+
+def compare(
+    report: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]], max_regression: float = 0.2,
+) -> List[str]:
+    """ Regressions of a report against a baseline, for endpoints found in both.
+
+    :param report: report of this run
+    :param baseline: report of a previous run
+    :param max_regression: relative change tolerated, e.g. 0.2 for 20% slower or less throughput
+    :return: description of each regression, empty if none
+    """
+    regressions = []
+    for name, previous in baseline.items():
+        current = report.get(name)
+        if current is None:
+            continue
+        for key in LATENCY_KEYS:
+            if current[key] > previous[key] * (1 + max_regression):
+                regressions.append(f"{name} {key}: {previous[key]:.2f} -> {current[key]:.2f}")
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - max_regression):
+            regressions.append(
+                f"{name} throughput_rps: {previous['throughput_rps']:.1f} -> {current['throughput_rps']:.1f}"
+            )
+        if current["error_rate"] > previous["error_rate"] + 0.01:
+            regressions.append(f"{name} error_rate: {previous['error_rate']:.3f} -> {current['error_rate']:.3f}")
+    return regressions
+
+
+def print_report(report: Dict[str, Dict[str, float]]) -> None:
+    """ Print a report as a table.
+
+    :param report: metrics by endpoint
+    :return: None
+    """
+    columns = ["requests", "error_rate", "throughput_rps", "mean_ms", *LATENCY_KEYS, "max_ms"]
+    print(f"{'endpoint':<22}" + "".join(f"{column:>15}" for column in columns))
+    for name, metrics in report.items():
+        print(f"{name:<22}" + "".join(
+            f"{metrics[column]:>15.0f}" if column == "requests" else f"{metrics[column]:>15.3f}" for column in columns
+        ))
+
+
+@asynccontextmanager
+async def http_client(url: Optional[str], timeout: float) -> AsyncIterator[httpx.AsyncClient]:
+    """ HTTP client of a running server, or of the app served in this process when url is None.
+
+    :param url: base url of the server
+    :param timeout: seconds before a request fails
+    :return: async context manager giving the client
+    """
+    if url is not None:
+        async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+            yield client
+        return
+
+    # Imported here: loading the app is only needed in-process
+    from ui.app import app
+
+    # ASGITransport does not run the lifespan, which loads the model and starts the batcher
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver", timeout=timeout) as client:
+            yield client
+
+
+async def run(argument: argparse.Namespace) -> Dict[str, Dict[str, float]]:
+    """ Generate load as configured by command line arguments.
+
+    :param argument: parsed arguments
+    :return: report of the run
+    """
+    async with http_client(argument.url, timeout=argument.timeout) as client:
+        if argument.cpu_intensive:
+            # Autoscaling demo: load the CPU of one pod first
+            await client.get("/cpu-intensive")
+        generator = LoadGenerator(
+            client, load_clients(argument.data), parse_mix(argument.mix), batch_size=argument.batch_size,
+            unique_clients=argument.unique_clients, seed=argument.seed,
+        )
+        if argument.warmup:
+            await generator.closed_loop(concurrency=1, requests=argument.warmup)
+        start = time.perf_counter()
+        if argument.profile == "open":
+            results = await generator.open_loop(rate=argument.rate, duration=argument.duration)
+        else:
+            results = await generator.closed_loop(
+                concurrency=argument.concurrency, requests=argument.requests,
+                duration=argument.duration if argument.requests is None else None,
+            )
+        return summarize(results, time.perf_counter() - start)
+
+
+def main() -> int:
+    """ Run a load test, print its report and check it against a baseline.
+
+    :return: exit code, 1 if a regression was found
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=None, help="base url of a running server, the app in-process if not set")
+    parser.add_argument("--profile", choices=["closed", "open"], default="closed")
+    parser.add_argument("--concurrency", default=16, type=int, help="closed loop: concurrent virtual users")
+    parser.add_argument("--requests", default=None, type=int, help="closed loop: total requests, else --duration")
+    parser.add_argument("--rate", default=100.0, type=float, help="open loop: requests per second")
+    parser.add_argument("--duration", default=10.0, type=float, help="seconds of load")
+    parser.add_argument("--mix", default="predict_score_no_ui=1", help="e.g. predict_score_no_ui=0.9,predict_batch=0.1")
+    parser.add_argument("--batch-size", default=32, type=int, help="clients per predict_batch or predict_stream")
+    parser.add_argument("--unique-clients", default=None, type=int, help="draw from the first N clients only")
+    parser.add_argument("--data", default=TEST_DATA_PATH, help="csv file of clients")
+    parser.add_argument("--warmup", default=20, type=int, help="requests sent before measuring")
+    parser.add_argument("--timeout", default=30.0, type=float)
+    parser.add_argument("--seed", default=0, type=int)
+    parser.add_argument("--cpu-intensive", action="store_true", help="call /cpu-intensive first")
+    parser.add_argument("--save-baseline", default=None, help="json file to save the report to")
+    parser.add_argument("--baseline", default=None, help="json file of a previous report to compare with")
+    parser.add_argument("--max-regression", default=0.2, type=float)
+    argument = parser.parse_args()
+
+    report = asyncio.run(run(argument))
+    print_report(report)
+    arguments = {key: getattr(argument, key) for key in LOAD_ARGUMENTS}
+    if argument.save_baseline:
+        with open(argument.save_baseline, "w") as outfile:
+            json.dump({"arguments": arguments, "report": report}, outfile, indent=2)
+    if argument.baseline:
+        with open(argument.baseline) as infile:
+            baseline = json.load(infile)
+        if baseline["arguments"] != arguments:
+            print(f"WARNING baseline was run with {baseline['arguments']}, not comparable with {arguments}")
+        regressions = compare(report, baseline["report"], max_regression=argument.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
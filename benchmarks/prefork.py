@@ -0,0 +1,186 @@
+""" Benchmark multi-process serving: throughput and memory of each worker as the number of workers grows.
+
+Run as a module from the repository root, on Linux: python -m benchmarks.prefork --workers 1,2,4 --duration 10
+
+Each server is started in a fresh process, with ui.prefork (models loaded once, then forked) or uvicorn --workers
+(each worker imports the app and loads its own models), and loaded in closed loop by --clients processes so that the
+load generator is not the bottleneck. Memory is read from /proc after the load: PSS splits shared pages between the
+processes sharing them, private pages belong to one worker only.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+from benchmarks.load_generator import LoadGenerator, Result, load_clients, summarize
+from benchmarks.startup import free_port
+
+MODES = ["prefork", "uvicorn"]
+
+
+def server_command(mode: str, workers: int, port: int) -> List[str]:
+    """ Command starting the app with several workers.
+
+    :param mode: "prefork" or "uvicorn"
+    :param workers: number of worker processes
+    :param port: port to listen on
+    :return: command line
+    """
+    if mode == "prefork":
+        return [sys.executable, "-m", "ui.prefork", "--port", str(port), "--workers", str(workers), "--log-level",
+                "warning"]
+    return [sys.executable, "-m", "uvicorn", "ui.app:app", "--port", str(port), "--workers", str(workers),
+            "--log-level", "warning"]
+
+
+def worker_pids(process: subprocess.Popen) -> List[int]:
+    """ Processes serving requests: children of the server, the server itself if it has none (uvicorn, one worker).
+
+    :param process: server process
+    :return: pids of the workers
+    """
+    with open(f"/proc/{process.pid}/task/{process.pid}/children") as infile:
+        return [int(child) for child in infile.read().split()] or [process.pid]
+
+
+def memory_mb(pid: int) -> Dict[str, float]:
+    """ Memory of a process.
+
+    :param pid: pid of the process
+    :return: resident, proportional and private memory in MB
+    """
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as infile:
+        for line in infile:
+            name, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                fields[name] = int(value.split()[0]) / 1024
+    return {
+        "rss": fields["Rss"], "pss": fields["Pss"], "private": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def wait_ready(url: str, process: subprocess.Popen, workers: int, timeout: float) -> None:
+    """ Wait for the server to answer /ready, and for every worker to be started.
+
+    :param url: base url of the server
+    :param process: server process
+    :param workers: number of worker processes
+    :param timeout: seconds to wait
+    :return: None
+    """
+    start = time.perf_counter()
+    with httpx.Client(base_url=url, timeout=timeout) as client:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"Server exited with code {process.returncode}")
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(f"Server not ready after {timeout} s")
+            try:
+                if client.get("/ready").status_code == 200 and len(worker_pids(process)) >= workers:
+                    # Workers accepting on the shared socket may still be starting, give them time
+                    time.sleep(1.0)
+                    return
+            except httpx.TransportError:
+                pass
+            time.sleep(0.05)
+
+
+def generate_load(url: str, concurrency: int, duration: float, seed: int) -> List[Result]:
+    """ Closed-loop load from one client process.
+
+    :param url: base url of the server
+    :param concurrency: concurrent virtual users
+    :param duration: seconds of load
+    :param seed: seed of the random draws
+    :return: results of all requests
+    """
+
+    async def run() -> List[Result]:
+        async with httpx.AsyncClient(base_url=url, timeout=30.0) as client:
+            generator = LoadGenerator(client, load_clients(), {"predict_score_no_ui": 1.0}, seed=seed)
+            return await generator.closed_loop(concurrency=concurrency, duration=duration)
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    return asyncio.run(run())
+
+
+def measure(mode: str, workers: int, clients: int, concurrency: int, duration: float, timeout: float) -> Dict:
+    """ Start a server, load it and read the memory of its processes.
+
+    :param mode: "prefork" or "uvicorn"
+    :param workers: number of worker processes
+    :param clients: number of load generator processes
+    :param concurrency: concurrent virtual users of each load generator
+    :param duration: seconds of load
+    :param timeout: seconds to wait for the server to be ready
+    :return: measures of the run
+    """
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    process = subprocess.Popen(
+        server_command(mode, workers, port), env={**os.environ, "WORKERS": str(workers)},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_ready(url, process, workers, timeout)
+        with multiprocessing.get_context("spawn").Pool(clients) as pool:
+            start = time.perf_counter()
+            runs = pool.starmap(generate_load, [(url, concurrency, duration, seed) for seed in range(clients)])
+            elapsed = time.perf_counter() - start
+        report = summarize([result for results in runs for result in results], elapsed)["all"]
+        pids = worker_pids(process)
+        worker_memory = [memory_mb(pid) for pid in pids]
+        # Memory of the parent, which only supervises workers
+        parent_pss = memory_mb(process.pid)["pss"] if pids != [process.pid] else 0.0
+    finally:
+        process.terminate()
+        process.wait()
+    return {
+        "throughput_rps": report["throughput_rps"],
+        "p50_ms": report["p50_ms"],
+        "p99_ms": report["p99_ms"],
+        "error_rate": report["error_rate"],
+        "rss_mb": float(np.mean([memory["rss"] for memory in worker_memory])),
+        "pss_mb": float(np.mean([memory["pss"] for memory in worker_memory])),
+        "private_mb": float(np.mean([memory["private"] for memory in worker_memory])),
+        "total_pss_mb": parent_pss + sum(memory["pss"] for memory in worker_memory),
+    }
+
+
+def main() -> None:
+    """ Print throughput and memory per worker of each serving mode and number of workers.
+    :return: None
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", default="1,2,4", help="numbers of workers, comma separated")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--clients", default=os.cpu_count() or 1, type=int, help="load generator processes")
+    parser.add_argument("--concurrency", default=16, type=int, help="virtual users of each load generator")
+    parser.add_argument("--duration", default=10.0, type=float, help="seconds of load")
+    parser.add_argument("--timeout", default=60.0, type=float)
+    argument = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    print(f"cores: {os.cpu_count()}, load generators: {argument.clients}")
+    columns = ["throughput_rps", "p50_ms", "p99_ms", "error_rate", "rss_mb", "pss_mb", "private_mb", "total_pss_mb"]
+    print(f"{'mode':<10}{'workers':>8}" + "".join(f"{column:>15}" for column in columns))
+    for mode in argument.modes.split(","):
+        for workers in [int(count) for count in argument.workers.split(",")]:
+            measures = measure(mode, workers, argument.clients, argument.concurrency, argument.duration,
+                               argument.timeout)
+            print(f"{mode:<10}{workers:>8}" + "".join(f"{measures[column]:>15.3f}" for column in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+""" Benchmark rebalancing modes of FeaturesGenerator: resample time and memory, fit time, forest size and recall.
+
+Run as a module from the repository root: python -m benchmarks.rebalancing --scale 10
+
+--scale repeats the training rows, with a little noise, to see how each mode grows with the dataset.
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import time
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import f1_score, recall_score
+
+from src.features_generator import REBALANCING_MODES, FeaturesGenerator
+from src.model import ExtraTrees
+from src.preprocessing import Preprocessor
+from src.stages import stage_timer
+from src.train import BASE_DIR, load_and_split_data
+
+
+def scale_rows(df: pd.DataFrame, scale: int, seed: int = 0) -> pd.DataFrame:
+    """ Repeat rows of preprocessed features, numerical values jittered by 1% so that copies are not identical.
+
+    :param df: preprocessed features, with column "BAD"
+    :param scale: number of copies
+    :param seed: random seed
+    :return: dataframe of scale times as many rows
+    """
+    if scale <= 1:
+        return df
+    scaled = pd.concat([df] * scale, ignore_index=True)
+    rng = np.random.default_rng(seed)
+    columns = [column for column in scaled.columns if column not in ("BAD", "JOB", "REASON")]
+    scaled[columns] *= 1 + 0.01 * rng.standard_normal((len(scaled), len(columns)))
+    return scaled
+
+
+def run(mode: str, fit_df: pd.DataFrame, test_features: pd.DataFrame, test_target: pd.Series, n_jobs: int) -> Dict:
+    """ Rebalance, fit and evaluate with one mode.
+
+    :param mode: one of REBALANCING_MODES
+    :param fit_df: preprocessed training features, with column "BAD"
+    :param test_features: preprocessed test features
+    :param test_target: test labels
+    :param n_jobs: number of cores
+    :return: measures of the mode
+    """
+    report: Dict[str, Dict[str, float]] = {}
+    silent = logging.getLogger("benchmark")
+    with stage_timer(silent, "resample", report):
+        generator = FeaturesGenerator(logger=silent, df=fit_df, n_jobs=n_jobs, random_state=0, rebalancing=mode)
+        generator.generate(tasks=["resampling"])
+    params = {"n_jobs": n_jobs, "random_state": 0, **({"class_weight": "balanced"} if mode == "class_weight" else {})}
+    model = ExtraTrees(**params)
+    start = time.perf_counter()
+    model.train(generator.features, generator.target)
+    fit_seconds = time.perf_counter() - start
+    predictions = model.model.predict(test_features)
+    return {
+        "rows": len(generator.features),
+        "resample_s": report["resample"]["seconds"],
+        "peak_mb": report["resample"]["peak_memory_mb"],
+        "fit_s": fit_seconds,
+        "nodes": sum(tree.tree_.node_count for tree in model.model.estimators_),
+        "recall": recall_score(test_target, predictions),
+        "f1": f1_score(test_target, predictions),
+    }
+
+
+def main() -> None:
+    """ Print measures of each rebalancing mode.
+    :return: None
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", default=1, type=int, help="copies of the training rows")
+    parser.add_argument("--modes", default=",".join(REBALANCING_MODES))
+    parser.add_argument("--n-jobs", default=-1, type=int)
+    argument = parser.parse_args()
+
+    train_df, test_df = load_and_split_data(filename=os.path.join(BASE_DIR, "data", "hmeq.csv"))
+    preprocessor = Preprocessor().fit(train_df)
+    fit_df = scale_rows(preprocessor.transform(train_df).assign(BAD=train_df["BAD"].to_numpy()), argument.scale)
+    test_features = preprocessor.transform(test_df)
+
+    columns = ["rows", "resample_s", "peak_mb", "fit_s", "nodes", "recall", "f1"]
+    print(f"{'mode':<20}" + "".join(f"{column:>12}" for column in columns))
+    for mode in argument.modes.split(","):
+        measures = run(mode, fit_df, test_features, test_df["BAD"], argument.n_jobs)
+        print(f"{mode:<20}" + "".join(
+            f"{measures[column]:>12,}" if isinstance(measures[column], int) else f"{measures[column]:>12.3f}"
+            for column in columns
+        ))
+
+
+if __name__ == "__main__":
+    main()
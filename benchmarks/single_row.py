@@ -0,0 +1,86 @@
+""" Benchmark latency of one prediction: dataframe path against the pandas-free fast path.
+
+Run as a module from the repository root: python -m benchmarks.single_row --iterations 1000
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Callable, Dict
+
+import numpy as np
+import pandas as pd
+
+from src.inference import predict_fields
+from src.schema import Client
+from src.train import load_model, predict
+
+CLIENT = Client(
+    loan=2000, mortdue=25000.0, value=39025.0, reason=1, job=3, yoj=12.5, derog=0.0,
+    delinq=0.0, clage=95.366666667, ninq=1.0, clno=9.0, debtinc=1.3,
+)
+
+
+def dataframe_path(client: Client) -> int:
+    """ Prediction as done by the endpoints before the fast path: one-row dataframe, renamed columns.
+
+    :param client: validated client
+    :return: prediction
+    """
+    data = client.__dict__
+    data_df = pd.DataFrame([data], columns=data.keys())
+    data_df.columns = map(str.upper, data_df.columns)
+    return predict(data_df).item(0)
+
+
+def fast_path(client: Client) -> int:
+    """ Prediction from fields written straight into a reused feature vector.
+
+    :param client: validated client
+    :return: prediction
+    """
+    return predict_fields([client.__dict__]).item(0)
+
+
+def measure(function: Callable[[Client], int], iterations: int, warmup: int) -> Dict[str, float]:
+    """ Call a prediction function repeatedly and summarize its latency.
+
+    :param function: prediction function
+    :param iterations: number of measured calls
+    :param warmup: number of calls before measuring
+    :return: latency statistics in milliseconds
+    """
+    for _ in range(warmup):
+        function(CLIENT)
+    latencies = np.empty(iterations)
+    for iteration in range(iterations):
+        start = time.perf_counter()
+        function(CLIENT)
+        latencies[iteration] = time.perf_counter() - start
+    latencies *= 1000
+    return {
+        "mean": latencies.mean(),
+        "p50": np.percentile(latencies, 50),
+        "p99": np.percentile(latencies, 99),
+    }
+
+
+def main() -> None:
+    """ Print per-request latency of both paths.
+    :return: None
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", default=500, type=int)
+    parser.add_argument("--warmup", default=20, type=int)
+    argument = parser.parse_args()
+
+    load_model()
+    assert dataframe_path(CLIENT) == fast_path(CLIENT), "Both paths must give the same prediction"
+    print(f"{'path':<12}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, function in [("dataframe", dataframe_path), ("fast", fast_path)]:
+        stats = measure(function, argument.iterations, argument.warmup)
+        print(f"{name:<12}{stats['mean']:>10.3f}{stats['p50']:>10.3f}{stats['p99']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
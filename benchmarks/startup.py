@@ -0,0 +1,113 @@
+""" Benchmark startup of the app: import time, time until ready and time to the first prediction of a fresh process.
+
+Run as a module from the repository root: python -m benchmarks.startup --runs 5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List
+
+import httpx
+import numpy as np
+
+from ui.app import WARM_UP_CLIENT
+
+# Modules only needed to train, they must not be imported to serve
+TRAINING_MODULES = ["pandas", "sklearn", "imblearn", "joblib", "scipy"]
+
+IMPORT_SCRIPT = f"""
+import json, sys, time
+start = time.perf_counter()
+import ui.app
+seconds = time.perf_counter() - start
+print(json.dumps({{"seconds": seconds, "loaded": [name for name in {TRAINING_MODULES!r} if name in sys.modules]}}))
+"""
+
+
+def measure_import() -> Dict:
+    """ Import the app in a fresh interpreter.
+
+    :return: import seconds and training modules it loaded
+    """
+    output = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], capture_output=True, check=True, text=True)
+    return json.loads(output.stdout.splitlines()[-1])
+
+
+def free_port() -> int:
+    """ Port nobody listens on.
+
+    :return: port number
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_server(timeout: float) -> Dict[str, float]:
+    """ Start uvicorn, wait for /ready, then send a first prediction.
+
+    :param timeout: seconds to wait for the app to be ready
+    :return: seconds from process start until ready and until the first prediction
+    """
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "ARTIFICIAL_LATENCY_MS": "0"}
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "ui.app:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        with httpx.Client(base_url=url, timeout=timeout) as client:
+            while True:
+                if process.poll() is not None:
+                    raise RuntimeError(f"uvicorn exited with code {process.returncode}")
+                if time.perf_counter() - start > timeout:
+                    raise TimeoutError(f"App not ready after {timeout} s")
+                try:
+                    if client.get("/ready").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.01)
+            ready = time.perf_counter() - start
+            client.post("/predict_score_no_ui", json=WARM_UP_CLIENT).raise_for_status()
+            first_prediction = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait()
+    return {"ready": ready, "first_prediction": first_prediction}
+
+
+def main() -> None:
+    """ Print median startup times over several fresh processes.
+    :return: None
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", default=5, type=int)
+    parser.add_argument("--timeout", default=60.0, type=float)
+    argument = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    imports: List[Dict] = [measure_import() for _ in range(argument.runs)]
+    servers = [measure_server(argument.timeout) for _ in range(argument.runs)]
+    loaded = sorted({name for run in imports for name in run["loaded"]})
+    print(f"{'phase':<28}{'median s':>10}{'max s':>10}")
+    for name, values in [
+        ("import ui.app", [run["seconds"] for run in imports]),
+        ("process start to ready", [run["ready"] for run in servers]),
+        ("process start to prediction", [run["first_prediction"] for run in servers]),
+    ]:
+        print(f"{name:<28}{np.median(values):>10.3f}{np.max(values):>10.3f}")
+    print(f"training modules imported to serve: {', '.join(loaded) or 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+""" Benchmark validation of bulk records: one pydantic Client per record against the columnar validator.
+
+Run as a module from the repository root: python -m benchmarks.validation --rows 100000
+"""
+from __future__ import annotations
+
+import argparse
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+from pydantic import ValidationError
+
+from src.schema import Client
+from src.validation import CLIENT_VALIDATOR
+
+CLIENT = {
+    "loan": 2000, "mortdue": 25000.0, "value": 39025.0, "reason": 1, "job": 3, "yoj": 12.5, "derog": 0.0,
+    "delinq": 0.0, "clage": 95.366666667, "ninq": 1.0, "clno": 9.0, "debtinc": 1.3,
+}
+
+
+def make_records(rows: int, invalid_share: float, as_text: bool, seed: int = 0) -> List[Dict]:
+    """ Records with random values, some of them invalid.
+
+    :param rows: number of records
+    :param invalid_share: share of records with an invalid job
+    :param as_text: values as strings, as parsed from CSV lines
+    :param seed: random seed
+    :return: list of records
+    """
+    rng = np.random.default_rng(seed)
+    loans = rng.integers(1000, 90000, rows).tolist()
+    jobs = np.where(rng.random(rows) < invalid_share, 9, rng.integers(1, 7, rows)).tolist()
+    records = [dict(CLIENT, loan=loan, job=job) for loan, job in zip(loans, jobs)]
+    if as_text:
+        records = [{name: str(value) for name, value in record.items()} for record in records]
+    return records
+
+
+def pydantic_rows(records: List[Dict]) -> int:
+    """ Validate records one pydantic object at a time.
+
+    :param records: list of records
+    :return: number of valid records
+    """
+    valid = 0
+    for record in records:
+        try:
+            Client(**record)
+            valid += 1
+        except ValidationError:
+            pass
+    return valid
+
+
+def columnar(records: List[Dict]) -> int:
+    """ Validate records column by column.
+
+    :param records: list of records
+    :return: number of valid records
+    """
+    return int(CLIENT_VALIDATOR.validate_records(records).valid.sum())
+
+
+def seconds(function: Callable[[List[Dict]], int], records: List[Dict], repeat: int) -> float:
+    """ Best duration of repeated calls.
+
+    :param function: validation function
+    :param records: list of records
+    :param repeat: number of calls
+    :return: seconds
+    """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(records)
+        durations.append(time.perf_counter() - start)
+    return min(durations)
+
+
+def main() -> None:
+    """ Print validation throughput of both validators, on numbers as parsed from JSON and strings as from CSV.
+    :return: None
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", default=100_000, type=int)
+    parser.add_argument("--invalid-share", default=0.01, type=float)
+    parser.add_argument("--repeat", default=3, type=int)
+    argument = parser.parse_args()
+
+    print(f"{'input':<8}{'validator':<12}{'rows/s':>14}")
+    for name, as_text in [("json", False), ("csv", True)]:
+        records = make_records(argument.rows, argument.invalid_share, as_text)
+        assert pydantic_rows(records) == columnar(records), "Both validators must accept the same records"
+        for validator, function in [("pydantic", pydantic_rows), ("columnar", columnar)]:
+            rate = argument.rows / seconds(function, records, argument.repeat)
+            print(f"{name:<8}{validator:<12}{rate:>14,.0f}")
+
+    # Data already in columns, e.g. read from Parquet or Arrow: nothing is done per record
+    records = make_records(argument.rows, argument.invalid_share, as_text=False)
+    columns = {name: np.array([record[name] for record in records]) for name in CLIENT}
+    validate_columns = lambda _: int(CLIENT_VALIDATOR.validate(columns).valid.sum())  # noqa: E731
+    rate = argument.rows / seconds(validate_columns, records, argument.repeat)
+    print(f"{'columns':<8}{'columnar':<12}{rate:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
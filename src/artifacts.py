@@ -0,0 +1,146 @@
+""" Trained artifacts served from memory: model, preprocessor, decision policy, drift reference and explainer, loaded
+once per process. All of them are read from the version published by the manifest of the model, see src.bundle.
+
+This module is on the serving import path and only needs numpy: pandas, sklearn and training code are imported by
+src.train, and by joblib when a model without compiled forest is loaded.
+"""
+from __future__ import annotations
+
+import logging
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+from src.bundle import MANIFEST_SUFFIX, is_versioned, manifest_path, read_manifest
+from src.compiled_forest import CompiledForest, compiled_forest_path
+from src.decision import DecisionPolicy, decision_path
+from src.drift import FeatureProfile, reference_path
+from src.explain import ForestExplainer
+from src.model_registry import ModelRegistry
+from src.preprocessing import Preprocessor, preprocessor_path
+
+if TYPE_CHECKING:
+    from src.model_registry import LoadedModel
+
+BASE_DIR = Path(__file__).resolve(strict=True).parent
+MODEL_PATH = os.path.join(BASE_DIR, "trained_models", "extraTrees_model.sav")
+
+# Models are loaded once per process and served from memory
+model_registry = ModelRegistry(logger=logging)
+
+
+def _forget_version(previous: LoadedModel, new: LoadedModel) -> None:
+    """ Free artifacts of a version once another one is published, requests holding them finish with them.
+
+    :param previous: previous manifest, its model is the model file of the previous version
+    :param new: new manifest
+    :return: None
+    """
+    if previous.name.endswith(MANIFEST_SUFFIX) and previous.model != new.model:
+        model_registry.unregister_directory(os.path.dirname(previous.model))
+
+
+model_registry.add_listener(_forget_version)
+
+
+def resolve_model_path(model_path: str = MODEL_PATH) -> str:
+    """ Model file of the published version of a model, from the registry: a new manifest is picked up as models
+    are reloaded.
+
+    :param model_path: path of the trained model, or of the model file of a version
+    :return: path of the model file of the published version, model_path itself without manifest
+    """
+    if is_versioned(model_path):
+        return model_path
+    path = manifest_path(model_path)
+    if path in model_registry:
+        return model_registry.get(path).model
+    if os.path.isfile(path):
+        return model_registry.register(name=path, path=path, loader=read_manifest).model
+    return model_path
+
+
+def load_model(model_path: str = MODEL_PATH, compiled: bool = True) -> LoadedModel:
+    """ Get a trained model from the registry, loading it on first use.
+
+    The compiled forest exported with the model is preferred: predictions are identical, faster for a few rows and
+    its memory-mapped arrays are shared between processes. When it disappears, the model file is served instead.
+
+    :param model_path: path of the trained model
+    :param compiled: use the compiled forest exported with the model, if any
+    :return: loaded model and its version
+    """
+    model_path = resolve_model_path(model_path)
+    forest_path = compiled_forest_path(model_path)
+    if compiled and forest_path in model_registry:
+        loaded = model_registry.get(forest_path)
+        if not model_registry.missing(forest_path) or not os.path.isfile(model_path):
+            return loaded
+        # The forest was deleted, e.g. by a retraining without compiled export: serve the model file instead
+        logging.warning("Compiled forest %s disappeared, fall back to %s", forest_path, model_path)
+        model_registry.unregister(forest_path)
+        model_registry.unregister(f"{forest_path}:explainer")
+    if compiled and os.path.isfile(forest_path):
+        return model_registry.register(name=forest_path, path=forest_path, loader=CompiledForest.load)
+    if model_path not in model_registry:
+        return model_registry.register(name=model_path, path=model_path)
+    return model_registry.get(model_path)
+
+
+def load_preprocessor(model_path: str = MODEL_PATH) -> Optional[Preprocessor]:
+    """ Get the preprocessor exported with a trained model from the registry, loading it on first use.
+
+    :param model_path: path of the trained model
+    :return: fitted preprocessor, None for models trained before preprocessors were exported
+    """
+    path = preprocessor_path(resolve_model_path(model_path))
+    if path in model_registry:
+        return model_registry.get(path).model
+    if os.path.isfile(path):
+        return model_registry.register(name=path, path=path, loader=Preprocessor.load).model
+    return None
+
+
+def load_decision_policy(model_path: str = MODEL_PATH, threshold: Optional[float] = None) -> DecisionPolicy:
+    """ Get the decision policy exported with a trained model from the registry, loading it on first use.
+
+    :param model_path: path of the trained model
+    :param threshold: threshold overriding the exported one, e.g. set by the deployment
+    :return: decision policy, the default one for models trained before policies were exported
+    """
+    path = decision_path(resolve_model_path(model_path))
+    if path in model_registry:
+        policy = model_registry.get(path).model
+    elif os.path.isfile(path):
+        policy = model_registry.register(name=path, path=path, loader=DecisionPolicy.load).model
+    else:
+        policy = DecisionPolicy()
+    return policy.with_threshold(threshold)
+
+
+def load_drift_reference(model_path: str = MODEL_PATH) -> Optional[FeatureProfile]:
+    """ Get the reference profile exported with a trained model from the registry, loading it on first use.
+
+    :param model_path: path of the trained model
+    :return: profile of its training set, None for models trained before profiles were exported
+    """
+    path = reference_path(resolve_model_path(model_path))
+    if path in model_registry:
+        return model_registry.get(path).model
+    if os.path.isfile(path):
+        return model_registry.register(name=path, path=path, loader=FeatureProfile.load).model
+    return None
+
+
+def load_explainer(model: LoadedModel) -> ForestExplainer:
+    """ Get the explainer of a loaded model from the registry, its path statistics computed on first use.
+
+    :param model: loaded forest, compiled or not
+    :return: explainer of the same model version
+    """
+    name = f"{model.path}:explainer"
+    if name in model_registry:
+        explainer = model_registry.get(name)
+        if explainer.version == model.version:
+            return explainer.model
+    return model_registry.register(name=name, path=model.path, loader=ForestExplainer.load).model
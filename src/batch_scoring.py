@@ -0,0 +1,185 @@
+""" Score client records in fixed-size chunks, for bulk and streaming predictions."""
+from __future__ import annotations
+
+import csv
+import io
+import json
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Tuple
+
+from src.artifacts import load_model
+from src.inference import decide_fields
+from src.validation import CLIENT_VALIDATOR
+
+if TYPE_CHECKING:
+    from src.decision import DecisionPolicy, Decisions
+    from src.model_registry import LoadedModel
+    from src.prediction_cache import PredictionCache
+
+# Number of records predicted together, bounds memory used by one chunk
+CHUNK_SIZE = 1000
+
+STREAM_FORMATS = ("ndjson", "csv")
+
+
+def predict_records(
+    records: List[dict], model: Optional[LoadedModel] = None, cache: Optional[PredictionCache] = None,
+    policy: Optional[DecisionPolicy] = None,
+) -> Tuple[Decisions, str]:
+    """ Predict validated client records with one model call.
+
+    :param records: list of validated client fields, lowercase names as in Client
+    :param model: loaded model to use, the default trained model if None
+    :param cache: cache of probabilities, only records not found in it are scored
+    :param policy: decision policy, the one exported with the model if None
+    :return: probabilities, predictions and risk bands, and version of the model which made them
+    """
+    if model is None:
+        model = load_model()
+    return decide_fields(records, model=model, cache=cache, policy=policy), model.version
+
+
+def iter_chunks(records: List[dict], chunk_size: int = CHUNK_SIZE) -> Iterator[List[dict]]:
+    """ Split records in chunks of at most chunk_size records.
+
+    :param records: list of records
+    :param chunk_size: maximum number of records per chunk
+    :return: iterator of chunks
+    """
+    for start in range(0, len(records), chunk_size):
+        yield records[start:start + chunk_size]
+
+
+class StreamScorer:
+    """ Score an upload of any size fed piece by piece, holding at most one chunk of records in memory.
+
+    Input is NDJSON (one client object per line) or CSV with a header line, field names are case-insensitive.
+    Output has one line per input record, in the same format: its row number, prediction, probability of BAD and risk
+    band, or a validation error. Records of a chunk are validated together, column by column.
+    """
+
+    def __init__(
+        self, fmt: str, model: LoadedModel, chunk_size: int = CHUNK_SIZE, policy: Optional[DecisionPolicy] = None,
+        on_scored: Optional[Callable[[List[dict], Decisions, float], None]] = None,
+    ) -> None:
+        """ Instantiate StreamScorer.
+
+        :param fmt: "ndjson" or "csv"
+        :param model: loaded model, the same version scores the whole upload
+        :param chunk_size: number of records predicted together
+        :param policy: decision policy, the one exported with the model if None
+        :param on_scored: called with the records, decisions and seconds of each model call, e.g. to monitor them
+        """
+        if fmt not in STREAM_FORMATS:
+            raise ValueError(f"Unsupported format {fmt}, expected one of {STREAM_FORMATS}")
+        self.fmt = fmt
+        self.model = model
+        self.chunk_size = chunk_size
+        self.policy = policy
+        self.on_scored = on_scored
+        self.rows = 0
+        self._partial_line = b""
+        self._header: Optional[List[str]] = None
+        self._pending: List[Tuple[int, Dict]] = []  # row number and fields, not validated yet
+        self._errors: List[Tuple[int, str]] = []
+
+    def header(self) -> bytes:
+        """ First bytes of the output.
+
+        :return: CSV header, nothing for NDJSON
+        """
+        return b"row,prediction,probability,risk_band,error\n" if self.fmt == "csv" else b""
+
+    def feed(self, data: bytes) -> bytes:
+        """ Consume a piece of the upload, score the chunks it completes.
+
+        :param data: bytes of the upload, lines may be split across pieces
+        :return: output lines of the scored chunks
+        """
+        lines = (self._partial_line + data).split(b"\n")
+        self._partial_line = lines.pop()
+        output = []
+        for line in lines:
+            self._add_line(line)
+            if len(self._pending) + len(self._errors) >= self.chunk_size:
+                output.append(self._flush())
+        return b"".join(output)
+
+    def close(self) -> bytes:
+        """ Score what remains at the end of the upload.
+
+        :return: output lines of the last chunk
+        """
+        self._add_line(self._partial_line)
+        self._partial_line = b""
+        return self._flush()
+
+    def _add_line(self, line: bytes) -> None:
+        """ Parse and validate one input line.
+
+        :param line: line of the upload
+        :return: None
+        """
+        try:
+            text = line.decode("utf-8").strip()
+        except UnicodeDecodeError:
+            self._errors.append((self.rows, "invalid UTF-8"))
+            self.rows += 1
+            return
+        if not text:
+            return
+        if self.fmt == "csv":
+            values = next(csv.reader([text]))
+            if self._header is None:
+                self._header = [name.strip().lower() for name in values]
+                return
+            record = dict(zip(self._header, values))
+        else:
+            try:
+                record = {name.lower(): value for name, value in json.loads(text).items()}
+            except (ValueError, AttributeError):
+                self._errors.append((self.rows, "invalid JSON object"))
+                self.rows += 1
+                return
+
+        self._pending.append((self.rows, record))
+        self.rows += 1
+
+    def _flush(self) -> bytes:
+        """ Validate and predict pending records, format results of the chunk in row order.
+
+        :return: output lines
+        """
+        results = [(row, None, None, None, error) for row, error in self._errors]
+        if self._pending:
+            rows = [row for row, _ in self._pending]
+            report = CLIENT_VALIDATOR.validate_records([record for _, record in self._pending])
+            results.extend((rows[position], None, None, None, error) for position, error in report.errors)
+            valid_rows = [row for row, valid in zip(rows, report.valid.tolist()) if valid]
+            if valid_rows:
+                records = report.records()
+                start = time.perf_counter()
+                decisions, _ = predict_records(records, model=self.model, policy=self.policy)
+                if self.on_scored is not None:
+                    self.on_scored(records, decisions, time.perf_counter() - start)
+                results.extend(
+                    (row, prediction, probability, risk_band, None)
+                    for row, prediction, probability, risk_band in zip(
+                        valid_rows, decisions.predictions.tolist(), decisions.probabilities.tolist(),
+                        decisions.risk_bands.tolist(),
+                    )
+                )
+        results.sort(key=lambda result: result[0])
+        self._pending, self._errors = [], []
+
+        if self.fmt == "csv":
+            buffer = io.StringIO()
+            csv.writer(buffer, lineterminator="\n").writerows(results)
+            return buffer.getvalue().encode("utf-8")
+        return "".join(
+            json.dumps(
+                {"row": row, "prediction": prediction, "probability": probability, "risk_band": risk_band}
+                if error is None else {"row": row, "error": error}
+            ) + "\n"
+            for row, prediction, probability, risk_band, error in results
+        ).encode("utf-8")
@@ -0,0 +1,191 @@
+""" Coalesce concurrent single-row predictions into vectorized batch predictions."""
+from __future__ import annotations
+
+import asyncio
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+if TYPE_CHECKING:
+    import logging
+    from concurrent.futures import Executor
+
+
+class MicroBatcher:
+    """ Queue incoming payloads for a short window and predict them in one call.
+
+    A batch is closed when it holds max_batch_size payloads or when its oldest payload waited max_wait_ms. While a
+    batch is predicted new payloads keep queueing, so the next batch gets larger when the predictor is the bottleneck.
+    """
+
+    def __init__(
+        self, logger: logging.Logger, predict_batch: Callable[[List[Any]], Sequence[Any]],
+        max_batch_size: int = 64, max_wait_ms: float = 2.0, max_queue_size: int = 1024,
+        max_concurrent_batches: int = 1,
+    ) -> None:
+        """ Instantiate MicroBatcher.
+
+        :param logger: python logger
+        :param predict_batch: function predicting a list of payloads, returns one result per payload
+        :param max_batch_size: maximum number of payloads predicted together
+        :param max_wait_ms: maximum time in milliseconds a payload waits for other payloads
+        :param max_queue_size: maximum number of queued payloads, submitting more raises asyncio.QueueFull
+        :param max_concurrent_batches: maximum number of batches predicted at the same time, e.g. executor workers
+        """
+        self.logger = logger
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+        self.max_concurrent_batches = max_concurrent_batches
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor: Optional[Executor] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight: Set[asyncio.Task] = set()
+        self._batches = 0
+        self._items = 0
+        self._max_batch_seen = 0
+        self._rejected = 0
+        self._wait_total = 0.0
+        self._predict_total = 0.0
+
+    async def start(self, executor: Optional[Executor] = None) -> None:
+        """ Start the worker collecting and predicting batches, in the running event loop.
+
+        :param executor: pool running predict_batch, the default executor of the event loop if None
+        :return: None
+        """
+        self._executor = executor
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._worker = asyncio.create_task(self._run())
+        self.logger.info(
+            "Micro-batching started: max_batch_size=%d, max_wait_ms=%.1f, max_queue_size=%d, max_concurrent_batches=%d",
+            self.max_batch_size, self.max_wait * 1000, self.max_queue_size, self.max_concurrent_batches,
+        )
+
+    async def stop(self) -> None:
+        """ Stop the worker once batches being predicted are done, payloads still queued get a cancellation error.
+        :return: None
+        """
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+        if self._in_flight:
+            await asyncio.wait(self._in_flight)
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.cancel()
+
+    async def submit(self, payload: Any) -> Any:
+        """ Queue one payload and wait for its own result.
+
+        :param payload: payload to predict
+        :return: result of predict_batch for this payload
+        """
+        if self._queue is None:
+            raise RuntimeError("MicroBatcher is not started")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((payload, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self._rejected += 1
+            raise
+        return await future
+
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future, float]]:
+        """ Wait for a first payload, then for more until the batch is full or the window is over.
+
+        :return: list of (payload, future, enqueue time)
+        """
+        batch = [await self._queue.get()]
+        deadline = batch[0][2] + self.max_wait
+        try:
+            while len(batch) < self.max_batch_size:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                # Sleep rather than wait_for(queue.get()): a get cancelled by a timeout may lose its payload
+                await asyncio.sleep(remaining)
+        except asyncio.CancelledError:
+            for _, future, _ in batch:
+                future.cancel()
+            raise
+        return batch
+
+    async def _run(self) -> None:
+        """ Collect batches and start their prediction until cancelled.
+        :return: None
+        """
+        while True:
+            # Wait for a free slot first, payloads keep queueing and make the next batch larger
+            await self._slots.acquire()
+            try:
+                batch = await self._collect()
+            except asyncio.CancelledError:
+                self._slots.release()
+                raise
+            task = asyncio.create_task(self._predict(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _predict(self, batch: List[Tuple[Any, asyncio.Future, float]]) -> None:
+        """ Predict one batch and give each caller its result.
+
+        :param batch: list of (payload, future, enqueue time)
+        :return: None
+        """
+        start = time.perf_counter()
+        payloads = [payload for payload, _, _ in batch]
+        try:
+            # Predict outside of the event loop, requests keep queueing meanwhile
+            results = await asyncio.get_running_loop().run_in_executor(self._executor, self.predict_batch, payloads)
+        except Exception as error:  # noqa: BLE001
+            self.logger.exception("Prediction of a batch of %d payloads failed", len(batch))
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        finally:
+            self._slots.release()
+        end = time.perf_counter()
+        for (_, future, _), result in zip(batch, results):
+            # Caller may have gone away, e.g. client disconnected
+            if not future.done():
+                future.set_result(result)
+
+        self._batches += 1
+        self._items += len(batch)
+        self._max_batch_seen = max(self._max_batch_seen, len(batch))
+        self._wait_total += sum(start - enqueued for _, _, enqueued in batch)
+        self._predict_total += end - start
+
+    def stats(self) -> Dict[str, float]:
+        """ Configuration and counters of the batcher.
+
+        :return: dictionary of metrics
+        """
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "max_queue_size": self.max_queue_size,
+            "max_concurrent_batches": self.max_concurrent_batches,
+            "batches_in_flight": len(self._in_flight),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self._batches,
+            "items": self._items,
+            "rejected": self._rejected,
+            "mean_batch_size": self._items / self._batches if self._batches else 0.0,
+            "max_batch_size_seen": self._max_batch_seen,
+            "mean_wait_ms": 1000 * self._wait_total / self._items if self._items else 0.0,
+            "mean_predict_ms": 1000 * self._predict_total / self._batches if self._batches else 0.0,
+        }
@@ -0,0 +1,113 @@
+""" Versioned bundles of trained artifacts, published at once.
+
+Training writes the model and every file exported with it (compiled forest, preprocessor, decision policy, drift
+reference, incremental state) in a new version directory, then publishes the version by swapping its manifest with
+os.replace. Servers resolve the model path through the manifest: they switch to all artifacts of a version together,
+never to a new model with the decision policy of the previous one. For model_path trained_models/extraTrees_model.sav:
+
+    trained_models/extraTrees_model.manifest.json      {"version": ..., "model_path": <model file of the version>}
+    trained_models/extraTrees_model.versions/<version>/extraTrees_model.sav, extraTrees_model_decision.json, ...
+
+Without manifest, artifacts are read next to model_path, as they were exported before bundles.
+"""
+from __future__ import annotations
+
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import Optional
+
+MANIFEST_SUFFIX = ".manifest.json"
+VERSIONS_SUFFIX = ".versions"
+# Versions kept on disk, the published one and the previous one which servers may still be reading
+KEEP_VERSIONS = 2
+
+
+def manifest_path(model_path: str) -> str:
+    """ Path of the manifest of the published version of a model.
+
+    :param model_path: path of the trained model
+    :return: path of its manifest
+    """
+    return f"{os.path.splitext(model_path)[0]}{MANIFEST_SUFFIX}"
+
+
+def versions_dir(model_path: str) -> str:
+    """ Folder of the version directories of a model.
+
+    :param model_path: path of the trained model
+    :return: path of the folder
+    """
+    return f"{os.path.splitext(model_path)[0]}{VERSIONS_SUFFIX}"
+
+
+def is_versioned(path: str) -> bool:
+    """ Whether a model path is the one of a version directory, resolved already.
+
+    :param path: path of a model file
+    :return: True for a model file in a version directory
+    """
+    return os.path.dirname(os.path.dirname(path)).endswith(VERSIONS_SUFFIX)
+
+
+def read_manifest(path: str) -> str:
+    """ Model file of the version published by a manifest.
+
+    :param path: path of the manifest
+    :return: absolute path of the model file
+    """
+    with open(path) as infile:
+        manifest = json.load(infile)
+    return os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(path)), manifest["model_path"]))
+
+
+def current_model_path(model_path: str) -> str:
+    """ Model file of the published version of a model, read from disk.
+
+    :param model_path: path of the trained model
+    :return: path of the model file of the published version, model_path itself without manifest
+    """
+    path = manifest_path(model_path)
+    return read_manifest(path) if os.path.isfile(path) else model_path
+
+
+def new_version(model_path: str, base_path: Optional[str] = None) -> str:
+    """ Create the directory of a new version of a model, not published yet.
+
+    :param model_path: path of the trained model
+    :param base_path: model file of a version whose artifacts are copied first, e.g. to keep its decision policy
+    :return: path of the model file in the new version directory, artifacts are exported next to it
+    """
+    version = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+    directory = os.path.join(versions_dir(model_path), version)
+    os.makedirs(directory)
+    if base_path is not None:
+        base_dir, stem = os.path.split(os.path.splitext(base_path)[0])
+        for name in os.listdir(base_dir):
+            source = os.path.join(base_dir, name)
+            exported = name.startswith((f"{stem}.", f"{stem}_")) and not name.endswith(MANIFEST_SUFFIX)
+            if exported and os.path.isfile(source):
+                shutil.copy2(source, os.path.join(directory, name))
+    return os.path.join(directory, os.path.basename(model_path))
+
+
+def publish(model_path: str, version_path: str, keep: int = KEEP_VERSIONS) -> None:
+    """ Publish a version by replacing the manifest atomically, then delete the oldest versions.
+
+    :param model_path: path of the trained model
+    :param version_path: path of the model file in the version directory, as returned by new_version
+    :param keep: number of versions kept on disk, the published one included
+    :return: None
+    """
+    path = manifest_path(model_path)
+    version = os.path.basename(os.path.dirname(version_path))
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as outfile:
+        json.dump({"version": version, "model_path": os.path.relpath(version_path, os.path.dirname(path))}, outfile)
+    os.replace(tmp_path, path)
+
+    versions = sorted(os.listdir(versions_dir(model_path)))
+    for old in versions[:max(0, len(versions) - keep)]:
+        if old != version:
+            shutil.rmtree(os.path.join(versions_dir(model_path), old), ignore_errors=True)
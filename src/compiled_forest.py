@@ -0,0 +1,225 @@
+""" CompiledForest: trees of a fitted forest flattened into arrays, served with numpy only."""
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Dict
+
+import numpy as np
+
+# Suffix of a compiled forest file, next to the model file it was compiled from
+COMPILED_SUFFIX = ".forest"
+
+
+def compiled_forest_path(model_path: str) -> str:
+    """ Path of the compiled forest exported with a model.
+
+    :param model_path: path of the trained model
+    :return: path of its compiled forest
+    """
+    return f"{os.path.splitext(model_path)[0]}{COMPILED_SUFFIX}"
+
+
+class CompiledForest:
+    """ Trees of a fitted forest classifier flattened into contiguous arrays and evaluated all at once.
+
+    Nodes of all trees share the arrays feature, threshold, children and missing_left. children holds the global
+    indices of the (right, left) children of each node side by side, so one gather moves a row down, and leaves point
+    to themselves. All (tree, row) pairs step down together, vectorized, and leave the active
+    set once they reach a leaf. value holds the class probabilities of each node, normalized as sklearn trees do, and
+    tree probabilities are summed in estimator order: predictions are identical to sklearn's.
+
+    The exported file is a json header followed by the raw arrays, loading it with mmap lets several processes share
+    one copy through the page cache.
+    """
+
+    ARRAYS = ("feature", "threshold", "children", "missing_left", "value", "roots", "classes")
+
+    def __init__(self, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> None:
+        """ Instantiate CompiledForest.
+
+        :param arrays: node and tree arrays, named as in ARRAYS
+        :param meta: n_features, max_depth and feature_names
+        """
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+        self.n_features = meta["n_features"]
+        self.max_depth = meta["max_depth"]
+        self.feature_names = meta["feature_names"]
+        self.n_estimators = len(self.roots)
+        self._is_leaf = self.children[:, 0] == np.arange(len(self.children))
+        # Same attributes as sklearn estimators, used to check inputs
+        self.classes_ = self.classes
+        self.n_features_in_ = self.n_features
+        if self.feature_names is not None:
+            self.feature_names_in_ = np.array(self.feature_names, dtype=object)
+
+    @staticmethod
+    def supports(estimator: Any) -> bool:
+        """ Whether an estimator is a fitted forest classifier of sklearn decision trees.
+
+        :param estimator: fitted estimator
+        :return: True if it can be compiled
+        """
+        estimators = getattr(estimator, "estimators_", None)
+        return (
+            isinstance(estimators, list) and len(estimators) > 0 and hasattr(estimator, "classes_")
+            and all(hasattr(tree, "tree_") for tree in estimators)
+        )
+
+    @classmethod
+    def from_estimator(cls, estimator: Any) -> CompiledForest:
+        """ Compile a fitted forest classifier, e.g. ExtraTreesClassifier or RandomForestClassifier.
+
+        :param estimator: fitted forest classifier
+        :return: compiled forest
+        """
+        if not cls.supports(estimator):
+            raise TypeError(f"{type(estimator).__name__} is not a fitted forest of decision trees")
+        trees = [tree.tree_ for tree in estimator.estimators_]
+        counts = np.array([tree.node_count for tree in trees])
+        offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        n_nodes = int(counts.sum())
+
+        feature = np.zeros(n_nodes, dtype=np.int32)
+        threshold = np.full(n_nodes, np.inf)
+        children = np.repeat(np.arange(n_nodes, dtype=np.int32)[:, np.newaxis], 2, axis=1)
+        missing_left = np.zeros(n_nodes, dtype=bool)
+        value = np.empty((n_nodes, len(estimator.classes_)))
+        for tree, offset, count in zip(trees, offsets, counts):
+            nodes = slice(offset, offset + count)
+            split = tree.children_left != -1
+            feature[nodes][split] = tree.feature[split]
+            threshold[nodes][split] = tree.threshold[split]
+            children[nodes, 0][split] = tree.children_right[split] + offset
+            children[nodes, 1][split] = tree.children_left[split] + offset
+            if hasattr(tree, "missing_go_to_left"):
+                missing_left[nodes] = tree.missing_go_to_left.astype(bool)
+            # Normalized like DecisionTreeClassifier.predict_proba
+            proba = tree.value[:, 0, :len(estimator.classes_)].copy()
+            normalizer = proba.sum(axis=1)[:, np.newaxis]
+            normalizer[normalizer == 0.0] = 1.0
+            proba /= normalizer
+            value[nodes] = proba
+
+        feature_names = getattr(estimator, "feature_names_in_", None)
+        return cls(
+            arrays={
+                "feature": feature, "threshold": threshold, "children": children, "missing_left": missing_left,
+                "value": value, "roots": offsets.astype(np.int32),
+                "classes": np.asarray(estimator.classes_),
+            },
+            meta={
+                "n_features": int(estimator.n_features_in_),
+                "max_depth": int(max(tree.max_depth for tree in trees)),
+                "feature_names": None if feature_names is None else [str(name) for name in feature_names],
+            },
+        )
+
+    def apply(self, X: Any) -> np.ndarray:
+        """ Find the leaf reached by each row in each tree.
+
+        :param X: features of shape (rows, n_features)
+        :return: global leaf indices of shape (n_estimators, rows)
+        """
+        # sklearn trees compare float32 features with float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"X has shape {X.shape}, expected (rows, {self.n_features})")
+        rows = X.shape[0]
+        flat = X.ravel()
+        has_missing = bool(np.isnan(flat).any())
+        children = self.children.ravel()
+
+        # One (tree, row) pair per position, only pairs not yet at a leaf are evaluated at each step
+        nodes = np.repeat(self.roots, rows)
+        row_offsets = np.tile(np.arange(rows) * self.n_features, self.n_estimators)
+        active = np.flatnonzero(~self._is_leaf[nodes])
+        while active.size:
+            current = nodes[active]
+            values = flat[row_offsets[active] + self.feature[current]]
+            go_left = values <= self.threshold[current]
+            if has_missing:
+                go_left = np.where(np.isnan(values), self.missing_left[current], go_left)
+            current = children[2 * current + go_left]
+            nodes[active] = current
+            active = active[~self._is_leaf[current]]
+        return nodes.reshape(self.n_estimators, rows)
+
+    def predict_proba(self, X: Any, chunk_rows: int = 1024) -> np.ndarray:
+        """ Predict class probabilities, mean of tree probabilities.
+
+        :param X: features of shape (rows, n_features)
+        :param chunk_rows: rows evaluated together, bounds memory of intermediate arrays
+        :return: probabilities of shape (rows, n_classes)
+        """
+        X = np.asarray(X)
+        proba = np.empty((X.shape[0], len(self.classes)))
+        for start in range(0, X.shape[0], chunk_rows):
+            leaves = self.apply(X[start:start + chunk_rows])
+            # Cumulative sum adds trees one after the other, in the order sklearn accumulates them
+            proba[start:start + chunk_rows] = np.cumsum(self.value[leaves], axis=0)[-1] / self.n_estimators
+        return proba
+
+    def predict(self, X: Any) -> np.ndarray:
+        """ Predict classes.
+
+        :param X: features of shape (rows, n_features)
+        :return: predicted classes
+        """
+        return self.classes.take(np.argmax(self.predict_proba(X), axis=1), axis=0)
+
+    @property
+    def nbytes(self) -> int:
+        """ Memory used by the arrays, in bytes."""
+        return sum(getattr(self, name).nbytes for name in self.ARRAYS)
+
+    def export(self, path: str) -> None:
+        """ Save the compiled forest: json header length, json header, then 64-byte aligned raw arrays.
+
+        :param path: path of the compiled forest file
+        :return: None
+        """
+        specs, offset = {}, 0
+        for name in self.ARRAYS:
+            array = np.ascontiguousarray(getattr(self, name))
+            specs[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+            offset += -(-array.nbytes // 64) * 64
+        header = json.dumps({
+            "arrays": specs,
+            "meta": {"n_features": self.n_features, "max_depth": self.max_depth, "feature_names": self.feature_names},
+        }).encode("utf-8")
+        data_start = -(-(8 + len(header)) // 64) * 64
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as outfile:
+            outfile.write(len(header).to_bytes(8, "little"))
+            outfile.write(header)
+            for name in self.ARRAYS:
+                outfile.seek(data_start + specs[name]["offset"])
+                outfile.write(np.ascontiguousarray(getattr(self, name)).tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> CompiledForest:
+        """ Load a compiled forest.
+
+        :param path: path of the compiled forest file
+        :param mmap: map the arrays read-only instead of reading them, processes then share their memory
+        :return: compiled forest
+        """
+        with open(path, "rb") as infile:
+            header_length = int.from_bytes(infile.read(8), "little")
+            header = json.loads(infile.read(header_length))
+        data_start = -(-(8 + header_length) // 64) * 64
+
+        arrays = {}
+        for name, spec in header["arrays"].items():
+            dtype, shape = np.dtype(spec["dtype"]), tuple(spec["shape"])
+            if mmap:
+                arrays[name] = np.memmap(path, dtype=dtype, mode="r", offset=data_start + spec["offset"], shape=shape)
+            else:
+                arrays[name] = np.fromfile(
+                    path, dtype=dtype, count=int(np.prod(shape)), offset=data_start + spec["offset"],
+                ).reshape(shape)
+        return cls(arrays=arrays, meta=header["meta"])
@@ -0,0 +1,265 @@
+""" Columnar binary cache of CSV datasets: parsed and encoded once, then memory-mapped without copies."""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.model_registry import file_checksum, file_stamp
+from src.preprocessing import CATEGORY_MAPS, FEATURES, Preprocessor
+
+if TYPE_CHECKING:
+    import logging
+
+# Version of the layout below, a dataset written with another one is converted again
+FORMAT_VERSION = 1
+TARGET = "BAD"
+# Folder of the segments of newly labeled rows appended by src.incremental, in a folder of converted datasets
+INCREMENTS = "increments"
+# Segments are named after their content hash: uploads of the same file name never replace each other
+SEGMENT_PREFIX = "segment-"
+
+
+class Dataset:
+    """ Features, target and index of a CSV file, stored as raw little-endian blocks next to a json header.
+
+    features.bin holds a float64 matrix in column-major order: each feature is contiguous, and the whole matrix is
+    wrapped by a dataframe without copy. Categorical features are stored as the codes of CATEGORY_MAPS, missing and
+    unknown values as NaN. target.bin (int8) and index.bin (int64) are written when the CSV has them.
+    """
+
+    def __init__(self, path: str, meta: Dict, mmap: bool = True) -> None:
+        """ Instantiate Dataset, use Dataset.load or Dataset.from_csv.
+
+        :param path: folder of the dataset
+        :param meta: content of its meta.json
+        :param mmap: map files in memory, read them at once otherwise
+        """
+        self.path = path
+        self.meta = meta
+        rows = meta["rows"]
+        self.features = self._read("features.bin", "<f8", (rows, len(FEATURES)), mmap)
+        self.target = self._read("target.bin", "i1", (rows,), mmap) if meta["has_target"] else None
+        self.index = self._read("index.bin", "<i8", (rows,), mmap) if meta["has_index"] else None
+
+    def _read(self, name: str, dtype: str, shape: tuple, mmap: bool) -> np.ndarray:
+        """ Read one block.
+
+        :param name: file name in the dataset folder
+        :param dtype: numpy dtype of the block
+        :param shape: shape of the block, matrices are column-major
+        :param mmap: map the file in memory, read it at once otherwise
+        :return: read-only array
+        """
+        path = os.path.join(self.path, name)
+        if shape[0] == 0:
+            return np.empty(shape, dtype=dtype, order="F")
+        if mmap:
+            return np.memmap(path, dtype=dtype, mode="r", shape=shape, order="F")
+        array = np.fromfile(path, dtype=dtype).reshape(shape, order="F")
+        array.flags.writeable = False
+        return array
+
+    @property
+    def rows(self) -> int:
+        """ Number of rows."""
+        return self.meta["rows"]
+
+    @property
+    def content_hash(self) -> str:
+        """ Checksum of the stored blocks, identical for identical data whatever the CSV formatting."""
+        return self.meta["content_hash"]
+
+    def to_frame(self) -> pd.DataFrame:
+        """ Dataframe of FEATURES, and BAD if stored, sharing the memory of the blocks.
+
+        :return: dataframe, content_hash is in its attrs
+        """
+        index = pd.Index(self.index) if self.index is not None else None
+        df = pd.DataFrame(self.features, columns=FEATURES, index=index, copy=False)
+        if self.target is not None:
+            df[TARGET] = self.target
+        df.attrs["content_hash"] = self.content_hash
+        return df
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> Dataset:
+        """ Load a converted dataset.
+
+        :param path: folder of the dataset
+        :param mmap: map files in memory, read them at once otherwise
+        :return: dataset
+        """
+        with open(os.path.join(path, "meta.json")) as infile:
+            return cls(path, json.load(infile), mmap=mmap)
+
+    @classmethod
+    def convert(
+        cls, csv_path: str, path: str, index_col: Optional[int] = None, chunk_rows: int = 100_000,
+        logger: Optional[logging.Logger] = None,
+    ) -> Dataset:
+        """ Convert a CSV file chunk by chunk, memory stays bounded by chunk_rows whatever the file size.
+
+        :param csv_path: CSV file with FEATURES columns, categorical ones as strings, and optionally BAD
+        :param path: folder of the dataset, replaced if it exists
+        :param index_col: position of the index column in the CSV, if any
+        :param chunk_rows: number of rows parsed at a time
+        :param logger: python logger
+        :return: converted dataset
+        """
+        stamp = file_stamp(csv_path)
+        tmp_path = f"{path}.tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        encoder = Preprocessor()
+        # One file per feature while rows are appended, concatenated at the end into the column-major matrix
+        column_paths = [os.path.join(tmp_path, f"{position}.column") for position in range(len(FEATURES))]
+        column_files = [open(column_path, "wb") for column_path in column_paths]
+        target_file = open(os.path.join(tmp_path, "target.bin"), "wb")
+        index_file = open(os.path.join(tmp_path, "index.bin"), "wb")
+        digests = {name: hashlib.sha256() for name in ["features", "target", "index"]}
+        column_digests = [hashlib.sha256() for _ in FEATURES]
+        rows, has_target = 0, None
+        try:
+            for chunk in pd.read_csv(csv_path, index_col=index_col, chunksize=chunk_rows):
+                values = encoder.encode(chunk)
+                for position, column_file in enumerate(column_files):
+                    block = np.ascontiguousarray(values[:, position], dtype="<f8").tobytes()
+                    column_file.write(block)
+                    column_digests[position].update(block)
+                has_target = TARGET in chunk.columns
+                if has_target:
+                    block = chunk[TARGET].to_numpy(dtype="i1").tobytes()
+                    target_file.write(block)
+                    digests["target"].update(block)
+                if index_col is not None:
+                    block = chunk.index.to_numpy(dtype="<i8").tobytes()
+                    index_file.write(block)
+                    digests["index"].update(block)
+                rows += len(chunk)
+        finally:
+            for column_file in [*column_files, target_file, index_file]:
+                column_file.close()
+
+        with open(os.path.join(tmp_path, "features.bin"), "wb") as outfile:
+            for column_path in column_paths:
+                with open(column_path, "rb") as infile:
+                    shutil.copyfileobj(infile, outfile, 1 << 20)
+                os.remove(column_path)
+        for column_digest in column_digests:
+            digests["features"].update(column_digest.digest())
+
+        meta = {
+            "format_version": FORMAT_VERSION,
+            "source": os.path.abspath(csv_path),
+            "source_stamp": list(stamp),
+            "source_checksum": file_checksum(csv_path),
+            "index_col": index_col,
+            "category_maps": CATEGORY_MAPS,
+            "rows": rows,
+            "has_target": bool(has_target),
+            "has_index": index_col is not None,
+            "content_hash": hashlib.sha256(
+                json.dumps({name: digest.hexdigest() for name, digest in digests.items()}, sort_keys=True).encode()
+            ).hexdigest(),
+        }
+        with open(os.path.join(tmp_path, "meta.json"), "w") as outfile:
+            json.dump(meta, outfile, indent=2)
+        # Swap the whole folder, readers never see a partial dataset
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        if logger is not None:
+            logger.info("Dataset %s converted to %s: %d rows", csv_path, path, rows)
+        return cls.load(path)
+
+    @classmethod
+    def from_csv(
+        cls, csv_path: str, directory: str, index_col: Optional[int] = None, chunk_rows: int = 100_000,
+        logger: Optional[logging.Logger] = None,
+    ) -> Dataset:
+        """ Load the dataset converted from a CSV file, converting it first if it is missing or outdated.
+
+        :param csv_path: CSV file
+        :param directory: folder of converted datasets, each one in a folder named after its CSV file
+        :param index_col: position of the index column in the CSV, if any
+        :param chunk_rows: number of rows parsed at a time during conversion
+        :param logger: python logger
+        :return: dataset
+        """
+        path = os.path.join(directory, os.path.splitext(os.path.basename(csv_path))[0])
+        if cls._is_current(path, csv_path, index_col):
+            return cls.load(path)
+        return cls.convert(csv_path, path, index_col=index_col, chunk_rows=chunk_rows, logger=logger)
+
+    @classmethod
+    def append_segment(
+        cls, csv_path: str, directory: str, index_col: Optional[int] = None, chunk_rows: int = 100_000,
+        logger: Optional[logging.Logger] = None,
+    ) -> Dataset:
+        """ Convert a CSV file of labeled rows into a new segment of a folder, next to the segments appended before.
+
+        :param csv_path: CSV file
+        :param directory: folder of segments
+        :param index_col: position of the index column in the CSV, if any
+        :param chunk_rows: number of rows parsed at a time during conversion
+        :param logger: python logger
+        :return: segment, the same folder for identical rows
+        """
+        converted = cls.convert(
+            csv_path, os.path.join(directory, "incoming"), index_col=index_col, chunk_rows=chunk_rows, logger=logger,
+        )
+        if not converted.meta["has_target"]:
+            shutil.rmtree(converted.path, ignore_errors=True)
+            raise ValueError(f"{csv_path} has no column {TARGET}, only labeled rows are appended")
+        path = os.path.join(directory, f"{SEGMENT_PREFIX}{converted.content_hash[:16]}")
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(converted.path, path)
+        return cls.load(path)
+
+    @classmethod
+    def load_segments(cls, directory: str) -> List[Dataset]:
+        """ Load every segment appended to a folder.
+
+        :param directory: folder of segments
+        :return: segments, sorted by content hash; none if the folder does not exist
+        """
+        if not os.path.isdir(directory):
+            return []
+        return [cls.load(os.path.join(directory, name)) for name in sorted(os.listdir(directory))
+                if name.startswith(SEGMENT_PREFIX)]
+
+    @staticmethod
+    def _is_current(path: str, csv_path: str, index_col: Optional[int]) -> bool:
+        """ Whether a converted dataset holds the current content of its CSV file with the current encodings.
+
+        :param path: folder of the dataset
+        :param csv_path: CSV file
+        :param index_col: position of the index column in the CSV
+        :return: True if it can be loaded as is
+        """
+        try:
+            with open(os.path.join(path, "meta.json")) as infile:
+                meta = json.load(infile)
+        except FileNotFoundError:
+            return False
+        if (
+            meta["format_version"] != FORMAT_VERSION or meta["category_maps"] != CATEGORY_MAPS
+            or meta["index_col"] != index_col
+        ):
+            return False
+        # The checksum is only computed when the cheap stamp changed, e.g. the file was touched or copied
+        stamp = file_stamp(csv_path)
+        if tuple(meta["source_stamp"]) == stamp:
+            return True
+        if meta["source_checksum"] != file_checksum(csv_path):
+            return False
+        meta["source_stamp"] = list(stamp)
+        with open(os.path.join(path, "meta.json"), "w") as outfile:
+            json.dump(meta, outfile, indent=2)
+        return True
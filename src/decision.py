@@ -0,0 +1,164 @@
+""" Decision policy turning probabilities of BAD into decisions and risk bands, exported next to the model."""
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+# Risk bands, from lowest to highest probability of BAD
+RISK_BANDS = ("low", "medium", "high")
+
+
+def bad_probability(estimator: Any, features: Any) -> np.ndarray:
+    """ Probability of BAD given by a classifier, the column of class 1 in its predict_proba.
+
+    :param estimator: fitted classifier or compiled forest
+    :param features: feature matrix
+    :return: probability of BAD of each row
+    """
+    column = list(estimator.classes_).index(1)
+    return estimator.predict_proba(features)[:, column]
+
+
+def decision_path(model_path: str) -> str:
+    """ Path of the decision policy exported with a model.
+
+    :param model_path: path of the trained model
+    :return: path of its decision policy
+    """
+    return f"{os.path.splitext(model_path)[0]}_decision.json"
+
+
+class Decisions(NamedTuple):
+    """ Decisions of a batch of clients, one entry per client in each array."""
+    probabilities: np.ndarray  # probability of BAD
+    predictions: np.ndarray  # 1 means BAD, 0 means GOOD
+    risk_bands: np.ndarray  # one of RISK_BANDS
+
+
+class DecisionPolicy:
+    """ A client is predicted BAD when its probability of BAD is above threshold.
+
+    Risk bands: "low" up to review_threshold, "medium" up to threshold, to be reviewed, "high" above threshold. The
+    default policy, threshold 0.5 without review band, gives the predictions of model.predict.
+    """
+
+    def __init__(
+        self, threshold: float = 0.5, review_threshold: Optional[float] = None,
+        calibration: Optional[Dict[str, float]] = None,
+    ) -> None:
+        """ Instantiate DecisionPolicy.
+
+        :param threshold: probability of BAD above which a client is predicted BAD
+        :param review_threshold: probability of BAD above which a client is reviewed, threshold if None
+        :param calibration: metrics at the thresholds on the calibration split they were chosen on
+        """
+        self.threshold = threshold
+        self.review_threshold = threshold if review_threshold is None else min(review_threshold, threshold)
+        self.calibration = calibration or {}
+
+    def decide(self, probabilities: np.ndarray) -> Decisions:
+        """ Decisions of a batch of clients, vectorized.
+
+        :param probabilities: probability of BAD of each client
+        :return: decisions
+        """
+        probabilities = np.asarray(probabilities, dtype=float)
+        bands = (probabilities > self.review_threshold).astype(np.intp) + (probabilities > self.threshold)
+        return Decisions(
+            probabilities=probabilities,
+            predictions=(probabilities > self.threshold).astype(int),
+            risk_bands=np.asarray(RISK_BANDS, dtype=object)[bands],
+        )
+
+    def decide_one(self, probability: float) -> Tuple[int, str]:
+        """ Decision of one client, without numpy overhead.
+
+        :param probability: probability of BAD
+        :return: prediction and risk band
+        """
+        probability = float(probability)
+        band = (probability > self.review_threshold) + (probability > self.threshold)
+        return int(probability > self.threshold), RISK_BANDS[band]
+
+    def with_threshold(self, threshold: Optional[float]) -> DecisionPolicy:
+        """ Same policy with another threshold, e.g. set by the deployment.
+
+        :param threshold: probability of BAD above which a client is predicted BAD, the current one if None
+        :return: new policy
+        """
+        if threshold is None:
+            return self
+        return DecisionPolicy(threshold=threshold, review_threshold=self.review_threshold)
+
+    @classmethod
+    def fit(
+        cls, y_true: np.ndarray, probabilities: np.ndarray, beta: float = 1.0, review_recall: float = 0.95,
+    ) -> DecisionPolicy:
+        """ Choose thresholds on the precision/recall curve of a calibration split.
+
+        :param y_true: labels, 1 means BAD
+        :param probabilities: probability of BAD given by the model
+        :param beta: weight of recall against precision, threshold maximizes the F-beta score
+        :param review_recall: share of BAD clients above review_threshold, reviewed or predicted BAD
+        :return: fitted policy
+        """
+        # Only needed at training, kept off the serving import path
+        from sklearn.metrics import precision_recall_curve
+
+        probabilities = np.asarray(probabilities, dtype=float)
+        precision, recall, thresholds = precision_recall_curve(y_true, probabilities)
+        # Point i predicts BAD when probability >= thresholds[i], the last point (recall 0) has no threshold
+        precision, recall = precision[:-1], recall[:-1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            f_beta = np.nan_to_num((1 + beta ** 2) * precision * recall / (beta ** 2 * precision + recall))
+        best = int(np.argmax(f_beta))
+        # Recall decreases along the curve, the last point still reaching review_recall is the most selective one
+        review = int(np.flatnonzero(recall >= review_recall).max(initial=0))
+
+        def strict(index: int) -> float:
+            # Policies compare with ">": halfway to the next lower observed probability keeps the same clients
+            lower = thresholds[index - 1] if index > 0 else 0.0
+            return float((lower + thresholds[index]) / 2)
+
+        return cls(
+            threshold=strict(best),
+            review_threshold=strict(review),
+            calibration={
+                "rows": int(len(probabilities)),
+                "beta": beta,
+                "precision": float(precision[best]),
+                "recall": float(recall[best]),
+                "f_beta": float(f_beta[best]),
+                "review_recall": float(recall[min(review, best)]),
+            },
+        )
+
+    def export(self, path: str) -> None:
+        """ Save the policy, next to the model.
+
+        :param path: path of the json file
+        :return: None
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as outfile:
+            json.dump({
+                "threshold": self.threshold, "review_threshold": self.review_threshold, "calibration": self.calibration,
+            }, outfile, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> DecisionPolicy:
+        """ Load a policy.
+
+        :param path: path of the json file
+        :return: policy
+        """
+        with open(path) as infile:
+            content = json.load(infile)
+        return cls(
+            threshold=content["threshold"], review_threshold=content["review_threshold"],
+            calibration=content.get("calibration"),
+        )
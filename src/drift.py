@@ -0,0 +1,293 @@
+""" Drift of served clients from the training set, monitored with mergeable sketches in constant memory.
+
+Training exports a reference profile of its features next to the model, in <stem>_reference.json. The serving app
+queues the fields of the clients it scores; a background thread summarizes them in batches into sketches of a recent
+window and compares these with the reference: population stability index (PSI) of each feature, Kolmogorov-Smirnov
+statistic (KS) of numerical ones and missing rates.
+"""
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from src.metrics import DRIFT_ROWS, DRIFT_SCORE
+from src.preprocessing import CATEGORY_MAPS, FEATURES, get_client_fields
+from src.sketches import FeatureStatistics
+
+if TYPE_CHECKING:
+    import logging
+
+# PSI below STABLE_PSI: no significant change, above DRIFT_PSI: significant change, in between: moderate change
+STABLE_PSI = 0.1
+DRIFT_PSI = 0.25
+# Share given to empty bins, PSI is infinite otherwise
+_MIN_SHARE = 1e-4
+
+
+def reference_path(model_path: str) -> str:
+    """ Path of the reference profile exported with a model.
+
+    :param model_path: path of the trained model
+    :return: path of its reference profile
+    """
+    return f"{os.path.splitext(model_path)[0]}_reference.json"
+
+
+class FeatureProfile:
+    """ Sketches of each feature over a set of rows, and the number of rows, missing values included."""
+
+    def __init__(self, statistics: Optional[FeatureStatistics] = None, rows: int = 0) -> None:
+        """ Instantiate FeatureProfile.
+
+        :param statistics: sketches of the non-missing values of each feature, empty if None
+        :param rows: number of rows summarized
+        """
+        self.statistics = statistics or FeatureStatistics()
+        self.rows = rows
+
+    def update(self, values: np.ndarray) -> FeatureProfile:
+        """ Add encoded rows.
+
+        :param values: matrix of shape (rows, len(FEATURES)) in training column order, missing values are NaN
+        :return: the profile itself
+        """
+        self.statistics.update(values)
+        self.rows += len(values)
+        return self
+
+    def merge(self, other: FeatureProfile) -> FeatureProfile:
+        """ Profile of the rows of both.
+
+        :param other: other profile
+        :return: new profile
+        """
+        return FeatureProfile(self.statistics.merge(other.statistics), self.rows + other.rows)
+
+    def missing_rate(self, column: str) -> Optional[float]:
+        """ Share of missing values of a feature.
+
+        :param column: feature name
+        :return: share between 0 and 1, None without rows
+        """
+        if not self.rows:
+            return None
+        return 1.0 - self.statistics.sketches[column].count / self.rows
+
+    def export(self, path: str) -> None:
+        """ Save the profile, next to the model.
+
+        :param path: path of the json file
+        :return: None
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as outfile:
+            json.dump({"rows": self.rows, "statistics": self.statistics.to_dict()}, outfile)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> FeatureProfile:
+        """ Load a profile.
+
+        :param path: path of the json file
+        :return: profile
+        """
+        with open(path) as infile:
+            content = json.load(infile)
+        return cls(FeatureStatistics.from_dict(content["statistics"]), content["rows"])
+
+
+def population_stability_index(expected: np.ndarray, actual: np.ndarray) -> float:
+    """ PSI of two distributions over the same bins: sum of (actual - expected) * ln(actual / expected).
+
+    :param expected: share of reference values in each bin
+    :param actual: share of current values in each bin
+    :return: index, 0 for identical distributions
+    """
+    expected = np.maximum(expected, _MIN_SHARE)
+    actual = np.maximum(actual, _MIN_SHARE)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def feature_drift(reference: FeatureProfile, current: FeatureProfile, bins: int = 10) -> Dict[str, Dict]:
+    """ Compare the distribution of each feature with its reference.
+
+    Numerical features are cut in bins of equal reference weight, at reference quantiles; categorical features have
+    one bin per code. Missing values have their own bin, a feature no longer sent drifts too.
+
+    :param reference: profile of the training set
+    :param current: profile of served clients
+    :param bins: number of bins of numerical features
+    :return: psi, ks (numerical features), missing rates and number of values of each feature, scores are None
+        without current clients
+    """
+    drift = {}
+    for column in FEATURES:
+        expected, actual = reference.statistics.sketches[column], current.statistics.sketches[column]
+        scores: Dict[str, Optional[float]] = {"psi": None, "ks": None}
+        if current.rows and expected.count:
+            if column in CATEGORY_MAPS:
+                codes = sorted(set(expected.counts) | set(actual.counts))
+                expected_counts = np.array([expected.counts.get(code, 0) for code in codes], dtype=float)
+                actual_counts = np.array([actual.counts.get(code, 0) for code in codes], dtype=float)
+            else:
+                edges = np.unique([expected.quantile(q) for q in np.arange(1, bins) / bins])
+                expected_counts = np.diff(np.concatenate([[0.0], expected.cdf(edges), [1.0]])) * expected.count
+                actual_counts = np.zeros(len(edges) + 1)
+                if actual.count:
+                    actual_counts = np.diff(np.concatenate([[0.0], actual.cdf(edges), [1.0]])) * actual.count
+                    grid = np.union1d(expected.means, actual.means)
+                    scores["ks"] = float(np.max(np.abs(expected.cdf(grid) - actual.cdf(grid))))
+            scores["psi"] = population_stability_index(
+                np.append(expected_counts, reference.rows - expected.count) / reference.rows,
+                np.append(actual_counts, current.rows - actual.count) / current.rows,
+            )
+        drift[column] = {
+            **scores,
+            "missing_rate": current.missing_rate(column),
+            "reference_missing_rate": reference.missing_rate(column),
+            "values": int(actual.count),
+        }
+    return drift
+
+
+def drift_status(psi: Optional[float]) -> str:
+    """ Level of change of a PSI.
+
+    :param psi: population stability index, None without current values
+    :return: "stable", "moderate", "drift" or "unknown"
+    """
+    if psi is None:
+        return "unknown"
+    if psi < STABLE_PSI:
+        return "stable"
+    return "moderate" if psi < DRIFT_PSI else "drift"
+
+
+class DriftMonitor:
+    """ Summarize served clients off the request path and compare them with the reference profile of the model.
+
+    observe only appends clients to a buffer of at most max_buffered_rows, clients beyond it are dropped and counted.
+    Every interval_seconds, a background thread empties the buffer into the profile of the current window. Once the
+    current window holds window_rows clients, it becomes the previous window and a new one starts: clients are
+    compared over the last one to two windows, memory does not grow with traffic.
+    """
+
+    def __init__(
+        self, logger: logging.Logger, reference: Callable[[], Optional[FeatureProfile]], window_rows: int = 10000,
+        interval_seconds: float = 30.0, max_buffered_rows: int = 10000, bins: int = 10,
+    ) -> None:
+        """ Instantiate DriftMonitor.
+
+        :param logger: python logger
+        :param reference: gives the reference profile of the served model, None if it has none; called at each
+            comparison so a reloaded model is compared with its own reference
+        :param window_rows: number of clients of a window
+        :param interval_seconds: time between two updates of the scores
+        :param max_buffered_rows: maximum number of clients waiting to be summarized
+        :param bins: number of bins of numerical features
+        """
+        self.logger = logger
+        self.reference = reference
+        self.window_rows = window_rows
+        self.interval_seconds = interval_seconds
+        self.max_buffered_rows = max_buffered_rows
+        self.bins = bins
+        self._buffer: List[Mapping[str, float]] = []
+        self._buffer_lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self._current = FeatureProfile()
+        self._previous: Optional[FeatureProfile] = None
+        self._report: Dict[str, object] = {}
+        self._dropped = 0
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+
+    def observe(self, records: Sequence[Mapping[str, float]]) -> None:
+        """ Queue validated client fields to be summarized, on the request path.
+
+        :param records: validated client fields, lowercase names as in Client
+        :return: None
+        """
+        with self._buffer_lock:
+            if len(self._buffer) + len(records) > self.max_buffered_rows:
+                self._dropped += len(records)
+                DRIFT_ROWS.inc(len(records), result="dropped")
+                return
+            self._buffer.extend(records)
+
+    def start(self) -> None:
+        """ Start the background thread updating the scores.
+        :return: None
+        """
+        if self._worker is None:
+            self._stop.clear()
+            self._worker = threading.Thread(target=self._run, name="drift", daemon=True)
+            self._worker.start()
+
+    def stop(self) -> None:
+        """ Stop the background thread.
+        :return: None
+        """
+        if self._worker is None:
+            return
+        self._stop.set()
+        self._worker.join()
+        self._worker = None
+
+    def _run(self) -> None:
+        """ Update the scores every interval_seconds until stop.
+        :return: None
+        """
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                self.update()
+            except Exception:
+                self.logger.exception("Drift monitoring failed")
+
+    def update(self) -> Dict[str, object]:
+        """ Summarize buffered clients and compare the recent windows with the reference.
+
+        :return: drift report, as given by report
+        """
+        with self._buffer_lock:
+            records, self._buffer = self._buffer, []
+        with self._update_lock:
+            if records:
+                self._current.update(np.array(list(map(get_client_fields, records)), dtype=float))
+                DRIFT_ROWS.inc(len(records), result="summarized")
+            if self._current.rows >= self.window_rows:
+                self._previous, self._current = self._current, FeatureProfile()
+            window = self._current if self._previous is None else self._previous.merge(self._current)
+
+            reference = self.reference()
+            features = feature_drift(reference, window, bins=self.bins) if reference is not None else {}
+            for column, scores in features.items():
+                for statistic in ["psi", "ks"]:
+                    if scores[statistic] is not None:
+                        DRIFT_SCORE.set(scores[statistic], feature=column, statistic=statistic)
+            worst = max((scores["psi"] for scores in features.values() if scores["psi"] is not None), default=None)
+            self._report = {
+                "status": drift_status(worst) if reference is not None else "no reference",
+                "max_psi": worst,
+                "rows": window.rows,
+                "reference_rows": reference.rows if reference is not None else None,
+                "updated_at": time.time(),
+                "features": {
+                    column: dict(scores, status=drift_status(scores["psi"])) for column, scores in features.items()
+                },
+            }
+            return self.report()
+
+    def report(self) -> Dict[str, object]:
+        """ Scores of the last update and monitor counters.
+
+        :return: overall status, worst PSI, number of clients compared, and scores of each feature
+        """
+        with self._buffer_lock:
+            buffered, dropped = len(self._buffer), self._dropped
+        return {**self._report, "buffered": buffered, "dropped": dropped}
@@ -2,28 +2,54 @@
 from __future__ import annotations
 
 from collections import Counter
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Iterator, Optional
 
+import numpy as np
+import pandas as pd
 from imblearn.over_sampling import SMOTE
 from sklearn.impute import SimpleImputer
+from sklearn.neighbors import NearestNeighbors
+
+from src.preprocessing import CATEGORY_MAPS
 
 if TYPE_CHECKING:
     import logging
 
-    import pandas as pd
+# Rebalancing of classes before fitting:
+#   smote: imblearn SMOTE over the whole dataframe
+#   chunked_smote: same synthetic rows, generated batch by batch with exact neighbours straight into the final matrix
+#   approximate_smote: as chunked_smote, neighbours searched among a random sample of minority rows
+#   class_weight: no synthetic rows, classes are weighted when fitting the model
+REBALANCING_MODES = ("smote", "chunked_smote", "approximate_smote", "class_weight")
 
 
 class FeaturesGenerator:
     """ Generate features of data to predict."""
 
-    def __init__(self, logger: logging.Logger, df: pd.DataFrame):
+    def __init__(
+        self, logger: logging.Logger, df: pd.DataFrame, n_jobs: Optional[int] = None,
+        random_state: Optional[int] = None, rebalancing: str = "smote", batch_size: int = 10000,
+        neighbour_candidates: int = 2000,
+    ):
         """ Instantiate FeatureGenerator.
 
         :param logger: python logger
         :param df: dataframe containing client data
+        :param n_jobs: number of cores searching nearest neighbours during resampling, -1 for all of them
+        :param random_state: seed of resampling, None for a different sample each time
+        :param rebalancing: one of REBALANCING_MODES
+        :param batch_size: synthetic rows generated together by chunked and approximate SMOTE
+        :param neighbour_candidates: minority rows among which approximate SMOTE searches neighbours
         """
+        if rebalancing not in REBALANCING_MODES:
+            raise ValueError(f"Unsupported rebalancing {rebalancing}, expected one of {REBALANCING_MODES}")
         self.logger = logger
         self.features = df
+        self.n_jobs = n_jobs
+        self.random_state = random_state
+        self.rebalancing = rebalancing
+        self.batch_size = batch_size
+        self.neighbour_candidates = neighbour_candidates
 
         # "BAD" exist during training, but not for prediction in production
         if "BAD" in df.columns:
@@ -36,10 +62,8 @@ class FeaturesGenerator:
         """ Convert the categorical values of string columns into numerical ones.
         :return: None
         """
-        job_map = {"Other": 1, "Office": 2, "Sales": 3, "Mgr": 4, "ProfExe": 5, "Self": 6}
-        reason_map = {"DebtCon": 1, "HomeImp": 2, "Other": 3}
-        self.features["JOB"] = self.features["JOB"].map(job_map)
-        self.features["REASON"] = self.features["REASON"].map(reason_map)
+        self.features["JOB"] = self.features["JOB"].map(CATEGORY_MAPS["JOB"])
+        self.features["REASON"] = self.features["REASON"].map(CATEGORY_MAPS["REASON"])
 
     def impute_missing_values(self) -> None:
         """ Missing value imputation.
@@ -63,17 +87,87 @@ class FeaturesGenerator:
             self.features[self.str_cols] = self.features[self.str_cols].fillna('')
 
     def resampling(self) -> None:
-        """ Resampling the train dataset using SMOTE.
+        """ Rebalance classes of the train dataset, as chosen by rebalancing.
         :return: None
         """
         counter = Counter(self.target)
-        self.logger.info('Before smote, label distribution = %s', counter)
-        smt = SMOTE()
-
-        self.features, self.target = smt.fit_resample(self.features, self.target)
+        self.logger.info('Before %s, label distribution = %s', self.rebalancing, counter)
+        if self.rebalancing == "class_weight":
+            self.logger.info("Rows are kept as they are, classes are weighted by the model")
+            return
+        if self.rebalancing == "smote":
+            # SMOTE uses k_neighbors=5 by default, the search includes the sample itself
+            smt = SMOTE(
+                k_neighbors=NearestNeighbors(n_neighbors=6, n_jobs=self.n_jobs), random_state=self.random_state,
+            )
+            self.features, self.target = smt.fit_resample(self.features, self.target)
+        else:
+            self._extend_with_synthetic_rows()
 
         counter = Counter(self.target)
-        self.logger.info('After smote, label distribution = %s', counter)
+        self.logger.info('After %s, label distribution = %s', self.rebalancing, counter)
+
+    def iter_synthetic(self, k_neighbors: int = 5) -> Iterator[np.ndarray]:
+        """ Synthetic minority rows as SMOTE makes them, batch_size rows at a time, until classes are balanced.
+
+        Each synthetic row lies at a random point between a random minority row and one of its k_neighbors nearest
+        minority rows. Only one batch and its neighbours are in memory at a time; with approximate_smote, neighbours
+        are searched among neighbour_candidates random minority rows rather than all of them.
+
+        :param k_neighbors: number of neighbours a synthetic row may be drawn towards
+        :return: iterator of float matrices with the columns of features
+        """
+        counts = self.target.value_counts()
+        minority = self.features[(self.target == counts.idxmin()).to_numpy()].to_numpy(dtype=float)
+        remaining = int(counts.max() - counts.min())
+        if remaining > 0 and len(minority) < 2:
+            raise ValueError(
+                f"{self.rebalancing} needs at least 2 rows of the minority class to interpolate between, got "
+                f"{len(minority)}: use rebalancing 'class_weight'"
+            )
+        rng = np.random.default_rng(self.random_state)
+        candidates = np.arange(len(minority))
+        if self.rebalancing == "approximate_smote" and len(minority) > self.neighbour_candidates:
+            candidates = np.sort(rng.choice(len(minority), size=self.neighbour_candidates, replace=False))
+        k_neighbors = min(k_neighbors, len(candidates) - 1)
+        # One more neighbour than needed, the row itself is found when it is a candidate
+        search = NearestNeighbors(n_neighbors=k_neighbors + 1, n_jobs=self.n_jobs).fit(minority[candidates])
+
+        while remaining > 0:
+            size = min(self.batch_size, remaining)
+            base = rng.integers(len(minority), size=size)
+            distances, indices = search.kneighbors(minority[base])
+            # Skip the row itself: the first neighbour when it is at distance 0, the last one otherwise
+            itself = (candidates[indices[:, 0]] == base) | (distances[:, 0] == 0)
+            columns = rng.integers(k_neighbors, size=size) + itself
+            # In place: base + gap * (neighbour - base)
+            synthetic = minority[candidates[indices[np.arange(size), columns]]]
+            rows = minority[base]
+            synthetic -= rows
+            synthetic *= rng.random((size, 1))
+            synthetic += rows
+            yield synthetic
+            remaining -= size
+
+    def _extend_with_synthetic_rows(self) -> None:
+        """ Append synthetic rows of iter_synthetic to the features, written into a matrix allocated once.
+        :return: None
+        """
+        counts = self.target.value_counts()
+        rows = len(self.features)
+        values = np.empty((rows + int(counts.max() - counts.min()), self.features.shape[1]), dtype=float)
+        # Column by column, no temporary copy of the whole features
+        for position, column in enumerate(self.features.columns):
+            values[:rows, position] = self.features[column].to_numpy()
+        start = rows
+        for batch in self.iter_synthetic():
+            values[start:start + len(batch)] = batch
+            start += len(batch)
+        self.features = pd.DataFrame(values, columns=self.features.columns, copy=False)
+        self.target = pd.Series(
+            np.concatenate([self.target.to_numpy(), np.full(len(values) - rows, counts.idxmin())]),
+            name=self.target.name,
+        )
 
     def generate(self, tasks: list) -> None:
         """ Call methods in tasks to process data.
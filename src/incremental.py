@@ -0,0 +1,282 @@
+""" Refresh a trained forest with newly labeled rows, in time proportional to the new rows rather than the history.
+
+Run as a module from the repository root:
+    python -m src.incremental new_clients.csv --new-trees 20 --max-trees 300
+
+Each refresh appends the new rows to the dataset store as a segment, updates the imputation statistics from sketches
+of every row seen so far, grows the forest with trees fitted on the new rows only (warm start) and evicts the oldest
+trees beyond max_trees. The state of the refreshes is saved next to the model in <stem>_incremental.json.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.bundle import current_model_path, new_version
+from src.dataset import INCREMENTS, TARGET, Dataset
+from src.features_generator import FeaturesGenerator
+from src.model import Model
+from src.model_trainer import ModelTrainer
+from src.preprocessing import Preprocessor, preprocessor_path
+from src.sketches import FeatureStatistics
+from src.stages import stage_timer
+from src.train import BASE_DIR, DATASET_DIR, MODEL_PATH, export_compiled_forest, publish_version
+
+# Training set the first refresh summarizes, when the model has no incremental state yet
+HISTORY_PATH = os.path.join(BASE_DIR, "data", "train_df.csv")
+# SMOTE needs more minority rows than its neighbours
+MIN_RESAMPLING_ROWS = 6
+
+
+def incremental_state_path(model_path: str) -> str:
+    """ Path of the incremental state saved with a model.
+
+    :param model_path: path of the trained model
+    :return: path of its incremental state
+    """
+    return f"{os.path.splitext(model_path)[0]}_incremental.json"
+
+
+class IncrementalState:
+    """ What refreshes of a model have seen: segments of the dataset store, feature statistics and tree generations."""
+
+    def __init__(
+        self, statistics: FeatureStatistics, tree_generations: List[int], segments: Optional[List[Dict]] = None,
+        generation: int = 0,
+    ) -> None:
+        """ Instantiate IncrementalState.
+
+        :param statistics: statistics of every row the model was trained or refreshed on
+        :param tree_generations: refresh which fitted each tree of the forest, in estimator order, 0 for training
+        :param segments: content hash, source and rows of each appended segment
+        :param generation: number of the last refresh
+        """
+        self.statistics = statistics
+        self.tree_generations = tree_generations
+        self.segments = segments or []
+        self.generation = generation
+
+    def export(self, path: str) -> None:
+        """ Save the state, next to the model.
+
+        :param path: path of the json file
+        :return: None
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as outfile:
+            json.dump({
+                "generation": self.generation, "tree_generations": self.tree_generations, "segments": self.segments,
+                "statistics": self.statistics.to_dict(),
+            }, outfile)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> IncrementalState:
+        """ Load a state.
+
+        :param path: path of the json file
+        :return: state
+        """
+        with open(path) as infile:
+            content = json.load(infile)
+        return cls(
+            statistics=FeatureStatistics.from_dict(content["statistics"]), tree_generations=content["tree_generations"],
+            segments=content["segments"], generation=content["generation"],
+        )
+
+
+class GrownForest(Model):
+    """ Forest of an existing model grown with new trees (warm start), its oldest trees evicted beyond max_trees."""
+
+    def __init__(self, base: Any, new_trees: int, max_trees: int, **params: Any) -> None:
+        """ Instantiate GrownForest.
+
+        :param base: fitted forest classifier supporting warm_start, e.g. ExtraTreesClassifier
+        :param new_trees: number of trees to add
+        :param max_trees: maximum number of trees kept, the oldest ones are evicted first
+        :param params: parameters of the new trees, e.g. n_jobs or random_state
+        """
+        super().__init__(**params)
+        if "warm_start" not in base.get_params() or not hasattr(base, "estimators_"):
+            raise ValueError(f"{type(base).__name__} cannot be grown, a fitted forest supporting warm_start is needed")
+        if not 0 < new_trees <= max_trees:
+            raise ValueError(f"new_trees must be between 1 and max_trees, got {new_trees} and {max_trees}")
+        self.model = base
+        self.new_trees = new_trees
+        self.max_trees = max_trees
+        self.evicted = 0
+
+    def train(self, train_features: pd.DataFrame, train_labels: pd.Series) -> None:
+        """ Fit new trees on the given rows only, then evict the oldest trees.
+
+        :param train_features: features to fit the new trees
+        :param train_labels:  pandas series "BAD" to fit the new trees
+        :return: None
+        """
+        classes = np.unique(train_labels)
+        if not np.array_equal(classes, self.model.classes_):
+            raise ValueError(f"New rows have classes {classes.tolist()}, the forest needs {self.model.classes_.tolist()}")
+        self.model.set_params(warm_start=True, n_estimators=len(self.model.estimators_) + self.new_trees, **self.params)
+        self.model.fit(train_features, train_labels)
+        self.model.set_params(warm_start=False, n_jobs=None)
+
+        self.evicted = max(0, len(self.model.estimators_) - self.max_trees)
+        if self.evicted:
+            # Estimators are in fitting order, the oldest trees come first
+            del self.model.estimators_[:self.evicted]
+            self.model.set_params(n_estimators=len(self.model.estimators_))
+
+
+def bootstrap_state(model: Any, history_path: str, dataset_dir: str, logger: logging.Logger) -> IncrementalState:
+    """ State of a model trained by src.train, summarizing its training set once: the training CSV and the segments
+    appended before, which src.train adds to it.
+
+    :param model: fitted forest
+    :param history_path: CSV file of the training set
+    :param dataset_dir: folder of converted datasets
+    :param logger: python logger
+    :return: state, every tree of generation 0
+    """
+    history = Dataset.from_csv(history_path, dataset_dir, index_col=0, logger=logger)
+    segments = Dataset.load_segments(os.path.join(dataset_dir, INCREMENTS))
+    statistics = FeatureStatistics().update(history.features)
+    for segment in segments:
+        statistics.update(segment.features)
+    logger.info(
+        "No incremental state yet, statistics computed once on %d training rows",
+        history.rows + sum(segment.rows for segment in segments),
+    )
+    return IncrementalState(
+        statistics=statistics, tree_generations=[0] * len(model.estimators_),
+        segments=[
+            {"source": segment.meta["source"], "content_hash": segment.content_hash, "rows": segment.rows,
+             "generation": 0}
+            for segment in segments
+        ],
+    )
+
+
+def refresh(
+    csv_path: str, model_path: str = MODEL_PATH, new_trees: int = 20, max_trees: int = 300, n_jobs: int = -1,
+    random_state: Optional[int] = None, index_col: Optional[int] = None, history_path: str = HISTORY_PATH,
+    dataset_dir: str = DATASET_DIR, logger: logging.Logger = logging,
+) -> Dict[str, float]:
+    """ Refresh a trained forest with newly labeled rows.
+
+    The model, its preprocessor and its compiled forest are exported in a new version, published once all of them
+    are: served processes switch to it. The decision policy and drift reference of the current version are kept.
+
+    :param csv_path: CSV file of new rows with FEATURES columns, categorical ones as strings, and BAD
+    :param model_path: path of the trained model
+    :param new_trees: number of trees fitted on the new rows
+    :param max_trees: maximum number of trees of the forest, the oldest ones are evicted first
+    :param n_jobs: number of cores to fit the new trees and resample rows, -1 for all of them
+    :param random_state: seed of resampling and new trees, None for a different forest each time
+    :param index_col: position of the index column in the CSV, if any
+    :param history_path: CSV file of the training set, summarized by the first refresh only
+    :param dataset_dir: folder of converted datasets, segments are appended in its increments folder
+    :param logger: python logger
+    :return: rows appended, trees added, trees evicted, trees of the forest and seconds
+    """
+    start = time.perf_counter()
+    with stage_timer(logger, "append"):
+        base_path = current_model_path(model_path)
+        model = joblib.load(base_path)
+        if os.path.isfile(incremental_state_path(base_path)):
+            state = IncrementalState.load(incremental_state_path(base_path))
+        else:
+            state = bootstrap_state(model, history_path, dataset_dir, logger)
+        # Stored after the bootstrap, which summarizes the segments appended before
+        segment = Dataset.append_segment(
+            csv_path, os.path.join(dataset_dir, INCREMENTS), index_col=index_col, logger=logger,
+        )
+        if any(known["content_hash"] == segment.content_hash for known in state.segments):
+            logger.warning("Rows of %s were already appended, the model is not refreshed", csv_path)
+            return {"rows": 0, "new_trees": 0, "evicted": 0, "trees": len(model.estimators_), "seconds": 0.0}
+
+    with stage_timer(logger, "statistics"):
+        state.statistics.update(segment.features)
+        preprocessor = Preprocessor(fill_values=state.statistics.fill_values(logger))
+        features = preprocessor.transform(segment.to_frame())
+        target = pd.Series(segment.target, index=features.index, name=TARGET)
+        if target.value_counts().min() >= MIN_RESAMPLING_ROWS:
+            generator = FeaturesGenerator(
+                logger=logger, df=features.assign(**{TARGET: target}), n_jobs=n_jobs, random_state=random_state,
+            )
+            generator.generate(tasks=["resampling"])
+            features, target = generator.features, generator.target
+        else:
+            logger.warning("Too few rows of a class to resample, new trees are fitted on the rows as they are")
+
+    generation = state.generation + 1
+    version_path = new_version(model_path, base_path=base_path)
+    with stage_timer(logger, "fit"):
+        grown = ModelTrainer(logger=logger).train(
+            train_features=features,
+            train_labels=target,
+            model=GrownForest,
+            model_path=version_path,
+            model_params={
+                "base": model, "new_trees": new_trees, "max_trees": max_trees, "n_jobs": n_jobs,
+                # Seeds of new trees are drawn after the ones of existing trees, they must not repeat after eviction
+                "random_state": None if random_state is None else random_state + generation,
+            },
+        )
+        preprocessor.export(preprocessor_path(version_path))
+
+    with stage_timer(logger, "compile"):
+        export_compiled_forest(grown, version_path)
+
+    state.generation = generation
+    state.tree_generations = (state.tree_generations + [generation] * new_trees)[grown.evicted:]
+    state.segments.append({
+        "source": os.path.abspath(csv_path), "content_hash": segment.content_hash, "rows": segment.rows,
+        "generation": generation,
+    })
+    state.export(incremental_state_path(version_path))
+    publish_version(model_path, version_path)
+
+    seconds = time.perf_counter() - start
+    trees = len(grown.model.estimators_)
+    logger.info(
+        "Refresh %d: %d rows appended, %d trees added, %d evicted, %d trees in %.1f s",
+        generation, segment.rows, new_trees, grown.evicted, trees, seconds,
+    )
+    return {"rows": segment.rows, "new_trees": new_trees, "evicted": grown.evicted, "trees": trees, "seconds": seconds}
+
+
+def main() -> None:
+    """ Refresh the model with a file given on the command line.
+    :return: None
+    """
+    logging.basicConfig(
+        format="{asctime} - {levelname} - {message}",
+        style="{",
+        datefmt="%Y-%m-%d %H:%M",
+        level=logging.INFO,
+    )
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", help="CSV file of newly labeled clients, with column BAD")
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument("--new-trees", default=20, type=int)
+    parser.add_argument("--max-trees", default=300, type=int)
+    parser.add_argument("--n-jobs", default=-1, type=int)
+    parser.add_argument("--random-state", default=None, type=int)
+    parser.add_argument("--index-col", default=None, type=int, help="position of the index column, if any")
+    argument = parser.parse_args()
+    refresh(
+        argument.input, model_path=argument.model_path, new_trees=argument.new_trees, max_trees=argument.max_trees,
+        n_jobs=argument.n_jobs, random_state=argument.random_state, index_col=argument.index_col,
+    )
+
+
+if __name__ == "__main__":
+    main()
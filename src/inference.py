@@ -0,0 +1,202 @@
+""" Fast inference from validated client fields, without building pandas dataframes."""
+from __future__ import annotations
+
+import threading
+import warnings
+from typing import TYPE_CHECKING, Mapping, Optional, Sequence
+
+import numpy as np
+
+from src.artifacts import load_decision_policy, load_explainer, load_model, load_preprocessor
+from src.decision import bad_probability
+from src.explain import Explanations
+from src.metrics import STAGE_LATENCY
+from src.preprocessing import FEATURES, get_client_fields
+
+if TYPE_CHECKING:
+    from src.decision import DecisionPolicy, Decisions
+    from src.model_registry import LoadedModel
+    from src.prediction_cache import PredictionCache
+
+_local = threading.local()
+_checked_models = set()
+
+
+def feature_buffer(rows: int) -> np.ndarray:
+    """ Preallocated feature matrix of the current thread, reused from one call to the next.
+
+    :param rows: number of rows needed
+    :return: view of shape (rows, len(FEATURES)), content is undefined
+    """
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None or buffer.shape[0] < rows:
+        buffer = np.empty((max(rows, 64), len(FEATURES)), dtype=float)
+        _local.buffer = buffer
+    return buffer[:rows]
+
+
+def records_to_array(records: Sequence[Mapping[str, float]], out: Optional[np.ndarray] = None) -> np.ndarray:
+    """ Write client fields in a feature matrix, in training column order.
+
+    :param records: validated client fields, lowercase names as in Client, categorical features as codes
+    :param out: matrix to write in, a new one if None
+    :return: matrix of shape (len(records), len(FEATURES))
+    """
+    if out is None:
+        out = np.empty((len(records), len(FEATURES)), dtype=float)
+    for row, record in enumerate(records):
+        out[row] = get_client_fields(record)
+    return out
+
+
+def check_feature_order(model: LoadedModel) -> None:
+    """ Make sure a model was trained on FEATURES in this order, feature vectors are given by position.
+
+    :param model: loaded model
+    :return: None
+    """
+    if model.version in _checked_models:
+        return
+    names = getattr(model.model, "feature_names_in_", None)
+    if names is not None and list(names) != FEATURES:
+        raise ValueError(f"Model {model.version} was trained on features {list(names)}, expected {FEATURES}")
+    _checked_models.add(model.version)
+
+
+def predict_fields(
+    records: Sequence[Mapping[str, float]], model: Optional[LoadedModel] = None, cache: Optional[PredictionCache] = None,
+    policy: Optional[DecisionPolicy] = None,
+) -> np.ndarray:
+    """ Predict value "Bad" of validated client fields, written straight into a reused feature matrix.
+
+    :param records: validated client fields, lowercase names as in Client
+    :param model: loaded model to use, the default trained model if None
+    :param cache: cache of probabilities, only records not found in it are scored
+    :param policy: decision policy, the one exported with the model if None
+    :return: numpy ndarray containing predictions of model
+    """
+    return decide_fields(records, model=model, cache=cache, policy=policy).predictions
+
+
+def decide_fields(
+    records: Sequence[Mapping[str, float]], model: Optional[LoadedModel] = None, cache: Optional[PredictionCache] = None,
+    policy: Optional[DecisionPolicy] = None,
+) -> Decisions:
+    """ Probability of "Bad", prediction and risk band of validated client fields, in one vectorized pass.
+
+    :param records: validated client fields, lowercase names as in Client
+    :param model: loaded model to use, the default trained model if None
+    :param cache: cache of probabilities, only records not found in it are scored
+    :param policy: decision policy, the one exported with the model if None
+    :return: decisions of the policy on the probabilities of the model
+    """
+    if model is None:
+        model = load_model()
+    if policy is None:
+        policy = load_decision_policy(model.path)
+    return policy.decide(score_fields(records, model=model, cache=cache))
+
+
+def score_fields(
+    records: Sequence[Mapping[str, float]], model: Optional[LoadedModel] = None, cache: Optional[PredictionCache] = None,
+) -> np.ndarray:
+    """ Probability of "Bad" of validated client fields.
+
+    Probabilities are cached rather than decisions: a new threshold applies to cached clients at once.
+
+    :param records: validated client fields, lowercase names as in Client
+    :param model: loaded model to use, the default trained model if None
+    :param cache: cache of probabilities, only records not found in it are scored
+    :return: numpy ndarray containing probabilities of "Bad"
+    """
+    if model is None:
+        model = load_model()
+    if cache is None:
+        return _score(records, model)
+
+    keys = [cache.key(record, model.version) for record in records]
+    probabilities = [cache.get(key) for key in keys]
+    missing = [row for row, probability in enumerate(probabilities) if probability is None]
+    if missing:
+        for row, probability in zip(missing, _score([records[row] for row in missing], model).tolist()):
+            probabilities[row] = probability
+            cache.put(keys[row], probability)
+    return np.asarray(probabilities, dtype=float)
+
+
+def _score(records: Sequence[Mapping[str, float]], model: LoadedModel) -> np.ndarray:
+    """ Score validated client fields with one model call.
+
+    :param records: validated client fields, lowercase names as in Client
+    :param model: loaded model to use
+    :return: numpy ndarray containing probabilities of "Bad"
+    """
+    preprocessor = load_preprocessor(model.path)
+    if preprocessor is None:
+        # Model trained without exported preprocessor, only the dataframe path can impute its features
+        import pandas as pd
+
+        from src.train import predict_decisions
+
+        with STAGE_LATENCY.time(stage="dataframe"):
+            data_df = pd.DataFrame(list(records))
+            data_df.columns = map(str.upper, data_df.columns)
+        return predict_decisions(data_df, model=model).probabilities
+
+    check_feature_order(model)
+    with STAGE_LATENCY.time(stage="features"):
+        features = preprocessor.transform_array(records_to_array(records, out=feature_buffer(len(records))))
+    with STAGE_LATENCY.time(stage="predict"), warnings.catch_warnings():
+        # Feature vectors are written in training column order, names checked once per model in check_feature_order
+        warnings.filterwarnings("ignore", message="X does not have valid feature names", category=UserWarning)
+        return bad_probability(model.model, features)
+
+
+def explain_fields(
+    records: Sequence[Mapping[str, float]], model: Optional[LoadedModel] = None, cache: Optional[PredictionCache] = None,
+) -> Explanations:
+    """ Probability of "Bad" of validated client fields and the contribution of each feature to it.
+
+    :param records: validated client fields, lowercase names as in Client
+    :param model: loaded forest to explain, the default trained model if None
+    :param cache: cache of explanations, only records not found in it are explained
+    :return: probabilities, bias and contributions, features in the order of CLIENT_FIELDS
+    """
+    if model is None:
+        model = load_model()
+    if cache is None:
+        return _explain(records, model)
+
+    keys = [cache.key(record, model.version) for record in records]
+    explained = [cache.get(key) for key in keys]
+    missing = [row for row, explanation in enumerate(explained) if explanation is None]
+    if missing:
+        explanations = _explain([records[row] for row in missing], model)
+        for row, probability, contributions in zip(
+            missing, explanations.probabilities.tolist(), explanations.contributions,
+        ):
+            explained[row] = (probability, contributions)
+            cache.put(keys[row], explained[row])
+    return Explanations(
+        probabilities=np.array([probability for probability, _ in explained], dtype=float),
+        bias=load_explainer(model).bias,
+        contributions=np.array([contributions for _, contributions in explained]).reshape(len(records), len(FEATURES)),
+    )
+
+
+def _explain(records: Sequence[Mapping[str, float]], model: LoadedModel) -> Explanations:
+    """ Explain validated client fields with one pass over the forest.
+
+    :param records: validated client fields, lowercase names as in Client
+    :param model: loaded forest to explain
+    :return: probabilities, bias and contributions
+    """
+    preprocessor = load_preprocessor(model.path)
+    if preprocessor is None:
+        raise ValueError(f"Model {model.version} has no exported preprocessor, its predictions cannot be explained")
+    explainer = load_explainer(model)
+    check_feature_order(model)
+    with STAGE_LATENCY.time(stage="features"):
+        features = preprocessor.transform_array(records_to_array(records, out=feature_buffer(len(records))))
+    with STAGE_LATENCY.time(stage="explain"):
+        return explainer.explain(features)
@@ -0,0 +1,335 @@
+""" Counters, gauges and histograms rendered in the Prometheus text format, shared by training code and serving."""
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Upper bounds in seconds, from the fast path of one client (< 1 ms) to large uploads
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+def _escape(value: str) -> str:
+    """ Escape a label value: backslash, double quote and line feed.
+
+    :param value: label value
+    :return: escaped value
+    """
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """ Labels of one sample, e.g. {stage="predict",le="0.5"}.
+
+    :param labelnames: names of the labels
+    :param values: values of the labels
+    :param extra: label appended as is, e.g. le="0.5"
+    :return: formatted labels, empty string if there are none
+    """
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    """ Sample value in the text format.
+
+    :param value: value
+    :return: formatted value
+    """
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """ A named metric with one value per combination of label values."""
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> None:
+        """ Instantiate Metric.
+
+        :param name: metric name
+        :param documentation: help text
+        :param labelnames: names of the labels, their values are given at each update
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        """ Label values in the order of labelnames.
+
+        :param labels: value of each label
+        :return: tuple of label values
+        """
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} has labels {self.labelnames}, got {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def value(self, **labels: object) -> float:
+        """ Current value, e.g. in tests.
+
+        :param labels: value of each label
+        :return: value, 0 if never updated
+        """
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self, constant: str = "") -> List[str]:
+        """ Lines of the samples of this metric.
+
+        :param constant: labels of every sample, formatted, e.g. worker="12"
+        :return: list of lines
+        """
+        with self._lock:
+            values = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key, extra=constant)} {_format_value(value)}"
+            for key, value in values
+        ]
+
+    def render(self, constant: str = "") -> List[str]:
+        """ Lines of this metric in the text format, help and type first.
+
+        :param constant: labels of every sample, formatted, e.g. worker="12"
+        :return: list of lines
+        """
+        return [
+            f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}", *self.samples(constant),
+        ]
+
+
+class Counter(Metric):
+    """ Value which only goes up, e.g. a number of events."""
+    type = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        """ Increment the counter.
+
+        :param amount: increment, positive
+        :param labels: value of each label
+        :return: None
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, value: float, **labels: object) -> None:
+        """ Set a counter maintained elsewhere, e.g. read from a stats() dictionary at scrape time.
+
+        :param value: total so far
+        :param labels: value of each label
+        :return: None
+        """
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Gauge(Metric):
+    """ Value which goes up and down, e.g. a number of requests in flight."""
+    type = "gauge"
+
+    def inc(self, amount: float = 1.0, **labels: object) -> None:
+        """ Increment the gauge.
+
+        :param amount: increment
+        :param labels: value of each label
+        :return: None
+        """
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: object) -> None:
+        """ Decrement the gauge.
+
+        :param amount: decrement
+        :param labels: value of each label
+        :return: None
+        """
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: object) -> None:
+        """ Set the gauge.
+
+        :param value: new value
+        :param labels: value of each label
+        :return: None
+        """
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(Metric):
+    """ Distribution of observed values, counted in cumulative buckets."""
+    type = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS,
+    ) -> None:
+        """ Instantiate Histogram.
+
+        :param name: metric name
+        :param documentation: help text
+        :param labelnames: names of the labels, their values are given at each observation
+        :param buckets: sorted upper bounds of the buckets, +Inf is added
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+        # Per label values: count of each bucket (not cumulative, last one is +Inf), sum of observed values
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels: object) -> None:
+        """ Record one observation.
+
+        :param value: observed value, e.g. a duration in seconds
+        :param labels: value of each label
+        :return: None
+        """
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels: object) -> Iterator[None]:
+        """ Observe the duration of a block of code, in seconds.
+
+        :param labels: value of each label
+        :return: context manager
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: object) -> int:
+        """ Number of observations, e.g. in tests.
+
+        :param labels: value of each label
+        :return: number of observations
+        """
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def samples(self, constant: str = "") -> List[str]:
+        """ Lines of the cumulative buckets, sum and count of each combination of labels.
+
+        :param constant: labels of every sample, formatted, e.g. worker="12"
+        :return: list of lines
+        """
+        with self._lock:
+            series = sorted((key, list(counts), self._sums[key]) for key, counts in self._counts.items())
+        lines = []
+        for key, counts, total in series:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                bucket = f'le="{_format_value(bound)}"'
+                labels = _format_labels(self.labelnames, key, extra=f"{constant},{bucket}" if constant else bucket)
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key, extra=constant)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """ Metrics of one process, rendered together for a scrape.
+
+    Processes serving behind one socket, e.g. workers of ui.prefork, are scraped one at a time: constant labels tell
+    their series apart, to be summed in queries.
+    """
+
+    def __init__(self) -> None:
+        """ Instantiate MetricsRegistry."""
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._constant = ""
+
+    def set_constant_labels(self, **labels: object) -> None:
+        """ Labels added to every sample, e.g. the worker process serving the scrape.
+
+        :param labels: value of each label
+        :return: None
+        """
+        self._constant = ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels.items())
+
+    def register(self, metric: Metric) -> Metric:
+        """ Add a metric to the registry.
+
+        :param metric: metric
+        :return: the same metric, to be assigned
+        """
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, callback: Callable[[], None]) -> None:
+        """ Call a function before each scrape, e.g. to set gauges from the stats() of a component.
+
+        :param callback: function without arguments
+        :return: None
+        """
+        self._collectors.append(callback)
+
+    def render(self) -> str:
+        """ All metrics in the Prometheus text exposition format.
+
+        :return: text to serve on /metrics
+        """
+        for callback in self._collectors:
+            callback()
+        lines = [line for metric in self._metrics.values() for line in metric.render(self._constant)]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    "prediction_stage_duration_seconds",
+    "Duration of each stage of a prediction: validation, dataframe, features, predict, render.",
+    labelnames=["stage"],
+))
+MODEL_LOADS = REGISTRY.register(Counter(
+    "model_loads_total", "Model files loaded by the registry, by outcome.", labelnames=["name", "result"],
+))
+MODEL_LOAD_LATENCY = REGISTRY.register(Histogram(
+    "model_load_duration_seconds", "Duration of loading a model file.",
+))
+MODEL_REQUESTS = REGISTRY.register(Counter(
+    "model_requests_total", "Clients scored by each model of the router, on the request path or in shadow.",
+    labelnames=["role", "path"],
+))
+MODEL_LATENCY = REGISTRY.register(Histogram(
+    "model_inference_duration_seconds", "Duration of one scoring call of each model of the router.",
+    labelnames=["role", "path"],
+))
+SHADOW_COMPARISONS = REGISTRY.register(Counter(
+    "shadow_comparisons_total", "Clients scored by the candidate in shadow, by agreement with the primary model.",
+    labelnames=["result"],
+))
+SHADOW_DROPPED = REGISTRY.register(Counter(
+    "shadow_dropped_total", "Batches not mirrored to the candidate because the shadow queue was full.",
+))
+DRIFT_SCORE = REGISTRY.register(Gauge(
+    "feature_drift_score", "Drift of each feature of served clients from the training set, PSI or KS statistic.",
+    labelnames=["feature", "statistic"],
+))
+DRIFT_ROWS = REGISTRY.register(Counter(
+    "drift_monitor_rows_total", "Clients seen by the drift monitor, summarized or dropped when its buffer was full.",
+    labelnames=["result"],
+))
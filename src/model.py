@@ -1,19 +1,47 @@
-""" Abstract class Model and concrete class ExtraTrees."""
+""" Abstract class Model and concrete classes of candidate models."""
 from __future__ import annotations
 
+import os
 from abc import ABC, abstractmethod
+from typing import Any, Dict
 
 import joblib
 import numpy as np
 import pandas as pd
-from sklearn.ensemble import ExtraTreesClassifier
+from sklearn.ensemble import ExtraTreesClassifier, HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+from sklearn.svm import SVC
+
+# Compiled forests are served without sklearn, they live in their own module
+from src.compiled_forest import COMPILED_SUFFIX, CompiledForest, compiled_forest_path  # noqa: F401
+
+# Parameters given by train to every model, only passed to estimators which accept them
+OPTIONAL_PARAMS = ("n_jobs", "class_weight")
 
 
 class Model(ABC):
     """ Abstract Model class having method train to implement."""
-    def __init__(self):
-        """ Instantiate Model."""
+    def __init__(self, **params: Any):
+        """ Instantiate Model.
+
+        :param params: parameters of the underlying estimator, e.g. n_jobs
+        """
         self.model = None
+        self.params = params
+
+    def estimator_params(self, estimator: type) -> Dict[str, Any]:
+        """ Parameters of the model for an estimator class: OPTIONAL_PARAMS are left out if it does not accept them,
+        e.g. n_jobs for SVC, other parameters are passed as they are.
+
+        :param estimator: sklearn estimator class
+        :return: parameters to instantiate the estimator with
+        """
+        accepted = estimator().get_params()
+        return {
+            name: value for name, value in self.params.items() if name in accepted or name not in OPTIONAL_PARAMS
+        }
 
     @abstractmethod
     def train(self, train_features: pd.DataFrame, train_labels: np.ndarray) -> None:
@@ -31,7 +59,22 @@ class Model(ABC):
         :param path: path to save the model
         :return: None
         """
-        joblib.dump(self.model, path)
+        # Write to a temporary file first, a serving process reloading the model never sees a partial file
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        joblib.dump(self.model, tmp_path)
+        os.replace(tmp_path, path)
+
+    def export_compiled(self, path: str) -> bool:
+        """ Export the model as a compiled forest, for models which are ensembles of decision trees.
+
+        :param path: path to save the compiled forest
+        :return: True if the model could be compiled
+        """
+        if not CompiledForest.supports(self.model):
+            return False
+        CompiledForest.from_estimator(self.model).export(path)
+        return True
 
 
 class ExtraTrees(Model):
@@ -44,6 +87,63 @@ class ExtraTrees(Model):
         :return: None
         """
 
-        self.model = ExtraTreesClassifier()
+        self.model = ExtraTreesClassifier(**self.estimator_params(ExtraTreesClassifier))
         # Train the model using the training sets
         self.model.fit(train_features, train_labels)
+        # Trees are fitted in parallel, but dispatching a prediction of a few rows to a pool costs more than it saves
+        self.model.set_params(n_jobs=None)
+
+
+class RandomForest(Model):
+    """ Random forest classifier modeling."""
+    def train(self, train_features: pd.DataFrame, train_labels: pd.Series) -> None:
+        """ Train random forest classifier.
+
+        :param train_features: features to train model
+        :param train_labels:  pandas series "BAD" to train model
+        :return: None
+        """
+        self.model = RandomForestClassifier(**self.estimator_params(RandomForestClassifier))
+        self.model.fit(train_features, train_labels)
+        self.model.set_params(n_jobs=None)
+
+
+class GradientBoosting(Model):
+    """ Histogram-based gradient boosting classifier modeling."""
+    def train(self, train_features: pd.DataFrame, train_labels: pd.Series) -> None:
+        """ Train gradient boosting classifier.
+
+        :param train_features: features to train model
+        :param train_labels:  pandas series "BAD" to train model
+        :return: None
+        """
+        self.model = HistGradientBoostingClassifier(**self.estimator_params(HistGradientBoostingClassifier))
+        self.model.fit(train_features, train_labels)
+
+
+class LogisticRegressionModel(Model):
+    """ Logistic regression modeling, on standardized features."""
+    def train(self, train_features: pd.DataFrame, train_labels: pd.Series) -> None:
+        """ Train logistic regression.
+
+        :param train_features: features to train model
+        :param train_labels:  pandas series "BAD" to train model
+        :return: None
+        """
+        self.model = make_pipeline(
+            StandardScaler(), LogisticRegression(max_iter=1000, **self.estimator_params(LogisticRegression)),
+        )
+        self.model.fit(train_features, train_labels)
+
+
+class SVM(Model):
+    """ Support vector classifier modeling, on standardized features."""
+    def train(self, train_features: pd.DataFrame, train_labels: pd.Series) -> None:
+        """ Train support vector classifier, with probability estimates.
+
+        :param train_features: features to train model
+        :param train_labels:  pandas series "BAD" to train model
+        :return: None
+        """
+        self.model = make_pipeline(StandardScaler(), SVC(probability=True, **self.estimator_params(SVC)))
+        self.model.fit(train_features, train_labels)
@@ -0,0 +1,226 @@
+""" Cross-validate candidate models and parameter grids in parallel processes, and measure their serving cost.
+
+Run as a module from the repository root: python -m src.model_benchmark --models extra_trees random_forest
+"""
+from __future__ import annotations
+
+import argparse
+import logging
+import os
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple, Type
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.metrics import recall_score, roc_auc_score
+from sklearn.model_selection import ParameterGrid, StratifiedKFold
+
+from src.features_generator import FeaturesGenerator
+from src.model import (
+    COMPILED_SUFFIX, SVM, CompiledForest, ExtraTrees, GradientBoosting, LogisticRegressionModel, Model, RandomForest,
+    compiled_forest_path,
+)
+from src.model_trainer import ModelTrainer
+from src.preprocessing import Preprocessor
+from src.train import BASE_DIR, load_and_split_data
+
+# Candidate models and the grid of parameters searched for each of them
+GRIDS: Dict[str, Tuple[Type[Model], Dict[str, list]]] = {
+    "extra_trees": (ExtraTrees, {"n_estimators": [100, 300], "min_samples_leaf": [1, 2]}),
+    "random_forest": (RandomForest, {"n_estimators": [100, 300]}),
+    "gradient_boosting": (GradientBoosting, {"learning_rate": [0.1], "max_iter": [200]}),
+    "logistic_regression": (LogisticRegressionModel, {"C": [0.1, 1.0]}),
+    "svm": (SVM, {"C": [1.0, 10.0]}),
+}
+
+
+class Candidate(NamedTuple):
+    """ A model class with one set of its parameters."""
+    name: str
+    model: Type[Model]
+    params: Dict[str, Any]
+
+
+def candidates(names: Optional[Sequence[str]] = None) -> List[Candidate]:
+    """ Expand parameter grids into candidates.
+
+    :param names: names of models in GRIDS, all of them if None
+    :return: one candidate per model and combination of parameters
+    """
+    return [
+        Candidate(name=name, model=GRIDS[name][0], params=params)
+        for name in (names or GRIDS) for params in ParameterGrid(GRIDS[name][1])
+    ]
+
+
+def prepare(df: pd.DataFrame, random_state: Optional[int]) -> Tuple[Preprocessor, pd.DataFrame, pd.Series]:
+    """ Preprocess and resample training data, as src.train.train does.
+
+    :param df: training data, with column "BAD"
+    :param random_state: seed of resampling
+    :return: preprocessor fitted on df, resampled features and target
+    """
+    preprocessor = Preprocessor().fit(df)
+    features = FeaturesGenerator(
+        logger=logging, df=preprocessor.transform(df).assign(BAD=df["BAD"]), random_state=random_state,
+    )
+    features.generate(tasks=["resampling"])
+    return preprocessor, features.features, features.target
+
+
+def quality(model: Model, preprocessor: Preprocessor, df: pd.DataFrame) -> Tuple[float, float]:
+    """ Recall on class BAD and area under ROC curve of a trained model.
+
+    :param model: trained model
+    :param preprocessor: preprocessor fitted with the model
+    :param df: data to evaluate on, with column "BAD"
+    :return: recall, AUC
+    """
+    features = preprocessor.transform(df)
+    probabilities = model.model.predict_proba(features)[:, list(model.model.classes_).index(1)]
+    recall = recall_score(df["BAD"], model.model.predict(features))
+    return recall, roc_auc_score(df["BAD"], probabilities)
+
+
+def fit_candidate(
+    candidate: Candidate, train_df: pd.DataFrame, test_df: pd.DataFrame, folds: int, random_state: Optional[int],
+    directory: str,
+) -> Dict[str, Any]:
+    """ Cross-validate a candidate, then train it on all training data and export it. Runs in a worker process.
+
+    Preprocessing and resampling are fitted on the training folds only, validation folds keep the real class balance.
+
+    :param candidate: model and parameters
+    :param train_df: training data
+    :param test_df: test data
+    :param folds: number of cross-validation folds
+    :param random_state: seed of folds and resampling
+    :param directory: folder to export the trained model
+    :return: quality metrics and path of the artifact to serve
+    """
+    start = time.perf_counter()
+    scores = []
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=random_state)
+    for train_index, validation_index in splitter.split(train_df, train_df["BAD"]):
+        preprocessor, features, target = prepare(train_df.iloc[train_index], random_state)
+        model = candidate.model(**candidate.params)
+        model.train(train_features=features, train_labels=target)
+        scores.append(quality(model, preprocessor, train_df.iloc[validation_index]))
+
+    preprocessor, features, target = prepare(train_df, random_state)
+    params = "_".join(f"{key}-{value}" for key, value in sorted(candidate.params.items()))
+    model_path = os.path.join(directory, f"{candidate.name}_{params}.sav")
+    model = ModelTrainer.train(
+        train_features=features, train_labels=target, model=candidate.model, model_path=model_path,
+        model_params=candidate.params,
+    )
+    # A forest is served compiled, as src.train.load_model does
+    forest_path = compiled_forest_path(model_path)
+    test_recall, test_auc = quality(model, preprocessor, test_df)
+    return {
+        "model": candidate.name,
+        "params": candidate.params,
+        "cv_recall_bad": float(np.mean([score[0] for score in scores])),
+        "cv_auc": float(np.mean([score[1] for score in scores])),
+        "test_recall_bad": test_recall,
+        "test_auc": test_auc,
+        "fit_s": time.perf_counter() - start,
+        "artifact": forest_path if model.export_compiled(forest_path) else model_path,
+    }
+
+
+def serving_metrics(path: str, features: np.ndarray, iterations: int = 200) -> Dict[str, float]:
+    """ Size, load time, single-row latency and batch throughput of a served artifact.
+
+    :param path: path of an exported model or compiled forest
+    :param features: preprocessed features, in training column order
+    :param iterations: number of measured single-row predictions
+    :return: dictionary of metrics
+    """
+    loader = CompiledForest.load if path.endswith(COMPILED_SUFFIX) else joblib.load
+    start = time.perf_counter()
+    model = loader(path)
+    load_ms = (time.perf_counter() - start) * 1000
+
+    with warnings.catch_warnings():
+        # Features are given by position, as the serving fast path does
+        warnings.filterwarnings("ignore", message="X does not have valid feature names", category=UserWarning)
+        row = features[:1]
+        model.predict(row)
+        latencies = np.empty(iterations)
+        for iteration in range(iterations):
+            start = time.perf_counter()
+            model.predict(row)
+            latencies[iteration] = time.perf_counter() - start
+        start = time.perf_counter()
+        model.predict(features)
+        batch_seconds = time.perf_counter() - start
+
+    return {
+        "size_mb": os.path.getsize(path) / 1e6,
+        "load_ms": load_ms,
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "rows_per_s": len(features) / batch_seconds,
+    }
+
+
+def benchmark(
+    train_df: pd.DataFrame, test_df: pd.DataFrame, candidates: Sequence[Candidate], folds: int = 5,
+    max_workers: Optional[int] = None, iterations: int = 200, random_state: Optional[int] = 0,
+) -> pd.DataFrame:
+    """ Fit candidates in parallel processes, then measure their serving cost one after the other.
+
+    :param train_df: training data, cross-validated
+    :param test_df: test data, used for test metrics and serving measures
+    :param candidates: models and parameters to compare
+    :param folds: number of cross-validation folds
+    :param max_workers: number of processes, one per core if None
+    :param iterations: number of measured single-row predictions per candidate
+    :param random_state: seed of folds and resampling
+    :return: one row of quality and serving metrics per candidate, best cross-validated recall first
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [
+                executor.submit(fit_candidate, candidate, train_df, test_df, folds, random_state, directory)
+                for candidate in candidates
+            ]
+            rows = [future.result() for future in futures]
+
+        # Measured once every fitting process is done, candidates do not compete for cores
+        features = Preprocessor().fit(train_df).transform(test_df).to_numpy()
+        for row in rows:
+            row.update(serving_metrics(row.pop("artifact"), features, iterations=iterations))
+    return pd.DataFrame(rows).sort_values(["cv_recall_bad", "cv_auc"], ascending=False, ignore_index=True)
+
+
+def main() -> None:
+    """ Print the benchmark report of the candidate models.
+    :return: None
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--models", nargs="+", choices=list(GRIDS), default=list(GRIDS))
+    parser.add_argument("--folds", default=5, type=int)
+    parser.add_argument("--workers", default=None, type=int)
+    parser.add_argument("--iterations", default=200, type=int)
+    parser.add_argument("--output", default=None, help="csv file to write the report to")
+    argument = parser.parse_args()
+
+    train_df, test_df = load_and_split_data(filename=os.path.join(BASE_DIR, "data", "hmeq.csv"))
+    report = benchmark(
+        train_df, test_df, candidates(argument.models), folds=argument.folds, max_workers=argument.workers,
+        iterations=argument.iterations,
+    )
+    with pd.option_context("display.width", 200, "display.max_colwidth", 60, "display.float_format", "{:.3f}".format):
+        print(report.to_string(index=False))
+    if argument.output:
+        report.to_csv(argument.output, index=False)
+
+
+if __name__ == "__main__":
+    main()
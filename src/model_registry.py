@@ -0,0 +1,208 @@
+""" In-process registry serving trained models from memory and hot-swapping them when their file changes."""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from src.metrics import MODEL_LOAD_LATENCY, MODEL_LOADS
+
+if TYPE_CHECKING:
+    import logging
+
+
+def _joblib_load(path: str) -> Any:
+    """ Load a joblib file, joblib and the libraries of the model are imported on first use.
+
+    :param path: path of the file
+    :return: loaded object
+    """
+    import joblib
+
+    return joblib.load(path)
+
+
+class LoadedModel(NamedTuple):
+    """ A model held in memory together with the state of the file it was loaded from."""
+    name: str
+    model: Any
+    version: str  # short checksum of the model file, identifies which model answered
+    path: str
+    stamp: Tuple[int, int]  # (mtime in ns, size) of the file when it was loaded
+    loaded_at: float
+
+
+def file_checksum(path: str, chunk_size: int = 1 << 20) -> str:
+    """ Compute the sha256 checksum of a file without reading it in memory at once.
+
+    :param path: path of the file
+    :param chunk_size: number of bytes read at a time
+    :return: hexadecimal checksum
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as infile:
+        for chunk in iter(lambda: infile.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_stamp(path: str) -> Tuple[int, int]:
+    """ Cheap fingerprint of a file, used to detect that it may have changed.
+
+    :param path: path of the file
+    :return: modification time in nanoseconds and size in bytes
+    """
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class ModelRegistry:
+    """ Load each model once, serve it from memory and reload it atomically when its file changes.
+
+    Callers get a LoadedModel, an immutable snapshot: a reload swaps the registry entry, requests which already
+    hold the previous snapshot finish with it.
+    """
+
+    def __init__(self, logger: logging.Logger, check_interval: float = 1.0) -> None:
+        """ Instantiate ModelRegistry.
+
+        :param logger: python logger
+        :param check_interval: minimum number of seconds between two checks of a model file
+        """
+        self.logger = logger
+        self.check_interval = check_interval
+        self._models: Dict[str, LoadedModel] = {}
+        self._loaders: Dict[str, Callable[[str], Any]] = {}
+        self._last_check: Dict[str, float] = {}
+        self._missing: Set[str] = set()  # names whose file was not found at the last check
+        self._listeners: List[Callable[[LoadedModel, LoadedModel], None]] = []
+        self._lock = threading.Lock()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._models
+
+    def register(self, name: str, path: str, loader: Optional[Callable[[str], Any]] = None) -> LoadedModel:
+        """ Load a model file and serve it under a name.
+
+        :param name: name of the model in the registry
+        :param path: path of the model file
+        :param loader: function loading the file, joblib.load by default
+        :return: loaded model
+        """
+        with self._lock:
+            self._loaders[name] = loader or _joblib_load
+            loaded = self._load(name, path)
+            self._models[name] = loaded
+            self._last_check[name] = time.monotonic()
+        return loaded
+
+    def add_listener(self, callback: Callable[[LoadedModel, LoadedModel], None]) -> None:
+        """ Call a function each time a model is replaced by a new version, e.g. to invalidate caches.
+
+        :param callback: function called with the previous and the new loaded model
+        :return: None
+        """
+        self._listeners.append(callback)
+
+    def unregister(self, name: str) -> None:
+        """ Stop serving a model, e.g. when its file is deleted on purpose.
+
+        :param name: name of the model in the registry
+        :return: None
+        """
+        with self._lock:
+            self._models.pop(name, None)
+            self._loaders.pop(name, None)
+            self._last_check.pop(name, None)
+            self._missing.discard(name)
+
+    def unregister_directory(self, directory: str) -> None:
+        """ Stop serving every model loaded from a directory, e.g. a version which is not published anymore.
+
+        :param directory: path of the directory
+        :return: None
+        """
+        prefix = os.path.join(directory, "")
+        for name in [name for name, loaded in list(self._models.items()) if loaded.path.startswith(prefix)]:
+            self.unregister(name)
+
+    def missing(self, name: str) -> bool:
+        """ Whether the file of a model was not found at the last check, the model is still served from memory.
+
+        :param name: name of the model in the registry
+        :return: True if the file disappeared
+        """
+        return name in self._missing
+
+    def get(self, name: str) -> LoadedModel:
+        """ Get a model from memory, reloading it first if its file changed since the last check.
+
+        :param name: name of the model in the registry
+        :return: loaded model
+        """
+        loaded = self._models.get(name)
+        if loaded is None:
+            raise KeyError(f"Model {name} is not registered")
+
+        now = time.monotonic()
+        if now - self._last_check[name] >= self.check_interval:
+            self._last_check[name] = now
+            try:
+                stamp = file_stamp(loaded.path)
+            except FileNotFoundError:
+                self._missing.add(name)
+                self.logger.warning("Model file %s disappeared, keep serving version %s", loaded.path, loaded.version)
+                return loaded
+            self._missing.discard(name)
+            if stamp != loaded.stamp:
+                loaded = self.reload(name)
+        return loaded
+
+    def reload(self, name: str) -> LoadedModel:
+        """ Reload a model from its file if its content changed.
+
+        A file which cannot be loaded (e.g. still being written) keeps the current version in service.
+
+        :param name: name of the model in the registry
+        :return: loaded model
+        """
+        with self._lock:
+            current = self._models[name]
+            try:
+                checksum = file_checksum(current.path)
+                if checksum[:12] == current.version:
+                    # Touched but identical, remember the new stamp to skip checksumming it again
+                    loaded = current._replace(stamp=file_stamp(current.path))
+                else:
+                    loaded = self._load(name, current.path)
+                    self.logger.info("Model %s reloaded: version %s -> %s", name, current.version, loaded.version)
+            except Exception:  # noqa: BLE001
+                self.logger.exception("Reload of model %s failed, keep serving version %s", name, current.version)
+                MODEL_LOADS.inc(name=os.path.basename(name), result="failure")
+                return current
+            self._models[name] = loaded
+
+        if loaded.version != current.version:
+            for callback in self._listeners:
+                callback(current, loaded)
+        return loaded
+
+    def _load(self, name: str, path: str) -> LoadedModel:
+        """ Load a model file.
+
+        :param name: name of the model in the registry
+        :param path: path of the model file
+        :return: loaded model
+        """
+        start = time.perf_counter()
+        stamp = file_stamp(path)
+        version = file_checksum(path)[:12]
+        model = self._loaders[name](path)
+        MODEL_LOAD_LATENCY.observe(time.perf_counter() - start)
+        MODEL_LOADS.inc(name=os.path.basename(name), result="success")
+        self.logger.info("Model %s loaded from %s, version %s", name, path, version)
+        return LoadedModel(
+            name=name, model=model, version=version, path=path, stamp=stamp, loaded_at=time.time(),
+        )
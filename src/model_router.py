@@ -0,0 +1,281 @@
+""" Serve a primary and a candidate model side by side: canary routing and shadow comparison off the request path."""
+from __future__ import annotations
+
+import hashlib
+import queue
+import random
+import threading
+import time
+from typing import TYPE_CHECKING, Dict, Hashable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.artifacts import load_decision_policy, load_model
+from src.decision import Decisions
+from src.inference import score_fields
+from src.metrics import MODEL_LATENCY, MODEL_REQUESTS, SHADOW_COMPARISONS, SHADOW_DROPPED
+from src.prediction_cache import PredictionCache
+
+if TYPE_CHECKING:
+    import logging
+
+    from src.model_registry import LoadedModel
+
+ROUTING_MODES = ("off", "shadow", "canary")
+ROLES = ("primary", "candidate")
+
+
+class ModelRouter:
+    """ Pick the model scoring each request, and compare the candidate with the primary model in shadow mode.
+
+    Modes:
+        off: every request is scored by the primary model
+        canary: canary_fraction of clients are scored by the candidate, a client always gets the same model
+        shadow: every request is scored by the primary model, then mirrored to a queue; a background thread scores it
+            again with the candidate and records whether both decisions agree. The response never waits for it,
+            batches are dropped when the queue is full.
+    """
+
+    def __init__(
+        self, logger: logging.Logger, primary_path: str, candidate_path: Optional[str] = None, mode: str = "off",
+        canary_fraction: float = 0.0, max_queue_size: int = 1024, threshold: Optional[float] = None,
+    ) -> None:
+        """ Instantiate ModelRouter.
+
+        :param logger: python logger
+        :param primary_path: path of the primary model
+        :param candidate_path: path of the candidate model, mode must be "off" without it
+        :param mode: "off", "shadow" or "canary"
+        :param canary_fraction: share of clients scored by the candidate in canary mode
+        :param max_queue_size: maximum number of batches waiting for shadow scoring
+        :param threshold: decision threshold overriding the ones exported with the models
+        """
+        if mode not in ROUTING_MODES:
+            raise ValueError(f"Unsupported routing mode {mode}, expected one of {ROUTING_MODES}")
+        if mode != "off" and not candidate_path:
+            raise ValueError(f"Routing mode {mode} needs a candidate model")
+        if not 0.0 <= canary_fraction <= 1.0:
+            raise ValueError(f"canary_fraction must be between 0 and 1, got {canary_fraction}")
+        self.logger = logger
+        self.paths = {"primary": primary_path, "candidate": candidate_path}
+        self.mode = mode
+        self.canary_fraction = canary_fraction
+        self.threshold = threshold
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._requests = {role: 0 for role in ROLES}
+        self._seconds = {role: 0.0 for role in ROLES}
+        self._compared = 0
+        self._agreed = 0
+        self._probability_delta = 0.0
+        self._shadow_seconds = 0.0
+        self._dropped = 0
+
+    def model(self, role: str) -> LoadedModel:
+        """ Loaded model of a role, from the registry.
+
+        :param role: "primary" or "candidate"
+        :return: loaded model
+        """
+        return load_model(self.paths[role])
+
+    def start(self) -> None:
+        """ Load the models and start the shadow thread in shadow mode.
+        :return: None
+        """
+        versions = {role: self.model(role).version for role in ROLES if self.paths[role]}
+        if self.mode == "shadow" and self._worker is None:
+            self._worker = threading.Thread(target=self._run, name="shadow", daemon=True)
+            self._worker.start()
+        self.logger.info(
+            "Model routing %s: %s, canary_fraction=%.3f", self.mode, versions, self.canary_fraction,
+        )
+
+    def warm_up(self, records: Sequence[Mapping[str, float]]) -> float:
+        """ Score records once with each model, outside request statistics, so first requests find every lazy
+        initialization done: artifacts loaded and mapped, feature order checked, buffers allocated.
+
+        :param records: validated client fields
+        :return: seconds taken
+        """
+        start = time.perf_counter()
+        for role in ROLES:
+            if self.paths[role]:
+                model = self.model(role)
+                load_decision_policy(model.path, self.threshold).decide(score_fields(records, model=model))
+        return time.perf_counter() - start
+
+    def stop(self) -> None:
+        """ Stop the shadow thread once mirrored batches are compared.
+        :return: None
+        """
+        if self._worker is None:
+            return
+        self._queue.put(None)
+        self._worker.join()
+        self._worker = None
+
+    def pick(self, key: Optional[Hashable] = None) -> str:
+        """ Role of the model scoring a request.
+
+        :param key: identity of the client, e.g. its cache key, the same client always gets the same model; a random
+            draw if None
+        :return: "primary" or "candidate"
+        """
+        if self.mode != "canary":
+            return "primary"
+        if key is None:
+            share = random.random()
+        else:
+            digest = hashlib.blake2b(repr(key).encode(), digest_size=8).digest()
+            share = int.from_bytes(digest, "big") / 2 ** 64
+        return "candidate" if share < self.canary_fraction else "primary"
+
+    def score(
+        self, role: str, records: Sequence[Mapping[str, float]], cache: Optional[PredictionCache] = None,
+    ) -> Tuple[np.ndarray, LoadedModel]:
+        """ Score validated client fields with the model of a role, on the request path.
+
+        :param role: "primary" or "candidate"
+        :param records: validated client fields, lowercase names as in Client
+        :param cache: cache of probabilities, only records not found in it are scored
+        :return: probabilities of BAD and the model which gave them
+        """
+        model = self.model(role)
+        start = time.perf_counter()
+        probabilities = score_fields(records, model=model, cache=cache)
+        self._record(role, "request", len(records), time.perf_counter() - start)
+        return probabilities, model
+
+    def decide(
+        self, records: Sequence[Mapping[str, float]], cache: Optional[PredictionCache] = None,
+    ) -> Tuple[Decisions, List[str]]:
+        """ Score and decide validated client fields on the request path, each client with the model pick gives it,
+        as for a single client.
+
+        :param records: validated client fields, lowercase names as in Client
+        :param cache: cache of probabilities, only records not found in it are scored
+        :return: decisions in the order of records, and the version of the model deciding each record
+        """
+        roles = [self.pick(PredictionCache.key(record, "")) for record in records]
+        decisions, versions = [], [""] * len(records)
+        positions = {role: [index for index, picked in enumerate(roles) if picked == role] for role in ROLES}
+        for role, indexes in positions.items():
+            if not indexes:
+                continue
+            probabilities, model = self.score(role, [records[index] for index in indexes], cache)
+            decisions.append((indexes, load_decision_policy(model.path, self.threshold).decide(probabilities)))
+            for index in indexes:
+                versions[index] = model.version
+        if len(decisions) == 1:
+            return decisions[0][1], versions
+        merged = Decisions(*(np.empty(len(records), dtype=field.dtype) for field in decisions[0][1]))
+        for indexes, role_decisions in decisions:
+            for field, values in zip(merged, role_decisions):
+                field[indexes] = values
+        return merged, versions
+
+    def record(self, role: str, rows: int, seconds: float) -> None:
+        """ Count clients scored on the request path by the model of a role outside score, e.g. by a StreamScorer.
+
+        :param role: "primary" or "candidate"
+        :param rows: number of clients scored
+        :param seconds: duration of the scoring
+        :return: None
+        """
+        self._record(role, "request", rows, seconds)
+
+    def mirror(self, records: Sequence[Mapping[str, float]], probabilities: np.ndarray) -> None:
+        """ Queue records scored by the primary model for the candidate, in shadow mode.
+
+        :param records: validated client fields
+        :param probabilities: probabilities of BAD given by the primary model
+        :return: None
+        """
+        if self.mode != "shadow":
+            return
+        try:
+            self._queue.put_nowait((list(records), np.asarray(probabilities, dtype=float)))
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+            SHADOW_DROPPED.inc()
+
+    def _run(self) -> None:
+        """ Compare mirrored batches until stop.
+        :return: None
+        """
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self._compare(*item)
+            except Exception:
+                self.logger.exception("Shadow scoring failed")
+
+    def _compare(self, records: List[Mapping[str, float]], primary_probabilities: np.ndarray) -> None:
+        """ Score a mirrored batch with the candidate and compare decisions of both models.
+
+        :param records: validated client fields
+        :param primary_probabilities: probabilities of BAD given by the primary model
+        :return: None
+        """
+        primary, candidate = self.model("primary"), self.model("candidate")
+        start = time.perf_counter()
+        candidate_probabilities = score_fields(records, model=candidate)
+        seconds = time.perf_counter() - start
+        self._record("candidate", "shadow", len(records), seconds)
+
+        primary_predictions = load_decision_policy(primary.path, self.threshold).decide(primary_probabilities)
+        candidate_predictions = load_decision_policy(candidate.path, self.threshold).decide(candidate_probabilities)
+        agreed = int(np.sum(primary_predictions.predictions == candidate_predictions.predictions))
+        with self._lock:
+            self._compared += len(records)
+            self._agreed += agreed
+            self._probability_delta += float(np.abs(candidate_probabilities - primary_probabilities).sum())
+            self._shadow_seconds += seconds
+        SHADOW_COMPARISONS.inc(agreed, result="agree")
+        SHADOW_COMPARISONS.inc(len(records) - agreed, result="disagree")
+
+    def _record(self, role: str, path: str, rows: int, seconds: float) -> None:
+        """ Count a scoring call of a model.
+
+        :param role: "primary" or "candidate"
+        :param path: "request" or "shadow"
+        :param rows: number of clients scored
+        :param seconds: duration of the call
+        :return: None
+        """
+        MODEL_REQUESTS.inc(rows, role=role, path=path)
+        MODEL_LATENCY.observe(seconds, role=role, path=path)
+        if path == "request":
+            with self._lock:
+                self._requests[role] += rows
+                self._seconds[role] += seconds
+
+    def stats(self) -> Dict[str, object]:
+        """ Clients scored by each model, scoring time per client, and agreement of both models in shadow mode.
+
+        :return: dictionary of metrics
+        """
+        versions = {role: self.model(role).version if self.paths[role] else None for role in ROLES}
+        with self._lock:
+            models = {
+                role: {
+                    "version": versions[role],
+                    "requests": self._requests[role],
+                    "ms_per_client": 1000 * self._seconds[role] / self._requests[role] if self._requests[role] else 0.0,
+                }
+                for role in ROLES
+            }
+            shadow = {
+                "compared": self._compared,
+                "agreement_rate": self._agreed / self._compared if self._compared else None,
+                "mean_probability_delta": self._probability_delta / self._compared if self._compared else None,
+                "ms_per_client": 1000 * self._shadow_seconds / self._compared if self._compared else 0.0,
+                "queue_depth": self._queue.qsize(),
+                "dropped": self._dropped,
+            }
+        return {"mode": self.mode, "canary_fraction": self.canary_fraction, **models, "shadow": shadow}
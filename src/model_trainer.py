@@ -3,7 +3,7 @@ from __future__ import annotations
 
 import logging
 from pathlib import Path
-from typing import TYPE_CHECKING, Type
+from typing import TYPE_CHECKING, Any, Dict, Optional, Type
 
 import pandas as pd
 
@@ -25,7 +25,8 @@ class ModelTrainer:
     @staticmethod
     def train(
         train_features: pd.DataFrame, train_labels: list, model: Type[Model], model_path: str,
-    ) -> None:
+        model_params: Optional[Dict[str, Any]] = None,
+    ) -> Model:
         """
         Train model
 
@@ -33,12 +34,14 @@ class ModelTrainer:
         :param train_labels: training labels
         :param model: a model class, with a function train
         :param model_path: path to store model
+        :param model_params: parameters of the model, e.g. {"n_jobs": -1}
 
-        :return: None
+        :return: trained model
         """
-        model = model()
+        model = model(**(model_params or {}))
         model.train(
             train_features=train_features,
             train_labels=train_labels,
         )
         model.export_model(model_path)
+        return model
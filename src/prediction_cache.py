@@ -0,0 +1,104 @@
+""" Bounded LRU cache of predictions, keyed on canonical client features and model version."""
+from __future__ import annotations
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Mapping, Optional
+
+from src.preprocessing import get_client_fields
+
+
+class PredictionCache:
+    """ Least recently used predictions, each valid for ttl_seconds.
+
+    Keys contain the model version, a reloaded model never answers with predictions of the previous one; clear() is
+    called on reload to free their memory.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 300.0) -> None:
+        """ Instantiate PredictionCache.
+
+        :param max_entries: maximum number of cached predictions, least recently used ones are evicted first
+        :param ttl_seconds: time after which a prediction is computed again
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def key(record: Mapping[str, float], model_version: str) -> Hashable:
+        """ Canonical key of validated client fields: same values give the same key, e.g. 1 and 1.0.
+
+        :param record: validated client fields, lowercase names as in Client
+        :param model_version: version of the model predicting them
+        :return: hashable key
+        """
+        # NaN is not equal to itself, it would never be found
+        return (model_version, *(
+            None if math.isnan(value) else value for value in map(float, get_client_fields(record))
+        ))
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """ Get a cached prediction.
+
+        :param key: key given by PredictionCache.key
+        :return: prediction, None if not cached or expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, prediction: Any) -> None:
+        """ Cache a prediction, evicting the least recently used ones beyond max_entries.
+
+        :param key: key given by PredictionCache.key
+        :param prediction: prediction to cache
+        :return: None
+        """
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (prediction, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """ Drop every cached prediction, e.g. when the model is reloaded.
+        :return: None
+        """
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, float]:
+        """ Configuration and counters of the cache.
+
+        :return: dictionary of metrics
+        """
+        lookups = self.hits + self.misses
+        return {
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,162 @@
+""" Fitted preprocessing of client data, exported next to the model to be replayed at prediction time."""
+from __future__ import annotations
+
+import json
+import os
+from operator import itemgetter
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    import logging
+
+    import pandas as pd
+
+# Model input columns, in training order
+FEATURES = ["LOAN", "MORTDUE", "VALUE", "REASON", "JOB", "YOJ", "DEROG", "DELINQ", "CLAGE", "NINQ", "CLNO", "DEBTINC"]
+# Validated client fields, lowercase names as in Client, in the order of model features
+CLIENT_FIELDS = [feature.lower() for feature in FEATURES]
+get_client_fields = itemgetter(*CLIENT_FIELDS)
+
+# Encoding of categorical values, codes are the ones expected by the API
+CATEGORY_MAPS = {
+    "JOB": {"Other": 1, "Office": 2, "Sales": 3, "Mgr": 4, "ProfExe": 5, "Self": 6},
+    "REASON": {"DebtCon": 1, "HomeImp": 2, "Other": 3},
+}
+
+
+def preprocessor_path(model_path: str) -> str:
+    """ Path of the preprocessor exported with a model.
+
+    :param model_path: path of the trained model
+    :return: path of its preprocessor
+    """
+    return f"{os.path.splitext(model_path)[0]}_preprocessor.json"
+
+
+class Preprocessor:
+    """ Encode categorical features and impute missing values with statistics learned on the training set.
+
+    Imputation values are medians for numerical features and most frequent codes for categorical features, they never
+    depend on the data being predicted, so a single row gets the same features as it would in a large batch.
+    """
+
+    def __init__(
+        self, fill_values: Optional[Dict[str, float]] = None, category_maps: Optional[Dict[str, Dict[str, int]]] = None,
+    ) -> None:
+        """ Instantiate Preprocessor.
+
+        :param fill_values: imputation value of each feature, None before fit
+        :param category_maps: codes of the values of each categorical feature
+        """
+        self.category_maps = category_maps or CATEGORY_MAPS
+        self.fill_values = fill_values
+        self._build_lookups()
+
+    def _build_lookups(self) -> None:
+        """ Precompute arrays used to impute whole columns at once, lookups of encode are built on first use.
+        :return: None
+        """
+        self._lookups: Optional[Dict[str, Tuple[pd.Index, np.ndarray]]] = None
+        self._fill = None
+        if self.fill_values is not None:
+            self._fill = np.array([self.fill_values[column] for column in FEATURES], dtype=float)
+
+    def encode(self, df: pd.DataFrame) -> np.ndarray:
+        """ Convert features to a float matrix in training column order, categorical strings become codes.
+
+        :param df: dataframe with FEATURES columns, categorical ones either strings or codes
+        :return: matrix of shape (rows, len(FEATURES)), missing values are NaN
+        """
+        # Serving encodes records without pandas, dataframes only come with pandas already imported
+        import pandas as pd
+
+        if self._lookups is None:
+            # Unknown values get index -1, i.e. the trailing NaN, and are imputed like missing ones
+            self._lookups = {
+                column: (pd.Index(list(mapping)), np.append(np.array(list(mapping.values()), dtype=float), np.nan))
+                for column, mapping in self.category_maps.items()
+            }
+        values = np.empty((len(df), len(FEATURES)), dtype=float)
+        for position, column in enumerate(FEATURES):
+            series = df[column]
+            if column in self._lookups and not pd.api.types.is_numeric_dtype(series.dtype):
+                index, codes = self._lookups[column]
+                values[:, position] = codes[index.get_indexer(series)]
+            else:
+                values[:, position] = series.to_numpy(dtype=float, na_value=np.nan)
+        return values
+
+    def fit(self, df: pd.DataFrame, logger: Optional[logging.Logger] = None) -> Preprocessor:
+        """ Learn imputation values from the training set.
+
+        :param df: training dataframe
+        :param logger: python logger
+        :return: fitted preprocessor
+        """
+        values = self.encode(df)
+        fill_values = {}
+        for position, column in enumerate(FEATURES):
+            observed = values[:, position][~np.isnan(values[:, position])]
+            if observed.size == 0:
+                # Edge case, no value at all in training set
+                if logger is not None:
+                    logger.warning("No value to learn for column %s, missing values will be 0", column)
+                fill_values[column] = 0.0
+            elif column in self.category_maps:
+                # Most frequent code, the smallest one in case of a tie
+                codes, counts = np.unique(observed, return_counts=True)
+                fill_values[column] = float(codes[np.argmax(counts)])
+            else:
+                fill_values[column] = float(np.median(observed))
+        self.fill_values = fill_values
+        self._build_lookups()
+        if logger is not None:
+            logger.info("Preprocessor fitted, imputation values = %s", fill_values)
+        return self
+
+    def transform_array(self, values: np.ndarray) -> np.ndarray:
+        """ Impute missing values of an encoded float matrix, in place.
+
+        :param values: matrix of shape (rows, len(FEATURES)) in training column order
+        :return: the imputed matrix
+        """
+        if self._fill is None:
+            raise RuntimeError("Preprocessor is not fitted")
+        missing = np.isnan(values)
+        if missing.any():
+            values[missing] = np.broadcast_to(self._fill, values.shape)[missing]
+        return values
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """ Encode and impute client data.
+
+        :param df: dataframe with FEATURES columns, other columns are ignored
+        :return: dataframe of model features
+        """
+        import pandas as pd
+
+        return pd.DataFrame(self.transform_array(self.encode(df)), columns=FEATURES, index=df.index)
+
+    def export(self, path: str) -> None:
+        """ Save the fitted preprocessor, next to the model.
+
+        :param path: path of the json file
+        :return: None
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as outfile:
+            json.dump({"fill_values": self.fill_values, "category_maps": self.category_maps}, outfile, indent=2)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Preprocessor:
+        """ Load a fitted preprocessor.
+
+        :param path: path of the json file
+        :return: preprocessor
+        """
+        with open(path) as infile:
+            content = json.load(infile)
+        return cls(fill_values=content["fill_values"], category_maps=content["category_maps"])
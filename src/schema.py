@@ -0,0 +1,47 @@
+""" Schema of the client data sent to the model for prediction."""
+from __future__ import annotations
+
+from pydantic import BaseModel, field_validator
+
+# Codes allowed for categorical fields
+CATEGORIES = {"reason": (1, 2, 3), "job": (1, 2, 3, 4, 5, 6)}
+
+
+class Client(BaseModel):
+    """ Define model class that represent data's fields and their desired type."""
+    loan: int  # amount of the loan request
+    mortdue: float  # amount due on existing mortgage
+    value: float  # value of current property
+    reason: int  # 1'DebtCon' (debt consolidation), 2'HomeImp' (home improvement), 3'Other'
+    job: int  # 1'Other', 2'Office', 3'Sales', 4'Mgr', 5'ProfExe', 6'Self'
+    yoj: float  # years at present job
+    derog: float  # number of major derogatory reports
+    delinq: float  # number of delinquent credit lines
+    clage: float  # age of oldest trade line in months
+    ninq: float  # number of recent credit lines
+    clno: float  # number of credit lines
+    debtinc: float  # debt-to-income ratio
+
+    @field_validator("reason")
+    @classmethod
+    def validate_reason(cls, reason: int) -> int:
+        """ Data validation for reason attribute.
+
+        :param reason: integer value
+        :return: integer reason value
+        """
+        if reason not in CATEGORIES["reason"]:
+            raise ValueError("reason should be between 1 and 3")
+        return reason
+
+    @field_validator("job")
+    @classmethod
+    def validate_job(cls, job: int) -> int:
+        """ Data validation for job attribute.
+
+        :param job: integer value
+        :return: integer job value
+        """
+        if job not in CATEGORIES["job"]:
+            raise ValueError("job should be between 1 and 6")
+        return job
@@ -0,0 +1,316 @@
+""" Score a CSV or Parquet file of any size, chunk by chunk on a process pool, without running the API.
+
+Run as a module from the repository root:
+    python -m src.score clients.csv predictions.csv --chunk-size 100000 --workers 4
+
+Predictions, probabilities of BAD and risk bands are appended to the output file in input order. Progress is saved
+after each chunk in <output>.progress: an interrupted run started again with the same arguments resumes after the last
+saved chunk.
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import time
+import warnings
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Any, BinaryIO, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.bundle import current_model_path
+from src.decision import Decisions, bad_probability
+from src.model_registry import file_stamp
+from src.train import MODEL_PATH, load_decision_policy, load_model, load_preprocessor
+
+# Model, preprocessor and decision policy of a worker process, loaded once by _init_worker
+_worker: Dict[str, object] = {}
+
+
+def read_chunks(path: str, chunk_size: int, skip_chunks: int = 0) -> Iterator[pd.DataFrame]:
+    """ Read a CSV or Parquet file chunk by chunk.
+
+    :param path: input file, Parquet if its extension is .parquet (requires pyarrow), CSV otherwise
+    :param chunk_size: number of rows per chunk
+    :param skip_chunks: number of chunks to skip, already scored by a previous run
+    :return: iterator of dataframes
+    """
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Reading Parquet files requires pyarrow: pip install pyarrow") from None
+        batches = pq.ParquetFile(path).iter_batches(batch_size=chunk_size)
+        yield from (batch.to_pandas() for batch in itertools.islice(batches, skip_chunks, None))
+        return
+    # Chunks are cut the same way for a given file and chunk size: skipped ones are parsed and dropped one at a time,
+    # memory stays bounded by one chunk however many rows were scored
+    yield from itertools.islice(pd.read_csv(path, chunksize=chunk_size), skip_chunks, None)
+
+
+def _init_worker(model_path: str, threshold: Optional[float] = None) -> None:
+    """ Load the model, its preprocessor and its decision policy once per worker process.
+
+    The sklearn model is used rather than the compiled forest: predictions are identical, and it is faster on chunks
+    of many thousand rows.
+
+    :param model_path: path of the trained model
+    :param threshold: threshold overriding the one exported with the model
+    :return: None
+    """
+    _worker["model"] = load_model(model_path, compiled=False)
+    _worker["preprocessor"] = load_preprocessor(model_path)
+    _worker["policy"] = load_decision_policy(model_path, threshold=threshold)
+
+
+def score_chunk(chunk: pd.DataFrame) -> Decisions:
+    """ Encode, impute and score one chunk in a worker process.
+
+    :param chunk: client data, FEATURES columns with categorical ones as strings or codes
+    :return: probabilities, predictions and risk bands
+    """
+    preprocessor = _worker["preprocessor"]
+    features = preprocessor.transform_array(preprocessor.encode(chunk))
+    with warnings.catch_warnings():
+        # Features are in training column order, the fitted pipeline would warn on every chunk about their names
+        warnings.filterwarnings("ignore", message="X does not have valid feature names", category=UserWarning)
+        probabilities = bad_probability(_worker["model"].model, features)
+    return _worker["policy"].decide(probabilities)
+
+
+class _InlineExecutor(Executor):
+    """ Executor running tasks in the calling process, when no worker process is wanted."""
+
+    def submit(self, function: Callable, *args: Any, **kwargs: Any) -> Future:
+        future = Future()
+        future.set_result(function(*args, **kwargs))
+        return future
+
+
+class Progress:
+    """ Saved state of a scoring run: what was scored, from which input and model, up to which output offset."""
+
+    def __init__(self, path: str, run: Dict[str, object]) -> None:
+        """ Instantiate Progress.
+
+        :param path: json file of the progress
+        :param run: identity of the run: input, its stamp, chunk size, model version and thresholds
+        """
+        self.path = path
+        self.run = run
+        self.chunks = 0
+        self.rows = 0
+        self.output_bytes = 0
+        self.complete = False
+
+    def resume(self, logger: logging.Logger) -> bool:
+        """ Load the saved progress of the same run.
+
+        :param logger: python logger
+        :return: True if a previous run is resumed
+        """
+        if not os.path.isfile(self.path):
+            return False
+        with open(self.path) as infile:
+            saved = json.load(infile)
+        if saved["run"] != self.run:
+            logger.warning("Progress %s belongs to another run %s, start over", self.path, saved["run"])
+            return False
+        self.chunks, self.rows = saved["chunks"], saved["rows"]
+        self.output_bytes, self.complete = saved["output_bytes"], saved["complete"]
+        return True
+
+    def save(self) -> None:
+        """ Save the progress, atomically.
+        :return: None
+        """
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as outfile:
+            json.dump({
+                "run": self.run, "chunks": self.chunks, "rows": self.rows, "output_bytes": self.output_bytes,
+                "complete": self.complete,
+            }, outfile, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+def _create_output(output_path: str, progress: Progress, id_column: Optional[str]) -> BinaryIO:
+    """ Open a new output file and write its header.
+
+    :param output_path: path of the CSV file of predictions
+    :param progress: progress of the run, its output size is updated
+    :param id_column: input column copied to the output, if any
+    :return: output file, open for writing
+    """
+    output = open(output_path, "wb")
+    columns = "row,prediction,probability,risk_band" if id_column is None else (
+        f"row,{id_column},prediction,probability,risk_band"
+    )
+    output.write(f"{columns}\n".encode())
+    progress.output_bytes = output.tell()
+    return output
+
+
+def _reopen_output(output_path: str, progress: Progress) -> BinaryIO:
+    """ Open the output file of an interrupted run, positioned after the last saved chunk.
+
+    :param output_path: path of the CSV file of predictions
+    :param progress: saved progress of the run
+    :return: output file, open for writing
+    """
+    output = open(output_path, "r+b")
+    # Drop what was written after the last saved chunk
+    output.truncate(progress.output_bytes)
+    output.seek(progress.output_bytes)
+    return output
+
+
+def _make_executor(workers: Optional[int], model_path: str, threshold: Optional[float]) -> Executor:
+    """ Executor scoring chunks, each worker loads the model once.
+
+    :param workers: number of worker processes, one per core if None, 0 to score in this process
+    :param model_path: path of the trained model
+    :param threshold: threshold overriding the one exported with the model
+    :return: executor
+    """
+    if workers == 0:
+        _init_worker(model_path, threshold)
+        return _InlineExecutor()
+    return ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(model_path, threshold))
+
+
+def _write_decisions(
+    output: BinaryIO, decisions: Decisions, first_row: int, ids: Optional[np.ndarray], id_column: Optional[str],
+) -> None:
+    """ Append the decisions of a chunk to the output file.
+
+    :param output: output file
+    :param decisions: decisions of the chunk
+    :param first_row: position of the first row of the chunk in the input
+    :param ids: values of id_column of the chunk, None without id column
+    :param id_column: input column copied to the output, if any
+    :return: None
+    """
+    columns = {"row": np.arange(first_row, first_row + len(decisions.predictions))}
+    if ids is not None:
+        columns[id_column] = ids
+    columns["prediction"] = decisions.predictions
+    columns["probability"] = decisions.probabilities
+    columns["risk_band"] = decisions.risk_bands
+    pd.DataFrame(columns).to_csv(output, header=False, index=False)
+
+
+def score_file(
+    input_path: str, output_path: str, model_path: str = MODEL_PATH, chunk_size: int = 100_000,
+    workers: Optional[int] = None, id_column: Optional[str] = None, resume: bool = True,
+    logger: logging.Logger = logging, report_every: float = 10.0, threshold: Optional[float] = None,
+) -> Dict[str, float]:
+    """ Score a file chunk by chunk, at most two chunks per worker are in memory at a time.
+
+    :param input_path: CSV or Parquet file of clients, FEATURES columns, categorical ones as strings or codes
+    :param output_path: CSV file written with columns row, id_column if given, prediction, probability, risk_band
+    :param model_path: path of the trained model, exported with its preprocessor
+    :param chunk_size: number of rows per chunk
+    :param workers: number of worker processes, one per core if None, 0 to score in this process
+    :param id_column: input column copied to the output to identify clients
+    :param resume: continue a previous run with the same arguments, start over otherwise
+    :param logger: python logger
+    :param report_every: seconds between two progress logs
+    :param threshold: threshold overriding the one exported with the model
+    :return: rows scored by this run, seconds and rows per second
+    """
+    # The whole file is scored by one version, even if another one is published meanwhile
+    model_path = current_model_path(model_path)
+    if load_preprocessor(model_path) is None:
+        raise RuntimeError(f"Model {model_path} has no exported preprocessor, train it again with src.train")
+    policy = load_decision_policy(model_path, threshold=threshold)
+    run = {
+        "input": os.path.abspath(input_path), "input_stamp": list(file_stamp(input_path)), "chunk_size": chunk_size,
+        "model_version": load_model(model_path, compiled=False).version, "id_column": id_column,
+        "thresholds": [policy.threshold, policy.review_threshold],
+    }
+    progress = Progress(f"{output_path}.progress", run)
+    if resume and os.path.isfile(output_path) and progress.resume(logger):
+        if progress.complete:
+            logger.info("%s is already scored in %s, %d rows", input_path, output_path, progress.rows)
+            return {"rows": 0, "seconds": 0.0, "rows_per_second": 0.0}
+        logger.info("Resume after chunk %d, %d rows already scored", progress.chunks, progress.rows)
+        output = _reopen_output(output_path, progress)
+    else:
+        output = _create_output(output_path, progress, id_column)
+    executor = _make_executor(workers, model_path, threshold)
+    max_pending = 2 * (workers or os.cpu_count() or 1)
+
+    start = last_report = time.perf_counter()
+    rows_before = progress.rows
+    pending: Deque[Tuple[Future, Optional[np.ndarray], int]] = deque()
+
+    def write_next() -> None:
+        """ Write the oldest pending chunk once predicted, then save progress."""
+        nonlocal last_report
+        future, ids, rows = pending.popleft()
+        _write_decisions(output, future.result(), progress.rows, ids, id_column)
+        output.flush()
+        os.fsync(output.fileno())
+        progress.chunks += 1
+        progress.rows += rows
+        progress.output_bytes = output.tell()
+        progress.save()
+        now = time.perf_counter()
+        if now - last_report >= report_every:
+            last_report = now
+            logger.info("%d rows scored, %.0f rows/s", progress.rows, (progress.rows - rows_before) / (now - start))
+
+    try:
+        for chunk in read_chunks(input_path, chunk_size, skip_chunks=progress.chunks):
+            ids = chunk[id_column].to_numpy() if id_column is not None else None
+            pending.append((executor.submit(score_chunk, chunk), ids, len(chunk)))
+            if len(pending) >= max_pending:
+                write_next()
+        while pending:
+            write_next()
+        progress.complete = True
+        progress.save()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        output.close()
+
+    seconds = time.perf_counter() - start
+    rows = progress.rows - rows_before
+    logger.info("%d rows scored in %.1f s, %.0f rows/s, output %s", rows, seconds, rows / seconds, output_path)
+    return {"rows": rows, "seconds": seconds, "rows_per_second": rows / seconds if seconds > 0 else 0.0}
+
+
+def main() -> None:
+    """ Score a file given on the command line.
+    :return: None
+    """
+    logging.basicConfig(
+        format="{asctime} - {levelname} - {message}",
+        style="{",
+        datefmt="%Y-%m-%d %H:%M",
+        level=logging.INFO,
+    )
+    parser = argparse.ArgumentParser()
+    parser.add_argument("input", help="CSV or Parquet file of clients")
+    parser.add_argument("output", help="CSV file of predictions")
+    parser.add_argument("--model-path", default=MODEL_PATH)
+    parser.add_argument("--chunk-size", default=100_000, type=int)
+    parser.add_argument("--workers", default=None, type=int, help="worker processes, 0 to score in this process")
+    parser.add_argument("--id-column", default=None, help="input column copied to the output")
+    parser.add_argument("--restart", action="store_true", help="ignore saved progress and start over")
+    parser.add_argument("--threshold", default=None, type=float, help="override the threshold exported with the model")
+    argument = parser.parse_args()
+    score_file(
+        argument.input, argument.output, model_path=argument.model_path, chunk_size=argument.chunk_size,
+        workers=argument.workers, id_column=argument.id_column, resume=not argument.restart,
+        threshold=argument.threshold,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+""" Mergeable summaries of feature values, updated chunk by chunk without keeping the values."""
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+import numpy as np
+
+from src.preprocessing import CATEGORY_MAPS, FEATURES
+
+if TYPE_CHECKING:
+    import logging
+
+
+class QuantileSketch:
+    """ Approximate distribution of a numerical feature as at most capacity weighted centroids.
+
+    Values are sorted and cut into centroids of equal weight, so each centroid holds about 1/capacity of the values
+    and quantiles are within about 1/capacity in rank of the exact ones. Up to capacity values, every value is its
+    own centroid and quantiles are exact, interpolated like numpy's. Two sketches merge into the sketch of the union
+    of their values, in any order: statistics of a growing dataset are updated from its new rows only.
+    """
+
+    def __init__(
+        self, capacity: int = 500, means: Optional[np.ndarray] = None, weights: Optional[np.ndarray] = None,
+    ) -> None:
+        """ Instantiate QuantileSketch.
+
+        :param capacity: maximum number of centroids
+        :param means: sorted centroid values, empty if None
+        :param weights: number of values of each centroid
+        """
+        self.capacity = capacity
+        self.means = np.empty(0) if means is None else np.asarray(means, dtype=float)
+        self.weights = np.empty(0) if weights is None else np.asarray(weights, dtype=float)
+
+    @property
+    def count(self) -> float:
+        """ Number of values summarized."""
+        return float(self.weights.sum())
+
+    def update(self, values: np.ndarray) -> QuantileSketch:
+        """ Add values, missing ones are ignored.
+
+        :param values: new values
+        :return: the sketch itself
+        """
+        values = np.asarray(values, dtype=float)
+        values = values[~np.isnan(values)]
+        if values.size:
+            self._compress(np.append(self.means, values), np.append(self.weights, np.ones(values.size)))
+        return self
+
+    def merge(self, other: QuantileSketch) -> QuantileSketch:
+        """ Sketch of the values of both sketches.
+
+        :param other: another sketch
+        :return: new sketch
+        """
+        merged = QuantileSketch(capacity=max(self.capacity, other.capacity))
+        merged._compress(np.append(self.means, other.means), np.append(self.weights, other.weights))
+        return merged
+
+    def _compress(self, means: np.ndarray, weights: np.ndarray) -> None:
+        """ Sort centroids and merge neighbours into at most capacity centroids of about equal weight.
+
+        :param means: centroid values, in any order
+        :param weights: number of values of each centroid
+        :return: None
+        """
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        if means.size > self.capacity:
+            # Bucket of each centroid, from the middle of its weight on the cumulative weight scale
+            cumulative = np.cumsum(weights)
+            buckets = ((cumulative - weights / 2) * self.capacity / cumulative[-1]).astype(np.intp)
+            starts = np.flatnonzero(np.diff(buckets, prepend=-1))
+            bucket_weights = np.add.reduceat(weights, starts)
+            means = np.add.reduceat(means * weights, starts) / bucket_weights
+            weights = bucket_weights
+        self.means, self.weights = means, weights
+
+    def quantile(self, q: float) -> float:
+        """ Approximate quantile.
+
+        :param q: quantile between 0 and 1, 0.5 for the median
+        :return: value, NaN if the sketch is empty
+        """
+        if not self.means.size:
+            return float("nan")
+        # Centroid i stands at the middle rank of its values, ranks counted from 0 as numpy's linear quantiles do
+        positions = np.cumsum(self.weights) - (self.weights + 1) / 2
+        return float(np.interp(q * (self.count - 1), positions, self.means))
+
+    def cdf(self, values: np.ndarray) -> np.ndarray:
+        """ Approximate share of summarized values lower than or equal to each value.
+
+        :param values: values to locate
+        :return: shares between 0 and 1
+        """
+        if not self.means.size:
+            return np.full(np.shape(values), np.nan)
+        cumulative = np.append(0.0, np.cumsum(self.weights))
+        return cumulative[np.searchsorted(self.means, values, side="right")] / cumulative[-1]
+
+    def to_dict(self) -> Dict:
+        """ Content of the sketch, to be saved as json.
+
+        :return: dictionary
+        """
+        return {"capacity": self.capacity, "means": self.means.tolist(), "weights": self.weights.tolist()}
+
+    @classmethod
+    def from_dict(cls, content: Dict) -> QuantileSketch:
+        """ Sketch saved with to_dict.
+
+        :param content: dictionary
+        :return: sketch
+        """
+        return cls(capacity=content["capacity"], means=content["means"], weights=content["weights"])
+
+
+class CategoryCounts:
+    """ Exact count of each value of a categorical feature, merged by adding counts."""
+
+    def __init__(self, counts: Optional[Dict[float, float]] = None) -> None:
+        """ Instantiate CategoryCounts.
+
+        :param counts: number of occurrences of each value
+        """
+        self.counts = dict(counts or {})
+
+    @property
+    def count(self) -> float:
+        """ Number of values counted."""
+        return float(sum(self.counts.values()))
+
+    def update(self, values: np.ndarray) -> CategoryCounts:
+        """ Count values, missing ones are ignored.
+
+        :param values: new values
+        :return: the counts themselves
+        """
+        values = np.asarray(values, dtype=float)
+        codes, counts = np.unique(values[~np.isnan(values)], return_counts=True)
+        for code, count in zip(codes.tolist(), counts.tolist()):
+            self.counts[code] = self.counts.get(code, 0) + count
+        return self
+
+    def merge(self, other: CategoryCounts) -> CategoryCounts:
+        """ Counts of the values of both.
+
+        :param other: other counts
+        :return: new counts
+        """
+        merged = CategoryCounts(self.counts)
+        for code, count in other.counts.items():
+            merged.counts[code] = merged.counts.get(code, 0) + count
+        return merged
+
+    def most_frequent(self) -> float:
+        """ Most frequent value, the smallest one in case of a tie.
+
+        :return: value, NaN if nothing was counted
+        """
+        if not self.counts:
+            return float("nan")
+        return min(self.counts, key=lambda code: (-self.counts[code], code))
+
+    def to_dict(self) -> Dict:
+        """ Content of the counts, to be saved as json.
+
+        :return: dictionary
+        """
+        return {"counts": [[code, count] for code, count in sorted(self.counts.items())]}
+
+    @classmethod
+    def from_dict(cls, content: Dict) -> CategoryCounts:
+        """ Counts saved with to_dict.
+
+        :param content: dictionary
+        :return: counts
+        """
+        return cls({code: count for code, count in content["counts"]})
+
+
+class FeatureStatistics:
+    """ Sketch of each feature over all rows seen, giving the imputation values of Preprocessor without the rows."""
+
+    def __init__(self, sketches: Optional[Dict[str, Any]] = None) -> None:
+        """ Instantiate FeatureStatistics.
+
+        :param sketches: CategoryCounts of categorical features and QuantileSketch of the others, empty if None
+        """
+        self.sketches = sketches or {
+            column: CategoryCounts() if column in CATEGORY_MAPS else QuantileSketch() for column in FEATURES
+        }
+
+    def update(self, values: np.ndarray) -> FeatureStatistics:
+        """ Add encoded rows.
+
+        :param values: matrix of shape (rows, len(FEATURES)) in training column order, missing values are NaN
+        :return: the statistics themselves
+        """
+        for position, column in enumerate(FEATURES):
+            self.sketches[column].update(values[:, position])
+        return self
+
+    def merge(self, other: FeatureStatistics) -> FeatureStatistics:
+        """ Statistics of the rows of both.
+
+        :param other: other statistics
+        :return: new statistics
+        """
+        return FeatureStatistics({
+            column: sketch.merge(other.sketches[column]) for column, sketch in self.sketches.items()
+        })
+
+    def fill_values(self, logger: Optional[logging.Logger] = None) -> Dict[str, float]:
+        """ Imputation values, as Preprocessor.fit learns them: medians and most frequent codes.
+
+        :param logger: python logger
+        :return: imputation value of each feature
+        """
+        fill_values = {}
+        for column, sketch in self.sketches.items():
+            if sketch.count == 0:
+                if logger is not None:
+                    logger.warning("No value to learn for column %s, missing values will be 0", column)
+                fill_values[column] = 0.0
+            elif column in CATEGORY_MAPS:
+                fill_values[column] = float(sketch.most_frequent())
+            else:
+                fill_values[column] = sketch.quantile(0.5)
+        return fill_values
+
+    def to_dict(self) -> Dict:
+        """ Content of the statistics, to be saved as json.
+
+        :return: dictionary
+        """
+        return {column: sketch.to_dict() for column, sketch in self.sketches.items()}
+
+    @classmethod
+    def from_dict(cls, content: Dict) -> FeatureStatistics:
+        """ Statistics saved with to_dict.
+
+        :param content: dictionary
+        :return: statistics
+        """
+        return cls({
+            column: (CategoryCounts if column in CATEGORY_MAPS else QuantileSketch).from_dict(content[column])
+            for column in FEATURES
+        })
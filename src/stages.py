@@ -0,0 +1,129 @@
+""" Timing and on-disk caching of the stages of a training run."""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, Optional, Tuple
+
+import joblib
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+if TYPE_CHECKING:
+    import logging
+
+
+def frame_fingerprint(df: pd.DataFrame) -> str:
+    """ Checksum of the content of a dataframe: values, index, column names and types.
+
+    :param df: dataframe to fingerprint
+    :return: hexadecimal checksum
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[str(column), str(dtype)] for column, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+@contextmanager
+def stage_timer(logger: logging.Logger, stage: str, report: Optional[Dict[str, Dict[str, float]]] = None) -> Iterator:
+    """ Log wall time and peak memory allocated while a stage runs.
+
+    Peak memory is measured with tracemalloc, which sees allocations of python objects and numpy arrays but not
+    the ones made internally by compiled libraries, e.g. while fitting trees. The maximum resident memory of the
+    process so far is logged as well, where available.
+
+    :param logger: python logger
+    :param stage: name of the stage
+    :param report: dictionary filled with the measures of the stage, under its name
+    :return: context manager
+    """
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+    else:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        if not tracing:
+            tracemalloc.stop()
+        # ru_maxrss is in kilobytes on Linux
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3 if resource is not None else float("nan")
+        logger.info(
+            "Stage %s: %.2f s, peak memory %.1f MB, process max RSS %.1f MB", stage, seconds, peak / 1e6, max_rss,
+        )
+        if report is not None:
+            report[stage] = {"seconds": seconds, "peak_memory_mb": peak / 1e6, "max_rss_mb": max_rss}
+
+
+class StageCache:
+    """ Store the output of training stages on disk, to skip stages whose inputs and parameters did not change.
+
+    An output is keyed by the name of its stage, a fingerprint of its inputs (e.g. frame_fingerprint or the key of
+    the previous stage) and its parameters.
+    """
+
+    def __init__(self, logger: logging.Logger, directory: str, enabled: bool = True) -> None:
+        """ Instantiate StageCache.
+
+        :param logger: python logger
+        :param directory: folder storing stage outputs
+        :param enabled: False to run every stage and cache nothing
+        """
+        self.logger = logger
+        self.directory = directory
+        self.enabled = enabled
+
+    @staticmethod
+    def key(stage: str, inputs: str, params: Dict[str, Any]) -> str:
+        """ Key of the output of a stage.
+
+        :param stage: name of the stage
+        :param inputs: fingerprint of the inputs of the stage
+        :param params: parameters of the stage, serializable as json
+        :return: hexadecimal key
+        """
+        content = json.dumps({"stage": stage, "inputs": inputs, "params": params}, sort_keys=True, default=str)
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def run(
+        self, stage: str, function: Callable[[], Any], inputs: str, params: Optional[Dict[str, Any]] = None,
+    ) -> Tuple[Any, str]:
+        """ Get the output of a stage from the cache, run it and store its output if not found.
+
+        :param stage: name of the stage
+        :param function: function computing the output of the stage
+        :param inputs: fingerprint of the inputs of the stage
+        :param params: parameters of the stage, serializable as json
+        :return: output of the stage and its key, to be used as inputs fingerprint of the next stages
+        """
+        key = self.key(stage, inputs, params or {})
+        path = os.path.join(self.directory, f"{stage}_{key[:16]}.joblib")
+        if self.enabled and os.path.isfile(path):
+            try:
+                output = joblib.load(path)
+                self.logger.info("Stage %s skipped, output loaded from %s", stage, path)
+                return output, key
+            except Exception:  # noqa: BLE001
+                self.logger.exception("Cached output %s of stage %s cannot be loaded, run it again", path, stage)
+
+        output = function()
+        if self.enabled:
+            os.makedirs(self.directory, exist_ok=True)
+            # Write to a temporary file first, an interrupted run never leaves a partial output
+            tmp_path = f"{path}.tmp"
+            joblib.dump(output, tmp_path)
+            os.replace(tmp_path, path)
+        return output, key
@@ -0,0 +1,23 @@
+""" Test the prediction endpoints in ui."""
+from fastapi.testclient import TestClient
+
+import ui.app
+from ui.app import WARM_UP_CLIENT, app
+
+
+def test_batched_client_answered_with_the_model_which_scored_it(monkeypatch) -> None:
+    """ Test a client scored by the micro-batcher gets the version of the model loaded when its batch ran, not the
+    one loaded when the request arrived.
+    :return: None
+    """
+    with TestClient(app) as client:
+        current = ui.app.router.model("primary")
+        stale = current._replace(version="stale")
+        models = iter([stale])
+        monkeypatch.setattr(ui.app.router, "model", lambda role: next(models, current))
+        ui.app.prediction_cache.clear()
+
+        response = client.post("/predict_score_no_ui", json=WARM_UP_CLIENT)
+    assert response.status_code == 200
+    assert response.json()["model_version"] == response.headers["X-Model-Version"] == current.version
+    assert ui.app.prediction_cache.get(ui.app.prediction_cache.key(WARM_UP_CLIENT, current.version)) is not None
@@ -0,0 +1,59 @@
+""" Test chunked scoring of uploads in src."""
+import json
+
+from src.batch_scoring import StreamScorer
+from src.train import load_model
+
+CLIENT = {
+    "loan": 2000, "mortdue": 25000.0, "value": 39025.0, "reason": 1, "job": 3, "yoj": 12.5, "derog": 0.0,
+    "delinq": 0.0, "clage": 95.366666667, "ninq": 1.0, "clno": 9.0, "debtinc": 1.3,
+}
+
+
+def _score(scorer: StreamScorer, upload: bytes, piece_size: int) -> bytes:
+    """ Feed an upload to a scorer in pieces of piece_size bytes."""
+    output = [scorer.header()]
+    for start in range(0, len(upload), piece_size):
+        output.append(scorer.feed(upload[start:start + piece_size]))
+    output.append(scorer.close())
+    return b"".join(output)
+
+
+def test_ndjson_upload_scored_in_chunks() -> None:
+    """ Test every NDJSON line gets a prediction or an error, in order, whatever the piece boundaries, lines which
+    are not UTF-8 included.
+    :return: None
+    """
+    invalid = dict(CLIENT, job=9)
+    lines = [json.dumps(CLIENT)] * 5 + [json.dumps(invalid), "not json"]
+    upload = "\n".join(lines).encode("utf-8") + b"\n\xff\xfe{}\n" + json.dumps(CLIENT).encode("utf-8")
+
+    output = _score(StreamScorer(fmt="ndjson", model=load_model(), chunk_size=2), upload, piece_size=7)
+    results = [json.loads(line) for line in output.decode("utf-8").splitlines()]
+
+    assert [result["row"] for result in results] == list(range(9))
+    assert all(result["prediction"] in [0, 1] for result in results[:5])
+    assert "job" in results[5]["error"]
+    assert results[6]["error"] == "invalid JSON object"
+    assert results[7]["error"] == "invalid UTF-8"
+    assert results[8]["prediction"] in [0, 1]
+
+
+def test_csv_upload_with_uppercase_header() -> None:
+    """ Test a CSV upload with training column names is scored, each model call reported.
+    :return: None
+    """
+    scored = []
+    header = ",".join(name.upper() for name in CLIENT)
+    row = ",".join(str(value) for value in CLIENT.values())
+    upload = "\n".join([header, row, row, row]).encode("utf-8") + b"\n"
+
+    output = _score(StreamScorer(
+        fmt="csv", model=load_model(), chunk_size=2, on_scored=lambda records, decisions, seconds: scored.append(len(records)),
+    ), upload, piece_size=16)
+    lines = output.decode("utf-8").splitlines()
+
+    assert lines[0] == "row,prediction,probability,risk_band,error"
+    assert [line.split(",")[0] for line in lines[1:]] == ["0", "1", "2"]
+    assert all(line.split(",")[1] in ["0", "1"] for line in lines[1:])
+    assert scored == [2, 1]
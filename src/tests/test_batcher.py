@@ -0,0 +1,87 @@
+""" Test micro-batching of predictions in src."""
+import asyncio
+import logging
+import threading
+
+import pytest
+
+from src.batcher import MicroBatcher
+
+
+def test_concurrent_payloads_predicted_in_one_batch() -> None:
+    """ Test concurrent payloads are coalesced and each caller gets its own result.
+    :return: None
+    """
+    batch_sizes = []
+
+    def predict_batch(payloads: list) -> list:
+        batch_sizes.append(len(payloads))
+        return [payload * 10 for payload in payloads]
+
+    async def run() -> list:
+        batcher = MicroBatcher(logger=logging, predict_batch=predict_batch, max_batch_size=8, max_wait_ms=50)
+        await batcher.start()
+        results = await asyncio.gather(*(batcher.submit(payload) for payload in range(8)))
+        await batcher.stop()
+        return results
+
+    assert asyncio.run(run()) == [payload * 10 for payload in range(8)]
+    assert batch_sizes == [8]
+
+
+def test_batches_predicted_concurrently() -> None:
+    """ Test a batch is predicted while another one is still running, up to max_concurrent_batches.
+    :return: None
+    """
+    # Both batches must be inside predict_batch at the same time to pass the barrier
+    barrier = threading.Barrier(2, timeout=5)
+
+    def predict_batch(payloads: list) -> list:
+        barrier.wait()
+        return payloads
+
+    async def run() -> list:
+        batcher = MicroBatcher(
+            logger=logging, predict_batch=predict_batch, max_batch_size=1, max_concurrent_batches=2,
+        )
+        await batcher.start()
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2))
+        await batcher.stop()
+        return results
+
+    assert asyncio.run(run()) == [1, 2]
+
+
+def test_failed_batch_raises_in_every_caller() -> None:
+    """ Test an error of the predictor is given to each caller of the batch.
+    :return: None
+    """
+    def predict_batch(payloads: list) -> list:
+        raise ValueError("broken model")
+
+    async def run() -> list:
+        batcher = MicroBatcher(logger=logging, predict_batch=predict_batch, max_wait_ms=1)
+        await batcher.start()
+        results = await asyncio.gather(*(batcher.submit(payload) for payload in range(3)), return_exceptions=True)
+        await batcher.stop()
+        return results
+
+    assert all(isinstance(result, ValueError) for result in asyncio.run(run()))
+
+
+def test_full_queue_rejects_payload() -> None:
+    """ Test payloads beyond the queue size are rejected instead of waiting.
+    :return: None
+    """
+    async def run() -> None:
+        batcher = MicroBatcher(logger=logging, predict_batch=list, max_queue_size=1)
+        await batcher.start()
+        first = asyncio.ensure_future(batcher.submit(1))
+        second = asyncio.ensure_future(batcher.submit(2))
+        with pytest.raises(asyncio.QueueFull):
+            await second
+        await first
+        assert batcher.stats()["rejected"] == 1
+        await batcher.stop()
+
+    asyncio.run(run())
@@ -0,0 +1,63 @@
+""" Test versioned bundles of trained artifacts in src."""
+import os
+
+import joblib
+import numpy as np
+from sklearn.ensemble import ExtraTreesClassifier
+
+from src.artifacts import load_decision_policy, load_model, model_registry
+from src.bundle import current_model_path, manifest_path, new_version, publish, versions_dir
+from src.decision import DecisionPolicy, decision_path
+
+
+def _export_version(model_path: str, threshold: float, base_path: str = None) -> str:
+    """ Export a small forest and a decision policy in a new version, without publishing it."""
+    rng = np.random.default_rng(0)
+    features = rng.normal(size=(100, 3))
+    version_path = new_version(model_path, base_path=base_path)
+    joblib.dump(ExtraTreesClassifier(n_estimators=3).fit(features, features[:, 0] > 0), version_path)
+    DecisionPolicy(threshold=threshold).export(decision_path(version_path))
+    return version_path
+
+
+def test_published_version_served_as_a_unit(tmp_path, monkeypatch) -> None:
+    """ Test model and decision policy switch together when a version is published, older versions being freed and
+    deleted.
+    :return: None
+    """
+    monkeypatch.setattr(model_registry, "check_interval", 0)
+    model_path = str(tmp_path / "model.sav")
+    first_path = _export_version(model_path, threshold=0.3)
+    publish(model_path, first_path)
+
+    first = load_model(model_path)
+    assert first.path == first_path
+    assert load_decision_policy(model_path).threshold == load_decision_policy(first.path).threshold == 0.3
+
+    # Not served before it is published
+    second_path = _export_version(model_path, threshold=0.7)
+    assert load_model(model_path).path == first_path
+    publish(model_path, second_path)
+    third_path = _export_version(model_path, threshold=0.9, base_path=second_path)
+    publish(model_path, third_path)
+
+    third = load_model(model_path)
+    assert third.path == current_model_path(model_path) == third_path
+    assert load_decision_policy(model_path).threshold == 0.9
+    assert first_path not in model_registry
+    assert sorted(os.listdir(versions_dir(model_path))) == [
+        os.path.basename(os.path.dirname(second_path)), os.path.basename(os.path.dirname(third_path)),
+    ]
+
+
+def test_loose_artifacts_served_without_manifest(tmp_path) -> None:
+    """ Test a model exported before bundles is served from its path, with the policy next to it.
+    :return: None
+    """
+    model_path = str(tmp_path / "model.sav")
+    joblib.dump(ExtraTreesClassifier(n_estimators=3).fit([[0.0], [1.0]], [0, 1]), model_path)
+    DecisionPolicy(threshold=0.4).export(decision_path(model_path))
+
+    assert not os.path.isfile(manifest_path(model_path))
+    assert load_model(model_path).path == current_model_path(model_path) == model_path
+    assert load_decision_policy(model_path).threshold == 0.4
@@ -0,0 +1,68 @@
+""" Test compiled forest in src."""
+import os
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+
+from src.artifacts import load_model, model_registry
+from src.compiled_forest import CompiledForest, compiled_forest_path
+
+
+def _data(seed: int = 0) -> tuple:
+    """ Random features with missing values and labels depending on them."""
+    rng = np.random.default_rng(seed)
+    features = rng.normal(size=(400, 5))
+    labels = (features[:, 0] + features[:, 1] ** 2 > 0.5).astype(int)
+    features[rng.random(features.shape) < 0.05] = np.nan
+    return features, labels
+
+
+@pytest.mark.parametrize("estimator", [ExtraTreesClassifier, RandomForestClassifier])
+def test_compiled_predictions_identical_to_sklearn(estimator) -> None:
+    """ Test probabilities and classes of a compiled forest are exactly sklearn's, missing values included.
+    :return: None
+    """
+    features, labels = _data()
+    forest = estimator(n_estimators=20, random_state=0).fit(features, labels)
+    compiled = CompiledForest.from_estimator(forest)
+    new_features, _ = _data(seed=1)
+
+    np.testing.assert_array_equal(compiled.predict_proba(new_features), forest.predict_proba(new_features))
+    np.testing.assert_array_equal(compiled.predict(new_features[:1]), forest.predict(new_features[:1]))
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_exported_forest_loaded(tmp_path, mmap: bool) -> None:
+    """ Test a compiled forest gives the same predictions after export and load.
+    :return: None
+    """
+    features, labels = _data()
+    compiled = CompiledForest.from_estimator(ExtraTreesClassifier(n_estimators=5).fit(features, labels))
+    path = str(tmp_path / "model.forest")
+    compiled.export(path)
+    loaded = CompiledForest.load(path, mmap=mmap)
+
+    assert isinstance(loaded.value, np.memmap) == mmap
+    np.testing.assert_array_equal(loaded.predict_proba(features), compiled.predict_proba(features))
+
+
+def test_deleted_forest_falls_back_to_model_file(tmp_path, monkeypatch) -> None:
+    """ Test the model file is served once the compiled forest exported with it is deleted.
+    :return: None
+    """
+    monkeypatch.setattr(model_registry, "check_interval", 0)
+    features, labels = _data()
+    forest = ExtraTreesClassifier(n_estimators=5).fit(features, labels)
+    model_path = str(tmp_path / "model.sav")
+    joblib.dump(forest, model_path)
+    CompiledForest.from_estimator(forest).export(compiled_forest_path(model_path))
+
+    assert isinstance(load_model(model_path).model, CompiledForest)
+    os.remove(compiled_forest_path(model_path))
+    loaded = load_model(model_path)
+
+    assert loaded.path == model_path and isinstance(loaded.model, ExtraTreesClassifier)
+    assert compiled_forest_path(model_path) not in model_registry
+    np.testing.assert_array_equal(loaded.model.predict_proba(features), forest.predict_proba(features))
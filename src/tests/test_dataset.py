@@ -0,0 +1,53 @@
+""" Test columnar binary cache of CSV datasets in src."""
+import os
+
+import numpy as np
+import pandas as pd
+
+from src.dataset import Dataset
+from src.preprocessing import FEATURES, Preprocessor
+
+CSV = """,BAD,LOAN,MORTDUE,VALUE,REASON,JOB,YOJ,DEROG,DELINQ,CLAGE,NINQ,CLNO,DEBTINC
+4,1,1500,,,,,,,,,,,
+7,0,1800,48649.0,57037.0,HomeImp,Other,5.0,3.0,2.0,77.1,1.0,17.0,
+9,1,2000,32700.0,46740.0,HomeImp,Mgr,3.0,0.0,2.0,216.9,1.0,12.0,
+12,0,2000,64536.0,87400.0,DebtCon,Mgr,2.5,0.0,0.0,147.1,0.0,24.0,
+"""
+
+
+def test_csv_converted_in_chunks_and_memory_mapped(tmp_path) -> None:
+    """ Test a dataset holds encoded features, target and index of its CSV, whatever the chunk size.
+    :return: None
+    """
+    csv_path = tmp_path / "clients.csv"
+    csv_path.write_text(CSV)
+    expected = pd.read_csv(csv_path, index_col=0)
+
+    dataset = Dataset.convert(str(csv_path), str(tmp_path / "chunked"), index_col=0, chunk_rows=3)
+    df = dataset.to_frame()
+    assert isinstance(dataset.features, np.memmap) and dataset.features.flags.f_contiguous
+    assert np.shares_memory(df["LOAN"].to_numpy(), dataset.features)
+    np.testing.assert_array_equal(df[FEATURES].to_numpy(), Preprocessor().encode(expected))
+    assert df["BAD"].tolist() == expected["BAD"].tolist()
+    assert df.index.tolist() == [4, 7, 9, 12]
+
+    single_chunk = Dataset.convert(str(csv_path), str(tmp_path / "single"), index_col=0)
+    assert single_chunk.content_hash == dataset.content_hash == df.attrs["content_hash"]
+
+
+def test_dataset_converted_again_when_csv_changes(tmp_path) -> None:
+    """ Test a converted dataset is reused until the content of its CSV changes.
+    :return: None
+    """
+    csv_path = tmp_path / "clients.csv"
+    csv_path.write_text(CSV)
+    first = Dataset.from_csv(str(csv_path), str(tmp_path / "datasets"), index_col=0)
+
+    os.utime(csv_path, ns=(2_000_000_000, 2_000_000_000))
+    touched = Dataset.from_csv(str(csv_path), str(tmp_path / "datasets"), index_col=0)
+    assert touched.content_hash == first.content_hash
+
+    csv_path.write_text(CSV.replace("1500", "1600"))
+    changed = Dataset.from_csv(str(csv_path), str(tmp_path / "datasets"), index_col=0)
+    assert changed.content_hash != first.content_hash
+    assert changed.features[0, 0] == 1600
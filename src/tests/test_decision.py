@@ -0,0 +1,38 @@
+""" Test decision policies in src."""
+import numpy as np
+
+from src.decision import DecisionPolicy
+
+
+def test_default_policy_matches_argmax() -> None:
+    """ Test the default policy predicts like model.predict, ties going to GOOD, and decides one client alike.
+    :return: None
+    """
+    probabilities = np.array([0.0, 0.3, 0.5, 0.51, 1.0])
+    decisions = DecisionPolicy().decide(probabilities)
+
+    assert decisions.predictions.tolist() == [0, 0, 0, 1, 1]
+    assert decisions.risk_bands.tolist() == ["low", "low", "low", "high", "high"]
+    assert [DecisionPolicy().decide_one(probability) for probability in probabilities] == list(
+        zip(decisions.predictions.tolist(), decisions.risk_bands.tolist())
+    )
+
+
+def test_fitted_thresholds_separate_calibration_clients(tmp_path) -> None:
+    """ Test thresholds fitted on separable probabilities predict every client right and survive export.
+    :return: None
+    """
+    y_true = np.array([0, 0, 0, 0, 1, 1, 1])
+    probabilities = np.array([0.1, 0.2, 0.3, 0.6, 0.7, 0.8, 0.9])
+    policy = DecisionPolicy.fit(y_true, probabilities, review_recall=1.0)
+
+    assert 0.6 <= policy.threshold < 0.7
+    assert policy.review_threshold <= policy.threshold
+    assert policy.decide(probabilities).predictions.tolist() == y_true.tolist()
+    assert policy.calibration["f_beta"] == 1.0
+
+    path = str(tmp_path / "decision.json")
+    policy.export(path)
+    loaded = DecisionPolicy.load(path)
+    assert (loaded.threshold, loaded.review_threshold) == (policy.threshold, policy.review_threshold)
+    assert loaded.with_threshold(0.95).decide(probabilities).predictions.sum() == 0
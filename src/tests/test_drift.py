@@ -0,0 +1,61 @@
+""" Test drift monitoring of served clients in src."""
+import logging
+
+import numpy as np
+
+from src.drift import DriftMonitor, FeatureProfile, feature_drift
+from src.preprocessing import CATEGORY_MAPS, FEATURES
+
+
+def _clients(rows: int, seed: int, loan_scale: float = 1.0) -> np.ndarray:
+    """ Encoded clients with random values, codes for categorical features and 10% of missing DEBTINC."""
+    rng = np.random.default_rng(seed)
+    values = rng.lognormal(mean=3.0, sigma=1.0, size=(rows, len(FEATURES)))
+    for column in CATEGORY_MAPS:
+        values[:, FEATURES.index(column)] = rng.integers(1, 4, rows)
+    values[:, FEATURES.index("LOAN")] *= loan_scale
+    values[rng.random(rows) < 0.1, FEATURES.index("DEBTINC")] = np.nan
+    return values
+
+
+def test_drift_flags_shifted_and_missing_features_only() -> None:
+    """ Test clients like the reference are stable, a scaled feature and a feature no longer sent drift.
+    :return: None
+    """
+    reference = FeatureProfile().update(_clients(5000, seed=0))
+    stable = feature_drift(reference, FeatureProfile().update(_clients(2000, seed=1)))
+    assert max(scores["psi"] for scores in stable.values()) < 0.1
+    assert abs(stable["DEBTINC"]["missing_rate"] - 0.1) < 0.03
+
+    shifted_clients = _clients(2000, seed=2, loan_scale=2.0)
+    shifted_clients[:, FEATURES.index("CLNO")] = np.nan
+    shifted = feature_drift(reference, FeatureProfile().update(shifted_clients))
+    assert shifted["LOAN"]["psi"] > 0.25 and shifted["LOAN"]["ks"] > 0.2
+    assert shifted["CLNO"]["psi"] > 0.25 and shifted["CLNO"]["ks"] is None
+    assert shifted["JOB"]["psi"] < 0.1
+
+
+def test_monitor_summarizes_recent_windows_in_bounded_memory(tmp_path) -> None:
+    """ Test the monitor compares the last windows only, and drops clients beyond its buffer.
+    :return: None
+    """
+    path = str(tmp_path / "reference.json")
+    FeatureProfile().update(_clients(5000, seed=0)).export(path)
+    monitor = DriftMonitor(
+        logging, reference=lambda: FeatureProfile.load(path), window_rows=1000, max_buffered_rows=1500,
+    )
+    fields = [feature.lower() for feature in FEATURES]
+
+    def observe(values: np.ndarray) -> None:
+        monitor.observe([dict(zip(fields, row)) for row in values.tolist()])
+
+    observe(_clients(2000, seed=1, loan_scale=3.0))
+    assert monitor.report()["dropped"] == 2000
+    observe(_clients(1200, seed=2, loan_scale=3.0))
+    assert monitor.update()["features"]["LOAN"]["status"] == "drift"
+
+    # The shifted window is replaced by the next full one
+    observe(_clients(1000, seed=3))
+    report = monitor.update()
+    assert report["rows"] == 1000
+    assert report["status"] == "stable"
@@ -0,0 +1,49 @@
+""" Test explanations in src."""
+import numpy as np
+from sklearn.ensemble import ExtraTreesClassifier
+
+from src.artifacts import load_model
+from src.explain import ForestExplainer
+from src.inference import explain_fields, score_fields
+from src.prediction_cache import PredictionCache
+from ui.app import WARM_UP_CLIENT
+
+
+def test_contributions_add_up_to_probabilities() -> None:
+    """ Test probabilities are the forest's and equal the bias plus the contributions, features never split on
+    contributing nothing.
+    :return: None
+    """
+    rng = np.random.default_rng(0)
+    features = rng.normal(size=(400, 4))
+    labels = (features[:, 0] + features[:, 1] ** 2 > 0.5).astype(int)
+    features[rng.random(features.shape) < 0.05] = np.nan
+    # Feature 3 is constant in training, trees never split on it
+    features[:, 3] = 1.0
+    forest = ExtraTreesClassifier(n_estimators=20, random_state=0).fit(features, labels)
+    new_features = rng.normal(size=(300, 4))
+
+    explanations = ForestExplainer.from_model(forest).explain(new_features, chunk_rows=64)
+
+    np.testing.assert_array_equal(explanations.probabilities, forest.predict_proba(new_features)[:, 1])
+    np.testing.assert_allclose(
+        explanations.bias + explanations.contributions.sum(axis=1), explanations.probabilities, atol=1e-12,
+    )
+    assert np.all(explanations.contributions[:, 3] == 0)
+    assert np.abs(explanations.contributions[:, :2]).mean() > np.abs(explanations.contributions[:, 2]).mean()
+
+
+def test_explained_clients_cached() -> None:
+    """ Test explanations of the trained model match its scores and are served from the cache for repeated clients.
+    :return: None
+    """
+    cache = PredictionCache(max_entries=10)
+    model = load_model()
+    records = [WARM_UP_CLIENT, dict(WARM_UP_CLIENT, loan=50000)]
+
+    first = explain_fields(records, model=model, cache=cache)
+    second = explain_fields(records[::-1], model=model, cache=cache)
+
+    np.testing.assert_allclose(first.probabilities, score_fields(records, model=model))
+    np.testing.assert_array_equal(second.contributions, first.contributions[::-1])
+    assert cache.stats()["hits"] == 2
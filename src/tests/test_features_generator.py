@@ -0,0 +1,61 @@
+""" Test rebalancing of classes in src."""
+import logging
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.features_generator import FeaturesGenerator
+
+
+def _imbalanced(rows: int = 600, bad_share: float = 0.2) -> pd.DataFrame:
+    """ Random features with a minority of BAD rows, shifted away from GOOD ones."""
+    rng = np.random.default_rng(0)
+    bad = (rng.random(rows) < bad_share).astype(int)
+    df = pd.DataFrame(rng.random((rows, 3)) + bad[:, None] * 5, columns=["LOAN", "VALUE", "CLNO"])
+    return df.assign(BAD=bad)
+
+
+@pytest.mark.parametrize("rebalancing", ["chunked_smote", "approximate_smote"])
+def test_synthetic_rows_balance_classes_between_minority_rows(rebalancing: str) -> None:
+    """ Test batches of synthetic rows balance classes and stay among minority rows.
+    :return: None
+    """
+    df = _imbalanced()
+    generator = FeaturesGenerator(
+        logger=logging, df=df, random_state=0, rebalancing=rebalancing, batch_size=50, neighbour_candidates=40,
+    )
+    generator.generate(tasks=["resampling"])
+
+    counts = generator.target.value_counts()
+    assert counts[0] == counts[1] == (df["BAD"] == 0).sum()
+    synthetic = generator.features.iloc[len(df):]
+    minority = df[df["BAD"] == 1].drop(columns="BAD")
+    assert (synthetic >= minority.min()).all().all() and (synthetic <= minority.max()).all().all()
+    assert list(generator.features.columns) == ["LOAN", "VALUE", "CLNO"]
+
+
+def test_class_weight_keeps_rows_and_unknown_mode_fails() -> None:
+    """ Test class weighting adds no row, and an unknown mode is refused.
+    :return: None
+    """
+    df = _imbalanced()
+    generator = FeaturesGenerator(logger=logging, df=df, rebalancing="class_weight")
+    generator.generate(tasks=["resampling"])
+
+    assert len(generator.features) == len(df)
+    with pytest.raises(ValueError):
+        FeaturesGenerator(logger=logging, df=df, rebalancing="undersampling")
+
+
+@pytest.mark.parametrize("rebalancing", ["chunked_smote", "approximate_smote"])
+def test_single_minority_row_refused(rebalancing: str) -> None:
+    """ Test synthetic rows are refused with a clear error when there is a single minority row to interpolate from.
+    :return: None
+    """
+    df = _imbalanced(rows=50, bad_share=0.0)
+    df.loc[0, "BAD"] = 1
+    generator = FeaturesGenerator(logger=logging, df=df, random_state=0, rebalancing=rebalancing)
+
+    with pytest.raises(ValueError, match="at least 2 rows of the minority class"):
+        generator.generate(tasks=["resampling"])
@@ -0,0 +1,56 @@
+""" Test incremental refresh of a trained forest in src."""
+import json
+import logging
+import os
+
+import pandas as pd
+
+from src.bundle import current_model_path
+from src.dataset import INCREMENTS, Dataset
+from src.incremental import incremental_state_path, refresh
+from src.model import ExtraTrees
+from src.model_trainer import ModelTrainer
+from src.preprocessing import Preprocessor
+from src.train import BASE_DIR, load_and_split_data, load_model, predict
+
+
+def test_refresh_grows_forest_and_evicts_oldest_trees(tmp_path) -> None:
+    """ Test new trees are fitted on new rows, the forest stays within max_trees, rows are appended once, a file of
+    the same name with other rows is appended next to them and a full training reads every segment.
+    :return: None
+    """
+    test_df = pd.read_csv(os.path.join(BASE_DIR, "data", "test_df.csv"), index_col=0)
+    history_df, new_df = test_df.iloc[:800], test_df.iloc[800:]
+    history_path, new_path = str(tmp_path / "history.csv"), str(tmp_path / "new.csv")
+    history_df.to_csv(history_path)
+    new_df.to_csv(new_path)
+    model_path = str(tmp_path / "model.sav")
+    preprocessor = Preprocessor().fit(history_df)
+    ModelTrainer.train(
+        preprocessor.transform(history_df), history_df["BAD"], model=ExtraTrees, model_path=model_path,
+        model_params={"n_estimators": 10, "random_state": 0},
+    )
+
+    options = {
+        "model_path": model_path, "new_trees": 5, "max_trees": 12, "n_jobs": 1, "random_state": 0, "index_col": 0,
+        "history_path": history_path, "dataset_dir": str(tmp_path / "datasets"), "logger": logging,
+    }
+    summary = refresh(new_path, **options)
+    assert summary == dict(summary, rows=len(new_df), new_trees=5, evicted=3, trees=12)
+    with open(incremental_state_path(current_model_path(model_path))) as infile:
+        state = json.load(infile)
+    assert state["tree_generations"] == [0] * 7 + [1] * 5
+    model = load_model(model_path)
+    assert model.model.n_estimators == 12
+    assert set(predict(new_df, model=model)) <= {0, 1}
+
+    assert refresh(new_path, **options)["rows"] == 0
+
+    other_df = test_df.iloc[:300]
+    other_df.to_csv(new_path)
+    assert refresh(new_path, **options)["rows"] == len(other_df)
+    segments = Dataset.load_segments(os.path.join(options["dataset_dir"], INCREMENTS))
+    assert sorted(segment.rows for segment in segments) == sorted([len(new_df), len(other_df)])
+    train_df, _ = load_and_split_data(filename="", dataset_dir=options["dataset_dir"])
+    history_rows = len(pd.read_csv(os.path.join(BASE_DIR, "data", "train_df.csv")))
+    assert len(train_df) == history_rows + len(new_df) + len(other_df)
@@ -0,0 +1,49 @@
+""" Test pandas-free inference in src."""
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from src.inference import feature_buffer, predict_fields, records_to_array, score_fields
+from src.preprocessing import CLIENT_FIELDS, FEATURES
+from src.train import BASE_DIR, load_model, predict
+
+
+def test_records_written_in_feature_order() -> None:
+    """ Test client fields land in the column of their training feature.
+    :return: None
+    """
+    record = {field: float(position) for position, field in enumerate(reversed(CLIENT_FIELDS))}
+    features = records_to_array([record], out=feature_buffer(1))
+
+    assert features.shape == (1, len(FEATURES))
+    assert features[0, FEATURES.index("JOB")] == record["job"]
+    assert features[0, FEATURES.index("DEBTINC")] == record["debtinc"]
+
+
+def test_fast_path_matches_dataframe_path() -> None:
+    """ Test predictions from client fields equal predictions from a dataframe.
+    :return: None
+    """
+    test_df = pd.read_csv(os.path.join(BASE_DIR, "data", "test_df.csv"), index_col=0).drop("BAD", axis=1).head(50)
+    # API clients send categorical features as codes and no missing value
+    test_df["REASON"] = test_df["REASON"].map({"DebtCon": 1, "HomeImp": 2, "Other": 3})
+    test_df["JOB"] = test_df["JOB"].map({"Other": 1, "Office": 2, "Sales": 3, "Mgr": 4, "ProfExe": 5, "Self": 6})
+    test_df = test_df.fillna(1)
+    records = [{field: row[field.upper()] for field in CLIENT_FIELDS} for _, row in test_df.iterrows()]
+
+    np.testing.assert_array_equal(predict_fields(records), predict(test_df))
+    np.testing.assert_array_equal(predict_fields(records[:1]), predict(test_df.head(1)))
+
+
+def test_feature_names_warning_silenced_only_while_predicting() -> None:
+    """ Test the sklearn model scores feature vectors without warning, and the warning is not silenced elsewhere.
+    :return: None
+    """
+    record = {field: 1.0 for field in CLIENT_FIELDS}
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        score_fields([record], model=load_model(compiled=False))
+
+    assert not any("valid feature names" in str(action[1]) for action in warnings.filters)
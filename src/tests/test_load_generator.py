@@ -0,0 +1,38 @@
+""" Test load generator and latency report in benchmarks."""
+import asyncio
+
+from benchmarks.load_generator import (
+    LoadGenerator, Result, compare, http_client, load_clients, parse_mix, summarize,
+)
+
+
+def test_in_process_closed_loop_reports_each_endpoint() -> None:
+    """ Test requests of a payload mix are sent to the app in-process and reported per endpoint.
+    :return: None
+    """
+    async def run() -> list:
+        async with http_client(url=None, timeout=10) as client:
+            generator = LoadGenerator(
+                client, load_clients(), parse_mix("predict_score_no_ui=3,predict_batch=1"), batch_size=4,
+            )
+            return await generator.closed_loop(concurrency=4, requests=20)
+
+    report = summarize(asyncio.run(run()), elapsed=1.0)
+    assert report["all"]["requests"] == 20
+    assert report["all"]["error_rate"] == 0
+    assert set(report) == {"all", "predict_score_no_ui", "predict_batch"}
+
+
+def test_regressions_beyond_threshold_reported() -> None:
+    """ Test slower percentiles, lower throughput and more errors than the baseline are regressions.
+    :return: None
+    """
+    baseline = summarize([Result("predict_batch", latency=0.010, status=200)] * 10, elapsed=1.0)
+    similar = summarize([Result("predict_batch", latency=0.011, status=200)] * 10, elapsed=1.0)
+    slower = summarize([Result("predict_batch", latency=0.020, status=503)] * 5, elapsed=1.0)
+
+    assert compare(similar, baseline, max_regression=0.2) == []
+    regressions = compare(slower, baseline, max_regression=0.2)
+    assert any("p99_ms" in regression for regression in regressions)
+    assert any("throughput_rps" in regression for regression in regressions)
+    assert any("error_rate" in regression for regression in regressions)
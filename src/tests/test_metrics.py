@@ -0,0 +1,58 @@
+""" Test metrics rendered in the Prometheus text format in src."""
+import pytest
+
+from src.metrics import Counter, Histogram, MetricsRegistry
+
+
+def test_histogram_rendered_with_cumulative_buckets() -> None:
+    """ Test buckets count observations up to their bound, sum and count follow.
+    :return: None
+    """
+    registry = MetricsRegistry()
+    histogram = registry.register(Histogram("latency_seconds", "Latency.", labelnames=["stage"], buckets=[0.1, 1]))
+    for value in [0.05, 0.1, 0.5, 3]:
+        histogram.observe(value, stage="predict")
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ["# HELP latency_seconds Latency.", "# TYPE latency_seconds histogram"]
+    assert lines[2:] == [
+        'latency_seconds_bucket{stage="predict",le="0.1"} 2',
+        'latency_seconds_bucket{stage="predict",le="1"} 3',
+        'latency_seconds_bucket{stage="predict",le="+Inf"} 4',
+        'latency_seconds_sum{stage="predict"} 3.65',
+        'latency_seconds_count{stage="predict"} 4',
+    ]
+
+
+def test_counter_labels_checked_and_collected() -> None:
+    """ Test label names must match, and collectors update metrics before a scrape.
+    :return: None
+    """
+    registry = MetricsRegistry()
+    counter = registry.register(Counter("loads_total", "Loads.", labelnames=["result"]))
+    registry.add_collector(lambda: counter.set(7, result="success"))
+    with pytest.raises(ValueError):
+        counter.inc(stage="predict")
+
+    assert 'loads_total{result="success"} 7' in registry.render()
+
+
+def test_constant_labels_added_to_every_sample() -> None:
+    """ Test constant labels, e.g. the worker, come with the labels of each sample and before histogram bounds.
+    :return: None
+    """
+    registry = MetricsRegistry()
+    registry.register(Counter("loads_total", "Loads.")).inc()
+    registry.register(Histogram("latency_seconds", "Latency.", labelnames=["stage"], buckets=[1])).observe(
+        0.5, stage="predict",
+    )
+    registry.set_constant_labels(worker=12)
+
+    lines = [line for line in registry.render().splitlines() if not line.startswith("#")]
+    assert lines == [
+        'loads_total{worker="12"} 1',
+        'latency_seconds_bucket{stage="predict",worker="12",le="1"} 1',
+        'latency_seconds_bucket{stage="predict",worker="12",le="+Inf"} 1',
+        'latency_seconds_sum{stage="predict",worker="12"} 0.5',
+        'latency_seconds_count{stage="predict",worker="12"} 1',
+    ]
@@ -0,0 +1,36 @@
+""" Test benchmark of candidate models in src."""
+import os
+
+import pandas as pd
+
+from src.model import ExtraTrees, LogisticRegressionModel
+from src.model_benchmark import Candidate, benchmark, candidates
+from src.train import BASE_DIR
+
+
+def test_grids_expanded_into_candidates() -> None:
+    """ Test each combination of parameters of a grid is one candidate.
+    :return: None
+    """
+    extra_trees = candidates(["extra_trees"])
+    assert len(extra_trees) == 4
+    assert {"n_estimators": 300, "min_samples_leaf": 2} in [candidate.params for candidate in extra_trees]
+
+
+def test_report_has_quality_and_serving_metrics() -> None:
+    """ Test candidates trained in worker processes are reported with quality and serving metrics.
+    :return: None
+    """
+    data_df = pd.read_csv(os.path.join(BASE_DIR, "data", "train_df.csv"), index_col=0)
+    report = benchmark(
+        data_df.iloc[:600], data_df.iloc[600:800],
+        [
+            Candidate(name="extra_trees", model=ExtraTrees, params={"n_estimators": 5}),
+            Candidate(name="logistic_regression", model=LogisticRegressionModel, params={"C": 1.0}),
+        ],
+        folds=2, max_workers=2, iterations=5,
+    )
+    assert sorted(report["model"]) == ["extra_trees", "logistic_regression"]
+    for column in ["cv_recall_bad", "cv_auc", "test_auc", "p50_ms", "p99_ms", "rows_per_s", "size_mb", "load_ms"]:
+        assert report[column].notna().all()
+    assert report["cv_auc"].between(0, 1).all()
@@ -0,0 +1,78 @@
+""" Test in-process model registry in src."""
+import logging
+import os
+
+import joblib
+
+from src.model_registry import ModelRegistry
+
+
+def _write(path: str, obj: dict, mtime: int) -> None:
+    """ Dump an object and force its modification time, file systems may have a coarse mtime resolution."""
+    joblib.dump(obj, path)
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_model_loaded_once_and_reloaded_on_change(tmp_path) -> None:
+    """ Test model is served from memory until its file changes.
+    :return: None
+    """
+    path = str(tmp_path / "model.sav")
+    _write(path, {"weights": 1}, mtime=1_000_000_000)
+    registry = ModelRegistry(logger=logging, check_interval=0)
+    reloads = []
+    registry.add_listener(lambda previous, new: reloads.append((previous.version, new.version)))
+    first = registry.register("model", path)
+
+    assert registry.get("model").model is first.model
+
+    _write(path, {"weights": 2}, mtime=2_000_000_000)
+    second = registry.get("model")
+    assert second.model == {"weights": 2}
+    assert reloads == [(first.version, second.version)]
+
+
+def test_touched_model_keeps_version(tmp_path) -> None:
+    """ Test a file rewritten with identical content is not reloaded.
+    :return: None
+    """
+    path = str(tmp_path / "model.sav")
+    _write(path, {"weights": 1}, mtime=1_000_000_000)
+    registry = ModelRegistry(logger=logging, check_interval=0)
+    first = registry.register("model", path)
+
+    os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+    assert registry.get("model").model is first.model
+
+
+def test_broken_model_file_keeps_current_version(tmp_path) -> None:
+    """ Test a model file which cannot be loaded does not replace the served model.
+    :return: None
+    """
+    path = str(tmp_path / "model.sav")
+    _write(path, {"weights": 1}, mtime=1_000_000_000)
+    registry = ModelRegistry(logger=logging, check_interval=0)
+    first = registry.register("model", path)
+
+    with open(path, "wb") as outfile:
+        outfile.write(b"partial")
+    os.utime(path, ns=(2_000_000_000, 2_000_000_000))
+    assert registry.get("model").version == first.version
+
+
+def test_deleted_model_file_reported_missing(tmp_path) -> None:
+    """ Test a model whose file is deleted is still served and reported missing until the file is back.
+    :return: None
+    """
+    path = str(tmp_path / "model.sav")
+    _write(path, {"weights": 1}, mtime=1_000_000_000)
+    registry = ModelRegistry(logger=logging, check_interval=0)
+    first = registry.register("model", path)
+
+    os.remove(path)
+    assert registry.get("model") is first
+    assert registry.missing("model")
+
+    _write(path, {"weights": 1}, mtime=1_000_000_000)
+    assert registry.get("model") is first
+    assert not registry.missing("model")
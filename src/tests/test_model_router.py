@@ -0,0 +1,73 @@
+""" Test canary routing and shadow comparison in src."""
+import logging
+
+import numpy as np
+
+from src.model_router import ModelRouter
+from src.prediction_cache import PredictionCache
+from src.train import MODEL_PATH
+
+CLIENT = {
+    "loan": 2000, "mortdue": 25000.0, "value": 39025.0, "reason": 1, "job": 3, "yoj": 12.5, "derog": 0.0,
+    "delinq": 0.0, "clage": 95.366666667, "ninq": 1.0, "clno": 9.0, "debtinc": 1.3,
+}
+
+
+def test_canary_routes_a_stable_fraction_of_clients() -> None:
+    """ Test about canary_fraction of clients get the candidate, always the same ones.
+    :return: None
+    """
+    router = ModelRouter(logging, MODEL_PATH, candidate_path=MODEL_PATH, mode="canary", canary_fraction=0.2)
+    roles = [router.pick(("client", number)) for number in range(2000)]
+
+    assert abs(roles.count("candidate") / len(roles) - 0.2) < 0.03
+    assert roles == [router.pick(("client", number)) for number in range(2000)]
+    assert ModelRouter(logging, MODEL_PATH).pick(("client", 1)) == "primary"
+
+
+def test_shadow_compares_mirrored_requests_off_the_request_path() -> None:
+    """ Test mirrored batches are scored by the candidate in the background and counted as agreeing.
+    :return: None
+    """
+    router = ModelRouter(logging, MODEL_PATH, candidate_path=MODEL_PATH, mode="shadow")
+    router.start()
+    records = [dict(CLIENT, loan=2000 + 100 * number) for number in range(10)]
+    probabilities, model = router.score("primary", records)
+    router.mirror(records[:4], probabilities[:4])
+    router.mirror(records[4:], probabilities[4:])
+    router.stop()
+
+    stats = router.stats()
+    assert stats["primary"] == dict(stats["primary"], version=model.version, requests=10)
+    assert stats["candidate"]["requests"] == 0
+    assert stats["shadow"] == dict(stats["shadow"], compared=10, agreement_rate=1.0, mean_probability_delta=0.0)
+
+
+def test_warm_up_scores_every_model_outside_statistics() -> None:
+    """ Test warming up loads both models without counting requests.
+    :return: None
+    """
+    router = ModelRouter(logging, MODEL_PATH, candidate_path=MODEL_PATH, mode="canary", canary_fraction=0.5)
+
+    assert router.warm_up([CLIENT]) >= 0.0
+    stats = router.stats()
+    assert (stats["primary"]["requests"], stats["candidate"]["requests"]) == (0, 0)
+
+
+def test_batches_routed_per_client() -> None:
+    """ Test each client of a batch is decided by the model it gets alone, and counted for that model.
+    :return: None
+    """
+    router = ModelRouter(logging, MODEL_PATH, candidate_path=MODEL_PATH, mode="canary", canary_fraction=0.5)
+    records = [dict(CLIENT, loan=2000 + 100 * number) for number in range(40)]
+    roles = [router.pick(PredictionCache.key(record, "")) for record in records]
+
+    decisions, versions = router.decide(records)
+
+    stats = router.stats()
+    assert stats["candidate"]["requests"] == roles.count("candidate") > 0
+    assert stats["primary"]["requests"] == roles.count("primary") > 0
+    assert versions == [router.model(role).version for role in roles]
+    probabilities, _ = router.score("primary", records)
+    np.testing.assert_array_equal(decisions.probabilities, probabilities)
+    assert decisions.risk_bands.tolist() == router.decide(records[::-1])[0].risk_bands.tolist()[::-1]
@@ -0,0 +1,37 @@
+""" Test cache of predictions in src."""
+import math
+
+from src.prediction_cache import PredictionCache
+
+CLIENT = {
+    "loan": 2000, "mortdue": 25000.0, "value": 39025.0, "reason": 1, "job": 3, "yoj": math.nan, "derog": 0.0,
+    "delinq": 0.0, "clage": 95.366666667, "ninq": 1.0, "clno": 9.0, "debtinc": 1.3,
+}
+
+
+def test_equal_clients_share_a_key_per_model_version() -> None:
+    """ Test equal values give one key, missing values included, and model versions do not share predictions.
+    :return: None
+    """
+    cache = PredictionCache()
+    cache.put(cache.key(CLIENT, "v1"), 1)
+
+    assert cache.get(cache.key(dict(CLIENT, loan=2000.0, yoj=float("nan")), "v1")) == 1
+    assert cache.get(cache.key(CLIENT, "v2")) is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_least_recently_used_evicted_and_expired_dropped() -> None:
+    """ Test memory stays bounded by max_entries and expired predictions are not served.
+    :return: None
+    """
+    cache = PredictionCache(max_entries=2)
+    for loan in range(3):
+        cache.put(cache.key(dict(CLIENT, loan=loan), "v1"), loan)
+
+    assert cache.get(cache.key(dict(CLIENT, loan=0), "v1")) is None
+    assert cache.stats()["entries"] == 2
+
+    expired = PredictionCache(ttl_seconds=-1)
+    expired.put(expired.key(CLIENT, "v1"), 1)
+    assert expired.get(expired.key(CLIENT, "v1")) is None
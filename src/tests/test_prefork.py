@@ -0,0 +1,64 @@
+""" Test ui.prefork."""
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+
+from ui.app import WARM_UP_CLIENT
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="workers are listed from /proc")
+def test_prefork_server_restarts_workers_and_stops_on_sigterm() -> None:
+    """ Test workers forked by the prefork server answer predictions and label their stats, a killed worker is replaced
+    and SIGTERM stops them all.
+    :return: None
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, "-m", "ui.prefork", "--port", str(port), "--workers", "2", "--log-level", "warning"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+    def workers() -> list:
+        with open(f"/proc/{process.pid}/task/{process.pid}/children") as infile:
+            return [int(pid) for pid in infile.read().split()]
+
+    def wait_for(condition, timeout: float = 30.0) -> None:
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert process.poll() is None and time.monotonic() < deadline
+            time.sleep(0.05)
+
+    def ready() -> bool:
+        try:
+            return httpx.get(f"http://127.0.0.1:{port}/ready").status_code == 200
+        except httpx.TransportError:
+            return False
+
+    try:
+        wait_for(lambda: ready() and len(workers()) == 2)
+        response = httpx.post(f"http://127.0.0.1:{port}/predict_score_no_ui", json=WARM_UP_CLIENT)
+        assert response.status_code == 200
+        assert 0 <= response.json()["probability"] <= 1
+        assert httpx.get(f"http://127.0.0.1:{port}/stats").json()["worker"] in workers()
+        metrics = httpx.get(f"http://127.0.0.1:{port}/metrics").text
+        assert any(f'worker="{pid}"' in metrics for pid in workers())
+
+        killed = workers()[0]
+        os.kill(killed, signal.SIGKILL)
+        wait_for(lambda: len(workers()) == 2 and killed not in workers())
+        wait_for(ready)
+
+        process.send_signal(signal.SIGTERM)
+        assert process.wait(timeout=30) == 0
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
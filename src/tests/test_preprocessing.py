@@ -0,0 +1,42 @@
+""" Test fitted preprocessing in src."""
+import numpy as np
+import pandas as pd
+
+from src.preprocessing import FEATURES, Preprocessor
+
+
+def _training_df() -> pd.DataFrame:
+    """ Small training set, categorical features as strings like in hmeq.csv."""
+    data = {column: [1.0, 2.0, 3.0, np.nan] for column in FEATURES}
+    data["YOJ"] = [4.0, 10.0, 30.0, np.nan]
+    data["REASON"] = ["HomeImp", "HomeImp", "DebtCon", None]
+    data["JOB"] = ["Office", "Self", "Office", "Sales"]
+    return pd.DataFrame(data)
+
+
+def test_single_row_imputed_with_training_statistics() -> None:
+    """ Test missing values of one row get training median and most frequent code, not 0.
+    :return: None
+    """
+    preprocessor = Preprocessor().fit(_training_df())
+    row = pd.DataFrame([dict({column: 1.0 for column in FEATURES}, YOJ=np.nan, REASON=np.nan, JOB=np.nan)])
+
+    features = preprocessor.transform(row)
+
+    assert list(features.columns) == FEATURES
+    assert features.loc[0, "YOJ"] == 10.0
+    assert features.loc[0, "REASON"] == 2.0
+    assert features.loc[0, "JOB"] == 2.0
+
+
+def test_strings_and_codes_encoded_alike(tmp_path) -> None:
+    """ Test categorical strings and API codes give the same features, after export and load.
+    :return: None
+    """
+    path = str(tmp_path / "preprocessor.json")
+    Preprocessor().fit(_training_df()).export(path)
+    preprocessor = Preprocessor.load(path)
+    strings = pd.DataFrame([dict({column: 1.0 for column in FEATURES}, REASON="Other", JOB="Mgr")])
+    codes = pd.DataFrame([dict({column: 1.0 for column in FEATURES}, REASON=3, JOB=4)])
+
+    pd.testing.assert_frame_equal(preprocessor.transform(strings), preprocessor.transform(codes))
@@ -0,0 +1,37 @@
+""" Test rendering of the user interface in ui."""
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from jinja2 import DictLoader, Environment
+
+from ui.rendering import CachedStaticFiles, PageCache
+
+
+def test_pages_are_rendered_once_per_context() -> None:
+    """ Test a page is rendered again only for another context, and least recently used pages are evicted.
+    :return: None
+    """
+    pages = PageCache(Environment(loader=DictLoader({"result.html": "{{ prediction }}/{{ band }}"})), max_entries=2)
+
+    assert pages.render("result.html", prediction=1, band="high") == "1/high"
+    assert pages.render("result.html", band="high", prediction=1) == "1/high"
+    assert pages.render("result.html", prediction=0, band="low") == "0/low"
+    assert pages.render("result.html", prediction=0, band="medium") == "0/medium"
+    assert pages.stats() == {"entries": 2, "hits": 1, "misses": 3}
+
+
+def test_versioned_static_files_are_cached_without_revalidation(tmp_path) -> None:
+    """ Test versioned URLs are immutable, other URLs are revalidated with their ETag.
+    :return: None
+    """
+    (tmp_path / "style.css").write_text("h1 { color: red; }")
+    static_files = CachedStaticFiles(directory=str(tmp_path), max_age=60)
+    app = FastAPI()
+    app.mount("/static", static_files)
+    client = TestClient(app)
+
+    versioned = client.get(f"/static{static_files.versioned_path('/style.css')}")
+    assert versioned.headers["cache-control"] == "public, max-age=60, immutable"
+    plain = client.get("/static/style.css")
+    assert plain.headers["cache-control"] == "no-cache"
+    assert client.get("/static/style.css?nav=1").headers["cache-control"] == "no-cache"
+    assert client.get("/static/style.css", headers={"if-none-match": plain.headers["etag"]}).status_code == 304
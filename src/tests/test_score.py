@@ -0,0 +1,53 @@
+""" Test chunked scoring of files in src."""
+import json
+import logging
+import os
+
+import pandas as pd
+
+from src.score import score_file
+from src.train import BASE_DIR, predict
+
+TEST_PATH = os.path.join(BASE_DIR, "data", "test_df.csv")
+
+
+def test_file_scored_in_chunks_like_predict(tmp_path) -> None:
+    """ Test predictions written chunk by chunk are the ones of predict on the whole dataframe.
+    :return: None
+    """
+    output_path = str(tmp_path / "predictions.csv")
+    summary = score_file(TEST_PATH, output_path, chunk_size=100, workers=0, logger=logging)
+
+    test_df = pd.read_csv(TEST_PATH, index_col=0)
+    predictions = pd.read_csv(output_path)
+    assert summary["rows"] == len(test_df)
+    assert predictions["row"].tolist() == list(range(len(test_df)))
+    assert predictions["prediction"].tolist() == predict(test_df).tolist()
+
+
+def test_interrupted_run_resumed_after_last_saved_chunk(tmp_path) -> None:
+    """ Test a run resumes after its last saved chunk, dropping output written after it.
+    :return: None
+    """
+    output_path = str(tmp_path / "predictions.csv")
+    score_file(TEST_PATH, output_path, chunk_size=500, workers=0, id_column="Unnamed: 0", logger=logging)
+    with open(output_path, "rb") as infile:
+        expected = infile.read()
+
+    # Interrupted while writing the second chunk of three
+    progress_path = f"{output_path}.progress"
+    with open(progress_path) as infile:
+        progress = json.load(infile)
+    with open(output_path, "rb") as infile:
+        lines = infile.read().split(b"\n")
+    first_chunk = b"\n".join(lines[:501]) + b"\n"
+    with open(output_path, "wb") as outfile:
+        outfile.write(first_chunk + b"500,7")
+    progress.update(chunks=1, rows=500, output_bytes=len(first_chunk), complete=False)
+    with open(progress_path, "w") as outfile:
+        json.dump(progress, outfile)
+
+    summary = score_file(TEST_PATH, output_path, chunk_size=500, workers=0, id_column="Unnamed: 0", logger=logging)
+    assert summary["rows"] == len(lines) - 2 - 500
+    with open(output_path, "rb") as infile:
+        assert infile.read() == expected
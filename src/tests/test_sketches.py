@@ -0,0 +1,39 @@
+""" Test mergeable sketches in src."""
+import numpy as np
+
+from src.sketches import CategoryCounts, QuantileSketch
+
+
+def test_quantiles_exact_below_capacity_and_close_above() -> None:
+    """ Test quantiles equal numpy's for few values and stay close once values are compressed and merged.
+    :return: None
+    """
+    rng = np.random.default_rng(0)
+    few = rng.normal(size=9)
+    sketch = QuantileSketch(capacity=50).update(few)
+    for q in [0.0, 0.25, 0.5, 1.0]:
+        assert np.isclose(sketch.quantile(q), np.quantile(few, q))
+
+    values = rng.lognormal(size=20000)
+    chunks = [QuantileSketch(capacity=200).update(chunk) for chunk in np.array_split(values, 7)]
+    merged = chunks[0]
+    for chunk in chunks[1:]:
+        merged = merged.merge(chunk)
+    assert merged.count == values.size
+    assert len(merged.means) <= 200
+    for q in [0.1, 0.5, 0.9]:
+        assert abs(np.mean(values <= merged.quantile(q)) - q) < 0.01
+    assert np.allclose(merged.cdf(np.quantile(values, [0.1, 0.5, 0.9])), [0.1, 0.5, 0.9], atol=0.01)
+
+    restored = QuantileSketch.from_dict(merged.to_dict())
+    assert restored.quantile(0.5) == merged.quantile(0.5)
+
+
+def test_category_counts_merge_and_break_ties_on_smallest_code() -> None:
+    """ Test counts add up across chunks and the most frequent code is the one Preprocessor.fit picks.
+    :return: None
+    """
+    counts = CategoryCounts().update(np.array([3.0, 1.0, np.nan])).merge(CategoryCounts().update(np.array([3.0, 1.0])))
+    assert counts.counts == {1.0: 2, 3.0: 2}
+    assert counts.most_frequent() == 1.0
+    assert CategoryCounts.from_dict(counts.to_dict()).counts == counts.counts
@@ -0,0 +1,39 @@
+""" Test timing and caching of training stages in src."""
+import logging
+
+import pandas as pd
+
+from src.stages import StageCache, frame_fingerprint, stage_timer
+
+
+def test_cached_stage_skipped_until_inputs_or_params_change(tmp_path) -> None:
+    """ Test a stage runs once for given inputs and parameters, and again when one of them changes.
+    :return: None
+    """
+    calls = []
+
+    def stage() -> list:
+        calls.append(1)
+        return [len(calls)]
+
+    cache = StageCache(logger=logging, directory=str(tmp_path))
+    inputs = frame_fingerprint(pd.DataFrame({"LOAN": [1100, 1300]}))
+    first, first_key = cache.run("stage", stage, inputs=inputs, params={"k": 5})
+    second, second_key = cache.run("stage", stage, inputs=inputs, params={"k": 5})
+    assert (first, first_key) == (second, second_key) == ([1], first_key)
+
+    cache.run("stage", stage, inputs=inputs, params={"k": 3})
+    cache.run("stage", stage, inputs=frame_fingerprint(pd.DataFrame({"LOAN": [1100, 1500]})), params={"k": 5})
+    assert len(calls) == 3
+
+
+def test_stage_timer_reports_time_and_memory() -> None:
+    """ Test measures of a stage are reported under its name.
+    :return: None
+    """
+    report = {}
+    with stage_timer(logging, "allocate", report=report):
+        buffer = bytearray(10_000_000)
+    del buffer
+    assert report["allocate"]["seconds"] >= 0
+    assert report["allocate"]["peak_memory_mb"] >= 10
@@ -0,0 +1,19 @@
+""" Test the serving import path in ui."""
+import json
+import subprocess
+import sys
+
+TRAINING_MODULES = ["pandas", "sklearn", "imblearn", "joblib"]
+
+
+def test_app_imports_without_training_dependencies() -> None:
+    """ Test importing the app, as a fresh serving process does, loads none of the training dependencies.
+    :return: None
+    """
+    script = (
+        "import json, sys; import ui.app; "
+        f"print(json.dumps([name for name in {TRAINING_MODULES!r} if name in sys.modules]))"
+    )
+    output = subprocess.run([sys.executable, "-c", script], capture_output=True, check=True, text=True)
+
+    assert json.loads(output.stdout.splitlines()[-1]) == []
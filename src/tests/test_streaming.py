@@ -0,0 +1,67 @@
+""" Test streamed predictions of uploads in ui."""
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from ui.app import WARM_UP_CLIENT
+
+
+def _chunk(data: bytes) -> bytes:
+    """ One chunk of a chunked request body."""
+    return f"{len(data):x}\r\n".encode() + data + b"\r\n"
+
+
+def test_predictions_streamed_while_upload_is_read() -> None:
+    """ Test predictions of the first rows come back before the upload ends, and streamed clients are counted by the
+    router like batches.
+    :return: None
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "ui.app:app", "--port", str(port), "--log-level", "warning"],
+        env={**os.environ, "STREAM_CHUNK_SIZE": "2"}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    line = json.dumps(WARM_UP_CLIENT).encode() + b"\n"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            assert process.poll() is None and time.monotonic() < deadline
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/ready").status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            time.sleep(0.05)
+
+        with socket.create_connection(("127.0.0.1", port), timeout=10) as connection:
+            connection.sendall(
+                b"POST /predict_stream HTTP/1.1\r\nHost: test\r\nContent-Type: application/x-ndjson\r\n"
+                b"Transfer-Encoding: chunked\r\n\r\n" + _chunk(line * 2)
+            )
+            # The upload is not finished, the first chunk is already scored
+            response = b""
+            while b'"row": 1' not in response:
+                data = connection.recv(1 << 16)
+                assert data
+                response += data
+            assert b'"row": 0' in response and b" 200 " in response.split(b"\r\n")[0]
+
+            connection.sendall(_chunk(line) + b"0\r\n\r\n")
+            while not response.endswith(b"0\r\n\r\n"):
+                data = connection.recv(1 << 16)
+                assert data
+                response += data
+        assert b'"row": 2' in response
+
+        stats = httpx.get(f"http://127.0.0.1:{port}/stats").json()
+        assert stats["router"]["primary"]["requests"] == 3
+    finally:
+        process.terminate()
+        process.wait()
@@ -0,0 +1,38 @@
+""" Test training entry point in src."""
+import os
+
+import pytest
+from sklearn.svm import SVC
+
+from src.compiled_forest import compiled_forest_path
+from src.model import SVM, ExtraTrees, GradientBoosting, LogisticRegressionModel, RandomForest
+from src.train import load_model, train
+
+
+def test_train_model_without_n_jobs(tmp_path) -> None:
+    """ Test a model whose estimator has no n_jobs is trained, exported and served through train.
+    :return: None
+    """
+    model_path = str(tmp_path / "svm_model.sav")
+
+    train(model=SVM, model_path=model_path, random_state=0)
+
+    loaded = load_model(model_path)
+    assert isinstance(loaded.model.steps[-1][1], SVC)
+    assert os.path.dirname(loaded.path) != str(tmp_path)
+    assert not os.path.isfile(compiled_forest_path(loaded.path))
+
+
+@pytest.mark.parametrize("model", [ExtraTrees, RandomForest, GradientBoosting, LogisticRegressionModel, SVM])
+def test_train_every_model_with_class_weight(tmp_path, model) -> None:
+    """ Test every Model is trained through train with class weights instead of resampling, and then predicts.
+    :return: None
+    """
+    model_path = str(tmp_path / "model.sav")
+
+    train(model=model, model_path=model_path, random_state=0, rebalancing="class_weight")
+
+    estimator = load_model(model_path, compiled=False).model
+    estimator = estimator.steps[-1][1] if hasattr(estimator, "steps") else estimator
+    assert estimator.get_params()["class_weight"] == "balanced"
+    assert load_model(model_path).version
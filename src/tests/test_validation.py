@@ -0,0 +1,55 @@
+""" Test columnar validation of client records in src."""
+import numpy as np
+from pydantic import ValidationError
+
+from src.schema import Client
+from src.validation import CLIENT_VALIDATOR
+
+CLIENT = {
+    "loan": 2000, "mortdue": 25000.0, "value": 39025.0, "reason": 1, "job": 3, "yoj": 12.5, "derog": 0.0,
+    "delinq": 0.0, "clage": 95.366666667, "ninq": 1.0, "clno": 9.0, "debtinc": 1.3,
+}
+
+
+def test_columnar_validation_accepts_the_records_pydantic_accepts() -> None:
+    """ Test records of numbers, strings and invalid values get the same verdict as a Client, with per-row errors.
+    :return: None
+    """
+    changes = [
+        {}, {"loan": "2000"}, {"loan": 2000.0}, {"loan": 2000.5}, {"loan": None}, {"loan": ""}, {"loan": float("nan")},
+        {"yoj": "nan"}, {"yoj": " 1.5 "}, {"yoj": "abc"}, {"yoj": None}, {"reason": "1.0"}, {"reason": 4},
+        {"job": "x"}, {"job": [3]},
+    ]
+    without_job = {name: value for name, value in CLIENT.items() if name != "job"}
+    records = [dict(CLIENT, **change) for change in changes] + [without_job]
+    report = CLIENT_VALIDATOR.validate_records(records)
+
+    def accepted(record: dict) -> bool:
+        try:
+            Client(**record)
+            return True
+        except ValidationError:
+            return False
+
+    assert report.valid.tolist() == [accepted(record) for record in records]
+    errors = dict(report.errors)
+    assert errors[3] == "loan: Input should be a valid integer"
+    assert errors[12] == "reason: Input should be one of 1, 2, 3"
+    assert errors[15] == "job: Field required"
+    assert len(report.records()) == int(report.valid.sum())
+
+
+def test_numeric_columns_validated_at_once() -> None:
+    """ Test numpy columns are checked without records, missing columns fail every row.
+    :return: None
+    """
+    columns = {name: np.full(4, value, dtype=float) for name, value in CLIENT.items()}
+    columns["job"] = np.array([1, 6, 7, 2.5])
+    report = CLIENT_VALIDATOR.validate(columns)
+
+    assert report.valid.tolist() == [True, True, False, False]
+    assert [row for row, _ in report.errors] == [2, 3]
+    assert report.records()[1]["job"] == 6.0
+
+    del columns["debtinc"]
+    assert CLIENT_VALIDATOR.validate(columns).errors[0][1].startswith("debtinc: Field required")
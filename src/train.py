@@ -1,42 +1,59 @@
 """ Train model and see model evaluation metrics."""
 from __future__ import annotations
 
+import hashlib
 import logging
 import os
-from pathlib import Path
-from typing import TYPE_CHECKING, Tuple
+from typing import TYPE_CHECKING, Optional, Tuple
 
 import pandas as pd
-from joblib import load
 from sklearn.metrics import classification_report
+from sklearn.model_selection import train_test_split
 
+# Loaders of trained artifacts live in src.artifacts, which serving imports without training dependencies
+from src.artifacts import (  # noqa: F401
+    BASE_DIR, MODEL_PATH, load_decision_policy, load_model, load_preprocessor, model_registry,
+)
+from src.bundle import manifest_path, new_version, publish
+from src.dataset import INCREMENTS, Dataset
+from src.decision import DecisionPolicy, bad_probability, decision_path
+from src.drift import FeatureProfile, reference_path
 from src.features_generator import FeaturesGenerator
-from src.model import ExtraTrees
+from src.metrics import STAGE_LATENCY
+from src.model import ExtraTrees, compiled_forest_path
 from src.model_trainer import ModelTrainer
+from src.preprocessing import Preprocessor, preprocessor_path
+from src.stages import StageCache, frame_fingerprint, stage_timer
 
 if TYPE_CHECKING:
     import numpy as np
 
+    from src.decision import Decisions
     from src.model import Model
+    from src.model_registry import LoadedModel
 
-BASE_DIR = Path(__file__).resolve(strict=True).parent
+# Outputs of training stages, reused by the next runs on the same data with the same parameters
+STAGE_CACHE_DIR = os.path.join(BASE_DIR, "cache")
+# Columnar binary copies of the CSV datasets, converted on first use
+DATASET_DIR = os.path.join(STAGE_CACHE_DIR, "datasets")
 
 
-def load_and_split_data(filename: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
+def load_and_split_data(filename: str, dataset_dir: str = DATASET_DIR) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """ Split data in training set and test set.
 
+    Both sets are read from their columnar binary copies, memory-mapped: categorical features are already encoded and
+    the CSV files are only parsed again when they change. Newly labeled rows appended by src.incremental are added to
+    the training set. The content hash of each set is in the attrs of its dataframe.
+
     :param filename: filename to store training set and test set
+    :param dataset_dir: folder of the columnar binary copies
     :return: train_df, test_df as dataframes
     """
     folder = os.path.join(BASE_DIR, "data")
     train_path = os.path.join(folder, "train_df.csv")
     test_path = os.path.join(folder, "test_df.csv")
 
-    if os.path.isfile(train_path):
-        train_df = pd.read_csv(train_path, index_col=0)
-        test_df = pd.read_csv(test_path, index_col=0)
-
-    else:
+    if not os.path.isfile(train_path):
         data_df = pd.read_csv(filename)
 
         # 80/20 train/test split
@@ -46,16 +63,69 @@ def load_and_split_data(filename: str) -> Tuple[pd.DataFrame, pd.DataFrame]:
         # Store them to use always the same train_df, test_df for model benchmarking
         train_df.to_csv(os.path.join(folder, "train_df.csv"))
         test_df.to_csv(os.path.join(folder, "test_df.csv"))
+
+    train_df = Dataset.from_csv(train_path, dataset_dir, index_col=0, logger=logging).to_frame()
+    test_df = Dataset.from_csv(test_path, dataset_dir, index_col=0, logger=logging).to_frame()
+    segments = Dataset.load_segments(os.path.join(dataset_dir, INCREMENTS))
+    if segments:
+        hashes = [train_df.attrs["content_hash"], *(segment.content_hash for segment in segments)]
+        train_df = pd.concat([train_df, *(segment.to_frame() for segment in segments)], ignore_index=True)
+        train_df.attrs["content_hash"] = hashlib.sha256(",".join(hashes).encode()).hexdigest()
+        logging.info("%d appended segments added to the training set", len(segments))
     return train_df, test_df
 
 
+def export_compiled_forest(trained_model: Model, model_path: str) -> None:
+    """ Export the compiled forest of a trained model next to it, or remove a stale one if it cannot be compiled.
+
+    :param trained_model: trained Model object
+    :param model_path: path of the trained model
+    :return: None
+    """
+    forest_path = compiled_forest_path(model_path)
+    if trained_model.export_compiled(forest_path):
+        logging.info("Compiled forest exported to %s", forest_path)
+    elif os.path.isfile(forest_path):
+        # A forest compiled from a previous model must not be served instead of this one
+        os.remove(forest_path)
+        model_registry.unregister(forest_path)
+
+
+def publish_version(model_path: str, version_path: str) -> None:
+    """ Publish a version of a model whose artifacts are all exported, served processes switch to it.
+
+    :param model_path: path of the trained model
+    :param version_path: path of the model file in the version directory
+    :return: None
+    """
+    publish(model_path, version_path)
+    # This process serves the new version at once, not after the next check of the manifest
+    model_registry.unregister(manifest_path(model_path))
+    logging.info("Model %s published from %s", model_path, os.path.dirname(version_path))
+
+
 def train(
-    model: Model = ExtraTrees, model_path: str = os.path.join(BASE_DIR, "trained_models", "extraTrees_model.sav"),
+    model: Model = ExtraTrees, model_path: str = MODEL_PATH, n_jobs: int = -1, random_state: Optional[int] = None,
+    use_cache: bool = True, calibration_fraction: float = 0.2, beta: float = 1.0, review_recall: float = 0.95,
+    rebalancing: str = "smote",
 ) -> None:
     """ Train model and predict on test set to get evaluation metrics.
 
+    Preprocessed and resampled training data are cached in STAGE_CACHE_DIR, wall time and peak memory of each stage
+    are logged. A stratified calibration split is held out of the training data: the decision threshold is chosen on
+    its precision/recall curve and exported next to the model, with a profile of the training features to monitor
+    drift of served clients. Artifacts are written in a new version directory, published once all of them are.
+
     :param model: Model object
     :param model_path: path to store trained model
+    :param n_jobs: number of cores to fit the model and resample data, -1 for all of them
+    :param random_state: seed of resampling, None for a different sample each time the cache is empty
+    :param use_cache: False to run every stage again
+    :param calibration_fraction: share of the training data held out to choose the decision threshold
+    :param beta: weight of recall against precision, the threshold maximizes the F-beta score
+    :param review_recall: share of BAD clients of the calibration split above the review threshold
+    :param rebalancing: rebalancing of classes, one of features_generator.REBALANCING_MODES; "chunked_smote" and
+        "approximate_smote" need less memory than "smote" on large datasets, "class_weight" adds no row
     :return: None
     """
     logging.basicConfig(
@@ -64,51 +134,137 @@ def train(
         datefmt="%Y-%m-%d %H:%M",
         level=logging.INFO,
     )
+    cache = StageCache(logger=logging, directory=STAGE_CACHE_DIR, enabled=use_cache)
+    version_path = new_version(model_path)
 
-    train_df, test_df = load_and_split_data(
-        filename=os.path.join(BASE_DIR, "data", "hmeq.csv"),
-    )
+    with stage_timer(logging, "load"):
+        train_df, test_df = load_and_split_data(
+            filename=os.path.join(BASE_DIR, "data", "hmeq.csv"),
+        )
+        data_key = train_df.attrs.get("content_hash") or frame_fingerprint(train_df)
     logging.info(
         "data split: train_df = %d, test_df = %d",
         train_df.shape[0], test_df.shape[0]
     )
 
-    train_features = FeaturesGenerator(logger=logging, df=train_df)
-    train_features.generate(tasks=["feature_encoding", "impute_missing_values", "resampling"])
+    def preprocess() -> Tuple[Preprocessor, pd.DataFrame]:
+        # Imputation values are learned on the training set and exported to be reused for predictions
+        fitted = Preprocessor().fit(train_df, logger=logging)
+        return fitted, fitted.transform(train_df).assign(BAD=train_df["BAD"])
 
-    model_trainer = ModelTrainer(logger=logging)
-    model_trainer.train(
-        train_features=train_features.features,
-        train_labels=train_features.target,
-        model=model,
-        model_path=model_path,
-    )
-    # Predict
-    predictions = predict(test_df)
+    with stage_timer(logging, "preprocess"):
+        (preprocessor, preprocessed_df), preprocess_key = cache.run("preprocess", preprocess, inputs=data_key)
+        preprocessor.export(preprocessor_path(version_path))
+        # Served clients are compared with the raw training features, missing values included
+        FeatureProfile().update(preprocessor.encode(train_df)).export(reference_path(version_path))
+
+    def split() -> Tuple[pd.DataFrame, pd.DataFrame]:
+        return train_test_split(
+            preprocessed_df, test_size=calibration_fraction, stratify=preprocessed_df["BAD"],
+            random_state=random_state,
+        )
+
+    with stage_timer(logging, "split"):
+        (fit_df, calibration_df), split_key = cache.run(
+            "split", split, inputs=preprocess_key,
+            params={"calibration_fraction": calibration_fraction, "random_state": random_state},
+        )
+    logging.info("calibration split: fit = %d, calibration = %d", fit_df.shape[0], calibration_df.shape[0])
+
+    def resample() -> Tuple[pd.DataFrame, pd.Series]:
+        train_features = FeaturesGenerator(
+            logger=logging, df=fit_df, n_jobs=n_jobs, random_state=random_state, rebalancing=rebalancing,
+        )
+        train_features.generate(tasks=["resampling"])
+        return train_features.features, train_features.target
+
+    with stage_timer(logging, "resample"):
+        (features, target), _ = cache.run(
+            "resample", resample, inputs=split_key, params={"method": rebalancing, "random_state": random_state},
+        )
+
+    with stage_timer(logging, "fit"):
+        model_trainer = ModelTrainer(logger=logging)
+        trained_model = model_trainer.train(
+            train_features=features,
+            train_labels=target,
+            model=model,
+            model_path=version_path,
+            model_params={"n_jobs": n_jobs, **({"class_weight": "balanced"} if rebalancing == "class_weight" else {})},
+        )
+
+    with stage_timer(logging, "compile"):
+        export_compiled_forest(trained_model, version_path)
+
+    with stage_timer(logging, "calibrate"):
+        # Resampling changes class priors, the threshold is chosen on data with the real share of BAD clients
+        policy = DecisionPolicy.fit(
+            calibration_df["BAD"].to_numpy(),
+            bad_probability(trained_model.model, calibration_df.drop(columns="BAD")),
+            beta=beta, review_recall=review_recall,
+        )
+        policy.export(decision_path(version_path))
+        logging.info(
+            "Decision threshold %.3f, review threshold %.3f, calibration %s",
+            policy.threshold, policy.review_threshold, policy.calibration,
+        )
 
-    # Evaluation
-    logging.info(classification_report(y_true=test_df["BAD"], y_pred=predictions))
+    publish_version(model_path, version_path)
 
+    with stage_timer(logging, "evaluate"):
+        # Predict
+        predictions = predict(test_df, model=load_model(model_path))
 
-def predict(data_df: pd.DataFrame) -> np.ndarray:
+        # Evaluation
+        logging.info(classification_report(y_true=test_df["BAD"], y_pred=predictions))
+
+
+def predict(
+    data_df: pd.DataFrame, model: Optional[LoadedModel] = None, policy: Optional[DecisionPolicy] = None,
+) -> np.ndarray:
     """ Predict value "Bad" of client data as pandas dataframe.
 
     :param data_df: client data
+    :param model: loaded model to use, the default trained model if None
+    :param policy: decision policy, the one exported with the model if None
     :return: numpy ndarray containing predictions of model
     """
+    return predict_decisions(data_df, model=model, policy=policy).predictions
+
+
+def predict_decisions(
+    data_df: pd.DataFrame, model: Optional[LoadedModel] = None, policy: Optional[DecisionPolicy] = None,
+) -> Decisions:
+    """ Probability of "Bad", prediction and risk band of client data as pandas dataframe.
+
+    :param data_df: client data
+    :param model: loaded model to use, the default trained model if None
+    :param policy: decision policy, the one exported with the model if None
+    :return: decisions of the policy on the probabilities of the model
+    """
     if data_df.empty:
         logging.warning("Empty dataframe to predict")
-    features = FeaturesGenerator(logger=logging, df=data_df)
-    tasks = ["impute_missing_values"]
-    if data_df["REASON"].dtype != int or data_df["REASON"].dtype != int:
-        tasks.append("feature_encoding")
-    features.generate(tasks)
+    if model is None:
+        model = load_model()
 
-    with open(os.path.join(BASE_DIR, "trained_models", "extraTrees_model.sav"), "rb") as infile:
-        model = load(infile)
+    if policy is None:
+        policy = load_decision_policy(model.path)
+    preprocessor = load_preprocessor(model.path)
+    with STAGE_LATENCY.time(stage="features"):
+        if preprocessor is not None:
+            features = preprocessor.transform(data_df)
+        else:
+            # Model trained without exported preprocessor, statistics are computed on data to predict
+            generator = FeaturesGenerator(logger=logging, df=data_df)
+            tasks = ["impute_missing_values"]
+            if data_df["REASON"].dtype != int or data_df["REASON"].dtype != int:
+                tasks.append("feature_encoding")
+            generator.generate(tasks)
+            features = generator.features
 
-    predictions = model.predict(features.features)
-    return predictions
+    with STAGE_LATENCY.time(stage="predict"):
+        probabilities = bad_probability(model.model, features)
+    return policy.decide(probabilities)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,202 @@
+""" Columnar validation of client records, generated from the Client schema: one vectorized check per field."""
+from __future__ import annotations
+
+import operator
+from operator import itemgetter
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Sequence, Tuple, Type
+
+import numpy as np
+from pydantic import BaseModel
+
+from src.schema import CATEGORIES, Client
+
+# Constraints of pydantic fields, e.g. Field(ge=0), with the comparison a valid value passes
+_BOUNDS: Dict[str, Tuple[Callable, str]] = {
+    "gt": (operator.gt, "greater than"),
+    "ge": (operator.ge, "greater than or equal to"),
+    "lt": (operator.lt, "less than"),
+    "le": (operator.le, "less than or equal to"),
+}
+
+# Value of a field absent from a record
+_MISSING = object()
+
+
+class FieldRule(NamedTuple):
+    """ Checks of one field, derived from its type and constraints in the schema."""
+    name: str
+    integer: bool  # whole numbers only, as int fields; float fields accept NaN and infinite values as pydantic does
+    allowed: Optional[Tuple[float, ...]]  # codes of a categorical field, any value if None
+    bounds: Tuple[Tuple[str, float], ...]  # constraints, e.g. (("ge", 0),)
+
+
+class ValidationReport(NamedTuple):
+    """ Result of validating a batch of records, one entry per record in each array."""
+    columns: Dict[str, np.ndarray]  # values of each field as floats, undefined on invalid rows
+    valid: np.ndarray  # True for valid rows
+    errors: List[Tuple[int, str]]  # position of each invalid row and the message listing its invalid fields
+
+    def records(self) -> List[Dict[str, float]]:
+        """ Valid rows as client fields, ready to be scored.
+
+        :return: list of dictionaries, lowercase names as in Client
+        """
+        rows = np.flatnonzero(self.valid)
+        names = list(self.columns)
+        values = [self.columns[name][rows].tolist() for name in names]
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+
+def rules_from_schema(
+    model: Type[BaseModel] = Client, categories: Mapping[str, Sequence[int]] = CATEGORIES,
+) -> List[FieldRule]:
+    """ Checks of every field of a pydantic schema.
+
+    :param model: pydantic model of a client
+    :param categories: codes allowed for categorical fields, checked by field validators of the model
+    :return: one rule per field, in schema order
+    """
+    rules = []
+    for name, field in model.model_fields.items():
+        if field.annotation not in (int, float):
+            raise TypeError(f"Field {name} of {model.__name__} is {field.annotation}, only int and float are supported")
+        bounds = tuple(
+            (bound, getattr(constraint, bound)) for constraint in field.metadata for bound in _BOUNDS
+            if getattr(constraint, bound, None) is not None
+        )
+        allowed = tuple(float(code) for code in categories[name]) if name in categories else None
+        rules.append(FieldRule(name=name, integer=field.annotation is int, allowed=allowed, bounds=bounds))
+    return rules
+
+
+def _to_float(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """ Parse a column as floats, numbers and numeric strings are accepted.
+
+    :param values: column of any dtype
+    :return: floats, NaN where parsing failed, and True where parsing succeeded
+    """
+    if values.dtype.kind in "biuf":
+        return values.astype(float), np.ones(len(values), dtype=bool)
+    if values.dtype.kind in "US":
+        values = values.astype(object)
+    # None would become NaN, a valid float, pydantic rejects it
+    parsed = ~np.equal(values, None)
+    try:
+        return values.astype(float), parsed
+    except (TypeError, ValueError):
+        pass
+    # Some values are not numbers, locate them one by one
+    floats = np.full(len(values), np.nan)
+    for row, value in enumerate(values.tolist()):
+        if parsed[row]:
+            try:
+                floats[row] = float(value)
+            except (TypeError, ValueError):
+                parsed[row] = False
+    return floats, parsed
+
+
+class ColumnarValidator:
+    """ Validate whole columns of client fields at once, without building one pydantic object per record.
+
+    Checks are those of the schema: types (int fields take whole numbers, float fields any number), constraints of
+    the fields and codes of categorical fields. Strings are parsed as numbers, as pydantic does in lax mode; unlike
+    it, integer fields also accept strings in exponent notation, e.g. "1e3".
+    """
+
+    def __init__(self, rules: Sequence[FieldRule]) -> None:
+        """ Instantiate ColumnarValidator.
+
+        :param rules: checks of each field
+        """
+        self.rules = list(rules)
+
+    @classmethod
+    def from_schema(
+        cls, model: Type[BaseModel] = Client, categories: Mapping[str, Sequence[int]] = CATEGORIES,
+    ) -> ColumnarValidator:
+        """ Validator of the fields of a pydantic schema.
+
+        :param model: pydantic model of a client
+        :param categories: codes allowed for categorical fields
+        :return: validator
+        """
+        return cls(rules_from_schema(model, categories))
+
+    def validate(self, columns: Mapping[str, Any], rows: Optional[int] = None) -> ValidationReport:
+        """ Validate columns of client fields, e.g. of a dataframe or an Arrow table converted with to_numpy.
+
+        :param columns: values of each field, lowercase names as in Client; other columns are ignored
+        :param rows: number of rows, the length of the first column if None
+        :return: report of valid values and per-row errors
+        """
+        if rows is None:
+            rows = len(next(iter(columns.values()))) if columns else 0
+        values: Dict[str, np.ndarray] = {}
+        failures: List[Tuple[str, np.ndarray, str]] = []
+        for rule in self.rules:
+            if rule.name not in columns:
+                values[rule.name] = np.full(rows, np.nan)
+                failures.append((rule.name, np.ones(rows, dtype=bool), "Field required"))
+                continue
+            column = np.asarray(columns[rule.name])
+            absent = np.zeros(rows, dtype=bool)
+            if column.dtype == object:
+                absent = np.array([value is _MISSING for value in column.tolist()], dtype=bool)
+                if absent.any():
+                    failures.append((rule.name, absent, "Field required"))
+                    column = np.where(absent, None, column)
+            floats, parsed = _to_float(column)
+            if rule.integer:
+                with np.errstate(invalid="ignore"):
+                    parsed &= np.isfinite(floats) & (np.floor(floats) == floats)
+                failures.append((rule.name, ~parsed & ~absent, "Input should be a valid integer"))
+            else:
+                failures.append((rule.name, ~parsed & ~absent, "Input should be a valid number"))
+            values[rule.name] = floats
+            if rule.allowed is not None:
+                codes = ", ".join(str(int(code)) for code in rule.allowed)
+                failures.append((rule.name, parsed & ~np.isin(floats, rule.allowed), f"Input should be one of {codes}"))
+            for bound, limit in rule.bounds:
+                compare, text = _BOUNDS[bound]
+                with np.errstate(invalid="ignore"):
+                    failures.append((rule.name, parsed & ~compare(floats, limit), f"Input should be {text} {limit}"))
+
+        invalid = np.zeros(rows, dtype=bool)
+        for _, failed, _ in failures:
+            invalid |= failed
+        errors = [
+            (row, "; ".join(f"{name}: {message}" for name, failed, message in failures if failed[row]))
+            for row in np.flatnonzero(invalid).tolist()
+        ]
+        return ValidationReport(columns=values, valid=~invalid, errors=errors)
+
+    def validate_records(self, records: Sequence[Mapping[str, Any]]) -> ValidationReport:
+        """ Validate records, e.g. parsed from NDJSON or CSV lines, transposed to columns first.
+
+        :param records: client fields of each record, lowercase names as in Client
+        :return: report of valid values and per-row errors
+        """
+        names = [rule.name for rule in self.rules]
+        get_fields = itemgetter(*names)
+        try:
+            rows = list(map(get_fields, records))
+        except KeyError:
+            rows = None
+        # Common case, every field of every record is a number or a numeric string: parsed in one call
+        if rows is not None and not any(None in row for row in rows):
+            try:
+                matrix = np.array(rows, dtype=float).reshape(len(records), len(names))
+            except (TypeError, ValueError):
+                pass
+            else:
+                return self.validate({name: matrix[:, column] for column, name in enumerate(names)}, rows=len(records))
+        if rows is None:
+            rows = [tuple(record.get(name, _MISSING) for name in names) for record in records]
+        matrix = np.empty((len(records), len(names)), dtype=object)
+        matrix[:] = rows
+        return self.validate({name: matrix[:, column] for column, name in enumerate(names)}, rows=len(records))
+
+
+# Validator of Client records
+CLIENT_VALIDATOR = ColumnarValidator.from_schema()
@@ -1,21 +1,41 @@
 """ User interface to predict credit score of a client. """
 from __future__ import annotations
 
+import asyncio
 import logging
+import os
 import socket
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack, asynccontextmanager
 from pathlib import Path
-from typing import TypedDict
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, List, Tuple, TypedDict
 
-import pandas as pd
-from fastapi import FastAPI, Form, Request
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from pydantic import BaseModel, field_validator
-
-from src.train import predict
+from pydantic import ValidationError
+
+from src.artifacts import MODEL_PATH, load_decision_policy, load_drift_reference, load_explainer, model_registry
+from src.batch_scoring import StreamScorer, iter_chunks
+from src.batcher import MicroBatcher
+from src.decision import DecisionPolicy, Decisions
+from src.drift import DriftMonitor
+from src.inference import explain_fields
+from src.metrics import REGISTRY, STAGE_LATENCY
+from src.model_router import ModelRouter
+from src.prediction_cache import PredictionCache
+from src.preprocessing import CLIENT_FIELDS
+from src.schema import Client
+from ui import settings
+from ui.metrics import BATCH_SIZE, MetricsMiddleware, observe_validation, register_stats
+from ui.rendering import CachedStaticFiles, PageCache
+from ui.streaming import DuplexStreamingResponse, SpooledPipe
+
+if TYPE_CHECKING:
+    from src.model_registry import LoadedModel
 
 __version__ = "0.1.0"
 
@@ -27,58 +47,152 @@ logging.basicConfig(
     level=logging.INFO,
 )
 
-logging.info("Modal loaded, ready for serving")
-
-
-class Client(BaseModel):
-    """ Define model class that represent data's fields and their desired type."""
-    loan: int  # amount of the loan request
-    mortdue: float  # amount due on existing mortgage
-    value: float  # value of current property
-    reason: int  # 1'DebtCon' (debt consolidation), 2'HomeImp' (home improvement), 3'Other'
-    job: int  # 1'Other', 2'Office', 3'Sales', 4'Mgr', 5'ProfExe', 6'Self'
-    yoj: float  # years at present job
-    derog: float  # number of major derogatory reports
-    delinq: float  # number of delinquent credit lines
-    clage: float  # age of oldest trade line in months
-    ninq: float  # number of recent credit lines
-    clno: float  # number of credit lines
-    debtinc: float  # debt-to-income ratio
-
-    @field_validator("reason")
-    @classmethod
-    def validate_reason(cls, reason: int) -> int:
-        """ Data validation for reason attribute.
-
-        :param reason: integer value
-        :return: integer reason value
-        """
-        if reason not in [1, 2, 3]:
-            raise ValueError("reason should be between 1 and 3")
-        return reason
-
-    @field_validator("job")
-    @classmethod
-    def validate_job(cls, job: int) -> int:
-        """ Data validation for job attribute.
-
-        :param job: integer value
-        :return: integer job value
-        """
-        if job not in [1, 2, 3, 4, 5, 6]:
-            raise ValueError("job should be between 1 and 6")
-        return job
-
-
-app = FastAPI()
-
-
-# Mount the "static" folder to serve CSS and other static files
-app.mount(
-    "/static", StaticFiles(directory=f"{BASE_DIR}/static"), name="static")
-
-# Mount the "templates" folder to load HTML templates
+
+prediction_cache = PredictionCache(max_entries=settings.CACHE_MAX_ENTRIES, ttl_seconds=settings.CACHE_TTL_SECONDS)
+explanation_cache = PredictionCache(
+    max_entries=settings.EXPLAIN_CACHE_MAX_ENTRIES, ttl_seconds=settings.CACHE_TTL_SECONDS,
+)
+# Predictions of a replaced model are never served again, free their memory
+model_registry.add_listener(lambda previous, new: prediction_cache.clear())
+model_registry.add_listener(lambda previous, new: explanation_cache.clear())
+
+# Scored once at startup, before the app reports ready
+WARM_UP_CLIENT = {
+    "loan": 2000, "mortdue": 25000.0, "value": 39025.0, "reason": 1, "job": 3, "yoj": 12.5, "derog": 0.0,
+    "delinq": 0.0, "clage": 95.366666667, "ninq": 1.0, "clno": 9.0, "debtinc": 1.3,
+}
+
+router = ModelRouter(
+    logger=logging, primary_path=MODEL_PATH, candidate_path=settings.CANDIDATE_MODEL_PATH or None,
+    mode=settings.ROUTING_MODE, canary_fraction=settings.CANARY_FRACTION, max_queue_size=settings.SHADOW_QUEUE_SIZE,
+    threshold=settings.DECISION_THRESHOLD,
+)
+
+# Served clients are compared with the training set of the primary model
+drift_monitor = DriftMonitor(
+    logger=logging, reference=lambda: load_drift_reference(MODEL_PATH), window_rows=settings.DRIFT_WINDOW_ROWS,
+    interval_seconds=settings.DRIFT_INTERVAL_SECONDS, max_buffered_rows=settings.DRIFT_BUFFER_ROWS,
+)
+
+
+def decision_policy(model: LoadedModel) -> DecisionPolicy:
+    """ Decision policy of a model, with the threshold of the deployment if set.
+
+    :param model: loaded model
+    :return: decision policy
+    """
+    return load_decision_policy(model.path, threshold=settings.DECISION_THRESHOLD)
+
+
+def score_clients(payloads: List[dict]) -> List[Tuple[float, LoadedModel]]:
+    """ Score several clients with one model call, probabilities are cached for repeated requests.
+
+    :param payloads: list of validated client fields, not found in the prediction cache
+    :return: probability of BAD and the model which gave it, for each client
+    """
+    BATCH_SIZE.observe(len(payloads))
+    probabilities, model = router.score("primary", payloads)
+    results = []
+    for payload, probability in zip(payloads, probabilities.tolist()):
+        prediction_cache.put(prediction_cache.key(payload, model.version), probability)
+        results.append((probability, model))
+    return results
+
+
+batcher = MicroBatcher(
+    logger=logging, predict_batch=score_clients, max_batch_size=settings.BATCH_MAX_SIZE,
+    max_wait_ms=settings.BATCH_MAX_WAIT_MS, max_queue_size=settings.BATCH_MAX_QUEUE_SIZE,
+    max_concurrent_batches=settings.INFERENCE_WORKERS,
+)
+register_stats(batcher, prediction_cache)
+
+
+def preload() -> Tuple[LoadedModel, float]:
+    """ Load the models and their artifacts, warm them up and pre-load the templates.
+
+    Called by each process at startup, and by the prefork server before it forks its workers: they then inherit
+    everything loaded and only find it in memory.
+
+    :return: primary model and seconds taken to warm up the models
+    """
+    loaded = router.model("primary")
+    warm_up_seconds = router.warm_up([WARM_UP_CLIENT])
+    load_drift_reference(MODEL_PATH)
+    load_explainer(loaded)
+    pages.render("index.html")
+    templates.get_template("prediction.html")
+    return loaded, warm_up_seconds
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """ Load the models once when the app starts and warm them up, requests are then served from memory.
+
+    :param app: FastAPI application
+    """
+    app.state.ready = False
+    router.start()
+    drift_monitor.start()
+    # Resolved once, the lookup may block
+    app.state.hostname = socket.gethostname()
+    app.state.ip_address = socket.gethostbyname(app.state.hostname)
+    # Workers of ui.prefork each serve their own metrics, started after the fork
+    REGISTRY.set_constant_labels(worker=os.getpid())
+    app.state.inference_pool = ThreadPoolExecutor(max_workers=settings.INFERENCE_WORKERS, thread_name_prefix="inference")
+    app.state.admission = asyncio.Semaphore(settings.MAX_IN_FLIGHT)
+    await batcher.start(executor=app.state.inference_pool)
+    loaded, warm_up_seconds = preload()
+    app.state.ready = True
+    logging.info("Model %s loaded and warmed up in %.3f s, ready for serving", loaded.version, warm_up_seconds)
+    yield
+    # Readiness fails while shutting down, no new traffic is routed to this pod
+    app.state.ready = False
+    await batcher.stop()
+    app.state.inference_pool.shutdown(wait=True)
+    router.stop()
+    drift_monitor.stop()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MetricsMiddleware)
+
+
+@asynccontextmanager
+async def admitted(request: Request) -> AsyncIterator[None]:
+    """ Admission control: hold one of the MAX_IN_FLIGHT slots while a prediction request is processed.
+
+    :param request: Request object
+    """
+    semaphore = request.app.state.admission
+    try:
+        await asyncio.wait_for(semaphore.acquire(), timeout=settings.ADMISSION_TIMEOUT_MS / 1000)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Too many requests in flight") from None
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+async def run_inference(request: Request, function: Callable, *args: Any) -> Any:
+    """ Run CPU-bound work in the inference pool, the event loop keeps serving other requests.
+
+    :param request: Request object
+    :param function: function to run
+    :param args: arguments of the function
+    :return: result of the function
+    """
+    return await asyncio.get_running_loop().run_in_executor(request.app.state.inference_pool, function, *args)
+
+
+# Mount the "static" folder to serve CSS and other static files, cached by browsers
+static_files = CachedStaticFiles(directory=f"{BASE_DIR}/static", max_age=settings.STATIC_MAX_AGE_SECONDS)
+app.mount("/static", static_files, name="static")
+
+# Mount the "templates" folder to load HTML templates, pages do not depend on the request and are memoized
 templates = Jinja2Templates(directory=f"{BASE_DIR}/templates")
+templates.env.globals["static_url"] = lambda path: f"/static{static_files.versioned_path(path)}"
+pages = PageCache(templates.env, max_entries=settings.PAGE_CACHE_MAX_ENTRIES)
 
 
 @app.get("/", response_class=HTMLResponse)
@@ -88,15 +202,29 @@ def read_root(request: Request) -> TypedDict:
     :param request: Request object
     :return: root url content
     """
-    return templates.TemplateResponse("index.html", {"request": request, })
+    with STAGE_LATENCY.time(stage="render"):
+        return HTMLResponse(pages.render("index.html"))
+
+
+@app.get("/ready")
+def ready(request: Request) -> TypedDict:
+    """ Readiness probe: models loaded and warmed up.
+
+    :param request: Request object
+    :return: json response, status 503 until the app is ready
+    """
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse({"ready": False}, status_code=503)
+    return JSONResponse({"ready": True, "model_version": router.model("primary").version})
 
 
 @app.get('/cpu-intensive')
-def cpu_intensive() -> TypedDict:
+def cpu_intensive(request: Request) -> TypedDict:
     """ Multithreading which allows concurrent execution of multiple threads within a single process.
 
     Called to be able to test kubernetes autoscaling
 
+    :param request: Request object
     :return: json response
     """
     def cpu_task():
@@ -108,77 +236,282 @@ def cpu_intensive() -> TypedDict:
     thread.start()
     thread.join()  # Wait for the thread to complete
 
-    hostname = socket.gethostname()
-    ip_address = socket.gethostbyname(hostname)
     return JSONResponse({
         'message': 'CPU intensive task completed',
-        'hostname': hostname,
-        'ip_address': ip_address
+        'hostname': request.app.state.hostname,
+        'ip_address': request.app.state.ip_address,
     })
 
 
+async def score_client(request: Request, fields: dict) -> Tuple[float, LoadedModel]:
+    """ Score one client on the shared fast path: prediction cache, then micro-batcher or canary model.
+
+    :param request: Request object
+    :param fields: validated client fields
+    :return: probability of BAD and the model which gave it
+    """
+    # A client is always scored by the same model, canary clients are few and are not batched
+    role = router.pick(prediction_cache.key(fields, ""))
+    model = router.model(role)
+    probability = prediction_cache.get(prediction_cache.key(fields, model.version))
+    if probability is None:
+        async with admitted(request):
+            if role == "candidate":
+                probabilities, model = await run_inference(request, router.score, role, [fields], prediction_cache)
+                probability = probabilities.item(0)
+            else:
+                try:
+                    # Scored together with concurrent requests, by the model loaded when the batch runs
+                    probability, model = await batcher.submit(fields)
+                except asyncio.QueueFull:
+                    raise HTTPException(status_code=503, detail="Too many pending predictions") from None
+    router.mirror([fields], [probability])
+    drift_monitor.observe([fields])
+    return probability, model
+
+
 @app.post("/predict_with_ui", response_class=HTMLResponse, )
-def predict_with_ui(
-    request: Request, loan: int = Form(...), mortdue: float = Form(...),
-    value: float = Form(...), reason: int = Form(...), job: int = Form(...),
-    yoj: float = Form(...), derog: float = Form(...), delinq: float = Form(...),
-    clage: float = Form(...), ninq: float = Form(...), clno: float = Form(...), debtinc: float = Form(...)
-) -> TypedDict:  # sentence: str = Form(...)
+async def predict_with_ui(request: Request) -> HTMLResponse:
     """ Post method to predict credit score on user interface.
 
-    :param request: Request object
-    :param loan: amount of the loan
-    :param mortdue: amount due on existing mortgage
-    :param value: value of current property
-    :param reason: integer, 1 means 'DebtCon'(debt consolidation), 2 means 'HomeImp'(home improvement), 3 means 'Other'
-    :param job: integer, 1 means 'DebtCon' (debt consolidation), 2 means 'HomeImp' (home improvement), 3 means 'Other'
-    :param yoj: years at present job
-    :param derog: number of major derogatory reports
-    :param delinq: number of delinquent credit lines
-    :param clage: age of oldest trade line in months
-    :param ninq: number of recent credit lines
-    :param clno: number of credit lines
-    :param debtinc: debt-to-income ratio
-    :return: Json response
+    The form has the fields of Client: loan, mortdue, value, reason, job, yoj, derog, delinq, clage, ninq, clno and
+    debtinc. It is validated in one pass and scored like /predict_score_no_ui; the result page only depends on the
+    prediction, the rounded probability and the risk band, it is rendered once for each of them.
+
+    :param request: Request object, body is the submitted form
+    :return: HTML response
     """
     # Data validation
-    client = Client(
-        loan=loan, mortdue=mortdue, value=value, reason=reason, job=job,
-        yoj=yoj, derog=derog, delinq=delinq, clage=clage, ninq=ninq, clno=clno, debtinc=debtinc,
-    )
-    data = client.__dict__
-    data_df = pd.DataFrame([data], columns=data.keys())
-
-    # Column names are uppercase in training dataset
-    data_df.columns = map(str.upper, data_df.columns)
-    predictions = predict(data_df)
-    logging.info("predictions=%s, type=%s", predictions, type(predictions))
-    return templates.TemplateResponse(
-        "prediction.html",
-        {"request": request, "prediction": predictions.item(0)},
-    )
+    with STAGE_LATENCY.time(stage="validation"):
+        try:
+            fields = Client.model_validate(dict(await request.form())).__dict__
+        except ValidationError as error:
+            # Located in the body, as errors of JSON endpoints
+            errors = [dict(detail, loc=("body", *detail["loc"])) for detail in error.errors(include_url=False)]
+            raise RequestValidationError(errors) from None
+    probability, model = await score_client(request, fields)
+    prediction, risk_band = decision_policy(model).decide_one(probability)
+    logging.info("prediction=%s, probability=%.3f, model_version=%s", prediction, probability, model.version)
+    with STAGE_LATENCY.time(stage="render"):
+        page = pages.render(
+            "prediction.html", prediction=prediction, probability=round(probability, 3), risk_band=risk_band,
+        )
+    return HTMLResponse(page, headers={"X-Model-Version": model.version})
 
 
 @app.post("/predict_score_no_ui")
-async def predict_score_no_ui(data: Client) -> TypedDict:
+async def predict_score_no_ui(request: Request, data: Client) -> TypedDict:
     """ Predict credit score without user interface.
 
+    :param request: Request object
     :param data: Client instance
     :return: json response
     """
-    time.sleep(2)
-    hostname = socket.gethostname()
-    ip_address = socket.gethostbyname(hostname)
+    observe_validation(request)
+    if settings.ARTIFICIAL_LATENCY_MS > 0:
+        await asyncio.sleep(settings.ARTIFICIAL_LATENCY_MS / 1000)
+
+    probability, model = await score_client(request, data.__dict__)
+    prediction, risk_band = decision_policy(model).decide_one(probability)
+    logging.info("prediction=%s, probability=%.3f, model_version=%s", prediction, probability, model.version)
+    return JSONResponse(
+        {
+            "prediction": prediction,
+            "probability": probability,
+            "risk_band": risk_band,
+            "model_version": model.version,
+            'hostname': request.app.state.hostname,
+            'ip_address': request.app.state.ip_address,
+        },
+        headers={"X-Model-Version": model.version},
+    )
+
 
-    data = data.__dict__
-    data_df = pd.DataFrame([data], columns=data.keys())
+@app.get("/stats")
+def stats() -> TypedDict:
+    """ Get serving statistics of the worker process answering the request.
 
-    # Column names are uppercase in training dataset
-    data_df.columns = map(str.upper, data_df.columns)
-    predictions = predict(data_df)
-    logging.info("predictions=%s, type=%s", predictions, type(predictions))
+    :return: json response
+    """
     return JSONResponse({
-        "prediction": predictions.item(0),
-        'hostname': hostname,
-        'ip_address': ip_address,
+        "worker": os.getpid(), "batcher": batcher.stats(), "cache": prediction_cache.stats(), "router": router.stats(),
+        "pages": pages.stats(), "explanation_cache": explanation_cache.stats(),
     })
+
+
+@app.get("/drift")
+def drift() -> TypedDict:
+    """ Get drift of clients served by the worker process answering the request from the training set, updated with
+    the clients buffered so far.
+
+    :return: json response with the worker, the status, the worst PSI and the scores of each feature
+    """
+    return JSONResponse({"worker": os.getpid(), **drift_monitor.update()})
+
+
+@app.get("/metrics")
+def metrics() -> PlainTextResponse:
+    """ Get serving metrics in the Prometheus text format, to be scraped.
+
+    :return: text response
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/predict_batch")
+async def predict_batch(request: Request, data: List[Client]) -> TypedDict:
+    """ Predict credit score of a list of clients.
+
+    :param request: Request object
+    :param data: list of Client instances
+    :return: json response with one prediction, probability, risk band and model version per client, in the same
+        order, and the versions of the models used
+    """
+    observe_validation(request)
+    predictions, probabilities, risk_bands, versions = [], [], [], []
+    async with admitted(request):
+        for chunk in iter_chunks([client.__dict__ for client in data], chunk_size=settings.STREAM_CHUNK_SIZE):
+            # Each client gets the model it gets from /predict_score_no_ui
+            decisions, chunk_versions = await run_inference(request, router.decide, chunk, prediction_cache)
+            router.mirror(chunk, decisions.probabilities)
+            drift_monitor.observe(chunk)
+            predictions.extend(decisions.predictions.tolist())
+            probabilities.extend(decisions.probabilities.tolist())
+            risk_bands.extend(decisions.risk_bands.tolist())
+            versions.extend(chunk_versions)
+    model_version = ",".join(dict.fromkeys(versions)) or router.model("primary").version
+    return JSONResponse(
+        {
+            "predictions": predictions, "probabilities": probabilities, "risk_bands": risk_bands,
+            "model_version": model_version, "model_versions": versions,
+        },
+        headers={"X-Model-Version": model_version},
+    )
+
+
+def contributions_by_field(contributions: Any) -> dict:
+    """ Contributions of one client, by client field.
+
+    :param contributions: contributions of each feature, in the order of CLIENT_FIELDS
+    :return: dictionary of contributions, lowercase names as in Client
+    """
+    return dict(zip(CLIENT_FIELDS, contributions.tolist()))
+
+
+@app.post("/explain")
+async def explain(request: Request, data: Client) -> TypedDict:
+    """ Explain the prediction of a client: contribution of each field to its probability of BAD.
+
+    The client is explained by the model which scores it in /predict_score_no_ui. Probability is the bias, share of
+    BAD in the training set of the trees, plus the sum of contributions; positive contributions raise the risk.
+
+    :param request: Request object
+    :param data: Client instance
+    :return: json response with the prediction, probability, risk band, bias and contributions
+    """
+    observe_validation(request)
+    fields = data.__dict__
+    model = router.model(router.pick(prediction_cache.key(fields, "")))
+    async with admitted(request):
+        explanations = await run_inference(request, explain_fields, [fields], model, explanation_cache)
+    probability = explanations.probabilities.item(0)
+    prediction, risk_band = decision_policy(model).decide_one(probability)
+    return JSONResponse(
+        {
+            "prediction": prediction,
+            "probability": probability,
+            "risk_band": risk_band,
+            "bias": explanations.bias,
+            "contributions": contributions_by_field(explanations.contributions[0]),
+            "model_version": model.version,
+        },
+        headers={"X-Model-Version": model.version},
+    )
+
+
+@app.post("/explain_batch")
+async def explain_batch(request: Request, data: List[Client]) -> TypedDict:
+    """ Explain the predictions of a list of clients, with the primary model.
+
+    :param request: Request object
+    :param data: list of Client instances
+    :return: json response with one prediction, probability, risk band and contributions per client, in the same
+        order, and the bias
+    """
+    observe_validation(request)
+    model = router.model("primary")
+    policy = decision_policy(model)
+    predictions, probabilities, risk_bands, contributions = [], [], [], []
+    async with admitted(request):
+        for chunk in iter_chunks([client.__dict__ for client in data], chunk_size=settings.STREAM_CHUNK_SIZE):
+            explanations = await run_inference(request, explain_fields, chunk, model, explanation_cache)
+            decisions = policy.decide(explanations.probabilities)
+            predictions.extend(decisions.predictions.tolist())
+            probabilities.extend(decisions.probabilities.tolist())
+            risk_bands.extend(decisions.risk_bands.tolist())
+            contributions.extend(map(contributions_by_field, explanations.contributions))
+    return JSONResponse(
+        {
+            "predictions": predictions, "probabilities": probabilities, "risk_bands": risk_bands,
+            "bias": load_explainer(model).bias, "contributions": contributions, "model_version": model.version,
+        },
+        headers={"X-Model-Version": model.version},
+    )
+
+
+@app.post("/predict_stream")
+async def predict_stream(request: Request) -> StreamingResponse:
+    """ Predict credit score of clients uploaded as NDJSON or CSV, of any size.
+
+    The upload is read and predicted chunk by chunk, and predictions are sent while it is still being read: the first
+    rows come back once their chunk is scored. Predictions the client does not read yet are spooled to disk beyond a
+    few megabytes, memory stays flat whatever the upload size. Format is chosen by the Content-Type header: text/csv
+    for CSV, NDJSON otherwise. Scored clients are monitored for drift and mirrored in shadow mode like batches.
+
+    :param request: Request object, body is the upload
+    :return: streaming response with one line per uploaded client
+    """
+    fmt = "csv" if request.headers.get("content-type", "").startswith("text/csv") else "ndjson"
+    # Clients of an upload are not identified, one model is drawn for the whole upload
+    role = router.pick()
+    model = router.model(role)
+
+    def on_scored(records: List[dict], decisions: Decisions, seconds: float) -> None:
+        router.record(role, len(records), seconds)
+        router.mirror(records, decisions.probabilities)
+        drift_monitor.observe(records)
+
+    scorer = StreamScorer(
+        fmt=fmt, model=model, chunk_size=settings.STREAM_CHUNK_SIZE, policy=decision_policy(model), on_scored=on_scored,
+    )
+    pipe = SpooledPipe(max_size=settings.STREAM_SPOOL_MAX_BYTES)
+    # Admitted before the response starts, a 503 can still be returned
+    admission = AsyncExitStack()
+    await admission.enter_async_context(admitted(request))
+
+    async def produce() -> None:
+        try:
+            pipe.write(scorer.header())
+            async for data in request.stream():
+                pipe.write(await run_inference(request, scorer.feed, data))
+            pipe.write(await run_inference(request, scorer.close))
+            pipe.close()
+            logging.info("Streamed predictions of %d rows, model_version=%s", scorer.rows, model.version)
+        except Exception as error:  # noqa: BLE001
+            pipe.close(error)
+        finally:
+            await admission.aclose()
+
+    async def body() -> AsyncIterator[bytes]:
+        producer = asyncio.create_task(produce())
+        try:
+            async for data in pipe:
+                yield data
+        finally:
+            # The client went away: stop reading its upload
+            producer.cancel()
+
+    return DuplexStreamingResponse(
+        body(), media_type="text/csv" if fmt == "csv" else "application/x-ndjson",
+        headers={"X-Model-Version": model.version},
+    )
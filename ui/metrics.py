@@ -0,0 +1,101 @@
+""" Metrics of the serving app: latency per endpoint, requests in flight and batch sizes, scraped on /metrics."""
+from __future__ import annotations
+
+import time
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict
+
+from src.metrics import REGISTRY, SIZE_BUCKETS, STAGE_LATENCY, Counter, Gauge, Histogram
+
+if TYPE_CHECKING:
+    from fastapi import Request
+
+    from src.batcher import MicroBatcher
+    from src.prediction_cache import PredictionCache
+
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Duration of HTTP requests, until the whole response is sent.",
+    labelnames=["method", "endpoint", "status"],
+))
+IN_FLIGHT = REGISTRY.register(Gauge("http_requests_in_flight", "HTTP requests being processed."))
+BATCH_SIZE = REGISTRY.register(Histogram(
+    "prediction_batch_size", "Clients predicted by one model call of the micro-batcher.", buckets=SIZE_BUCKETS,
+))
+BATCH_QUEUE_DEPTH = REGISTRY.register(Gauge("prediction_batch_queue_depth", "Clients waiting for a micro-batch."))
+BATCH_REJECTED = REGISTRY.register(Counter(
+    "prediction_batch_rejected_total", "Clients rejected because the micro-batch queue was full.",
+))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "prediction_cache_lookups_total", "Lookups of the prediction cache, by result.", labelnames=["result"],
+))
+CACHE_ENTRIES = REGISTRY.register(Gauge("prediction_cache_entries", "Predictions held in the cache."))
+
+
+class MetricsMiddleware:
+    """ ASGI middleware timing each HTTP request and counting requests in flight.
+
+    Requests are labeled with the path template of their route, e.g. /predict_score_no_ui, "other" for requests
+    matching no route, so the number of series stays bounded.
+    """
+
+    def __init__(self, app: Callable[..., Awaitable[None]]) -> None:
+        """ Instantiate MetricsMiddleware.
+
+        :param app: ASGI application
+        """
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        # Read by observe_validation through request.state
+        scope.setdefault("state", {})["request_start"] = start
+        status = 500
+
+        async def send_with_status(message: Dict[str, Any]) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            IN_FLIGHT.dec()
+            endpoint = getattr(scope.get("route"), "path", "other")
+            REQUEST_LATENCY.observe(
+                time.perf_counter() - start, method=scope["method"], endpoint=endpoint, status=status,
+            )
+
+
+def observe_validation(request: Request) -> None:
+    """ Observe the validation stage of a JSON endpoint: reading, parsing and validating its body before it is called.
+
+    :param request: Request object, started in MetricsMiddleware
+    :return: None
+    """
+    start = getattr(request.state, "request_start", None)
+    if start is not None:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage="validation")
+
+
+def register_stats(batcher: MicroBatcher, cache: PredictionCache) -> None:
+    """ Read batcher and cache counters at each scrape.
+
+    :param batcher: micro-batcher of predictions
+    :param cache: cache of predictions
+    :return: None
+    """
+    def collect() -> None:
+        batcher_stats = batcher.stats()
+        BATCH_QUEUE_DEPTH.set(batcher_stats["queue_depth"])
+        BATCH_REJECTED.set(batcher_stats["rejected"])
+        cache_stats = cache.stats()
+        CACHE_LOOKUPS.set(cache_stats["hits"], result="hit")
+        CACHE_LOOKUPS.set(cache_stats["misses"], result="miss")
+        CACHE_ENTRIES.set(cache_stats["entries"])
+
+    REGISTRY.add_collector(collect)
@@ -0,0 +1,174 @@
+""" Prefork serving: models are loaded once by a parent process, which then forks workers serving the app.
+
+uvicorn --workers spawns fresh interpreters which each import the app and load their own copy of the models. Here
+the parent imports the app, loads and warms up every artifact and binds the listening socket, then forks: workers
+inherit the loaded objects copy-on-write and the compiled forest, memory-mapped read-only, is shared through the page
+cache. Each worker runs its own event loop, inference pool and micro-batcher, so predictions use one core per
+worker; the kernel spreads connections between workers accepting on the shared socket.
+
+Run from the repository root: python -m ui.prefork --host 0.0.0.0 --port 8000 --workers 4
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+from typing import TYPE_CHECKING, Dict, Optional
+
+import uvicorn
+
+from ui import settings
+
+if TYPE_CHECKING:
+    from types import FrameType
+
+
+class PreforkServer:
+    """ Fork workers serving the app on one socket, restart those which exit and stop them all on SIGTERM or SIGINT.
+
+    A worker exiting less than min_uptime seconds after it was forked is restarted after a pause of min_uptime
+    seconds, a worker failing at startup does not make the parent fork in a loop.
+    """
+
+    def __init__(
+        self, logger: logging.Logger, workers: int = 1, host: str = "127.0.0.1", port: int = 8000,
+        log_level: str = "info", backlog: int = 2048, min_uptime: float = 1.0,
+    ) -> None:
+        """ Instantiate PreforkServer.
+
+        :param logger: python logger
+        :param workers: number of worker processes
+        :param host: address to listen on
+        :param port: port to listen on, 0 for any free port
+        :param log_level: log level of uvicorn in workers
+        :param backlog: maximum number of connections waiting to be accepted
+        :param min_uptime: seconds a worker must live to be restarted at once
+        """
+        self.logger = logger
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.log_level = log_level
+        self.backlog = backlog
+        self.min_uptime = min_uptime
+        self.socket: Optional[socket.socket] = None
+        self._pids: Dict[int, float] = {}  # forked at, of each running worker
+        self._stopping = False
+
+    def bind(self) -> socket.socket:
+        """ Open the listening socket shared by workers.
+
+        :return: socket, its port is the one chosen by the system if port is 0
+        """
+        sock = socket.socket(socket.AF_INET6 if ":" in self.host else socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(self.backlog)
+        sock.set_inheritable(True)
+        self.socket = sock
+        self.port = sock.getsockname()[1]
+        return sock
+
+    def preload(self) -> None:
+        """ Import the app and load everything its workers need, before forking.
+        :return: None
+        """
+        from ui.app import preload
+
+        loaded, warm_up_seconds = preload()
+        self.logger.info("Model %s loaded and warmed up in %.3f s before forking", loaded.version, warm_up_seconds)
+        # Objects loaded so far are never collected: the garbage collector of workers does not write to their pages,
+        # which stay shared with the parent
+        gc.collect()
+        gc.freeze()
+
+    def spawn(self) -> int:
+        """ Fork one worker serving the app on the shared socket.
+
+        :return: pid of the worker
+        """
+        pid = os.fork()
+        if pid:
+            self._pids[pid] = time.monotonic()
+            return pid
+        exit_code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            from ui.app import app
+
+            config = uvicorn.Config(app, log_level=self.log_level, timeout_graceful_shutdown=30)
+            uvicorn.Server(config).run(sockets=[self.socket])
+        except BaseException:
+            self.logger.exception("Worker %d failed", os.getpid())
+            exit_code = 1
+        finally:
+            # Never return to the supervision loop of the parent
+            os._exit(exit_code)
+
+    def stop(self, signum: int, frame: Optional[FrameType] = None) -> None:
+        """ Forward a stop signal to workers, which finish their requests and shut down.
+
+        :param signum: signal received
+        :param frame: current stack frame
+        :return: None
+        """
+        self._stopping = True
+        for pid in list(self._pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def run(self) -> None:
+        """ Load the app, fork workers and supervise them until they all stopped.
+        :return: None
+        """
+        self.preload()
+        if self.socket is None:
+            self.bind()
+        self.logger.info("Serving on %s:%d with %d workers", self.host, self.port, self.workers)
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.workers):
+            self.spawn()
+        while self._pids:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            forked_at = self._pids.pop(pid, None)
+            if forked_at is None or self._stopping:
+                continue
+            self.logger.warning("Worker %d exited with code %d, restarting it", pid, os.waitstatus_to_exitcode(status))
+            if time.monotonic() - forked_at < self.min_uptime:
+                time.sleep(self.min_uptime)
+            if not self._stopping:
+                self.spawn()
+        self.socket.close()
+
+
+def main() -> None:
+    """ Serve the app with preforked workers.
+    :return: None
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", default=8000, type=int)
+    parser.add_argument("--workers", default=settings.WORKERS, type=int)
+    parser.add_argument("--log-level", default="info")
+    argument = parser.parse_args()
+    if not hasattr(os, "fork"):
+        sys.exit("Prefork serving needs os.fork, run uvicorn ui.app:app on this platform")
+    PreforkServer(
+        logger=logging, workers=argument.workers, host=argument.host, port=argument.port, log_level=argument.log_level,
+    ).run()
+
+
+if __name__ == "__main__":
+    main()
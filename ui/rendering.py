@@ -0,0 +1,120 @@
+""" Rendering of the user interface: pages memoized by their content, static files cached by browsers."""
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Dict, Hashable, Tuple
+from urllib.parse import parse_qs
+
+from fastapi.staticfiles import StaticFiles
+
+if TYPE_CHECKING:
+    from jinja2 import Environment
+    from starlette.responses import Response
+    from starlette.staticfiles import PathLike
+    from starlette.types import Scope
+
+
+class CachedStaticFiles(StaticFiles):
+    """ Static files with caching headers, for browsers and proxies.
+
+    Files are linked with a version query parameter, a digest of their content given by versioned_path: such URLs
+    never change content and are cached for max_age seconds without revalidation. Other URLs of the same files are
+    revalidated on each use with their ETag, answered with a 304 while the file is unchanged.
+    """
+
+    def __init__(self, *args: Any, max_age: int = 31536000, **kwargs: Any) -> None:
+        """ Instantiate CachedStaticFiles.
+
+        :param args: arguments of StaticFiles
+        :param max_age: seconds during which a versioned URL is cached
+        :param kwargs: keyword arguments of StaticFiles
+        """
+        super().__init__(*args, **kwargs)
+        self.max_age = max_age
+        self._versions: Dict[str, str] = {}
+
+    def versioned_path(self, path: str) -> str:
+        """ Path of a static file with the digest of its content, computed once per file.
+
+        :param path: path of the file relative to the static directory, e.g. /css/style.css
+        :return: path with a version query parameter
+        """
+        version = self._versions.get(path)
+        if version is None:
+            with open(os.path.join(str(self.directory), path.lstrip("/")), "rb") as infile:
+                version = hashlib.blake2b(infile.read(), digest_size=6).hexdigest()
+            self._versions[path] = version
+        return f"{path}?v={version}"
+
+    def file_response(
+        self, full_path: PathLike, stat_result: os.stat_result, scope: Scope, status_code: int = 200,
+    ) -> Response:
+        """ File response of StaticFiles, with ETag and Last-Modified, plus a Cache-Control header.
+
+        :param full_path: path of the file
+        :param stat_result: stat of the file
+        :param scope: ASGI scope of the request
+        :param status_code: status of the response
+        :return: file response, or 304 when the copy cached by the client is still valid
+        """
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if "v" in parse_qs(scope.get("query_string", b"").decode("latin-1")):
+            response.headers["Cache-Control"] = f"public, max-age={self.max_age}, immutable"
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        return response
+
+
+class PageCache:
+    """ Least recently used pages, rendered once for each template and context.
+
+    Pages only depend on their context, e.g. the rounded probability shown and the risk band of a prediction, so
+    the few distinct results of many clients are served without rendering templates again.
+    """
+
+    def __init__(self, environment: Environment, max_entries: int = 1024) -> None:
+        """ Instantiate PageCache.
+
+        :param environment: jinja environment of the templates
+        :param max_entries: maximum number of pages kept, 0 renders every page
+        """
+        self.environment = environment
+        self.max_entries = max_entries
+        self._pages: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, name: str, **context: Hashable) -> str:
+        """ Page of a template, rendered only if not cached.
+
+        :param name: name of the template
+        :param context: hashable template variables
+        :return: HTML
+        """
+        key: Tuple = (name, *sorted(context.items()))
+        with self._lock:
+            page = self._pages.get(key)
+            if page is not None:
+                self._pages.move_to_end(key)
+                self.hits += 1
+                return page
+            self.misses += 1
+        page = self.environment.get_template(name).render(**context)
+        if self.max_entries > 0:
+            with self._lock:
+                self._pages[key] = page
+                while len(self._pages) > self.max_entries:
+                    self._pages.popitem(last=False)
+        return page
+
+    def stats(self) -> Dict[str, int]:
+        """ Hits and misses of the cache.
+
+        :return: dictionary of counters
+        """
+        with self._lock:
+            return {"entries": len(self._pages), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,94 @@
+""" Serving settings, read from environment variables to be tuned per deployment."""
+from __future__ import annotations
+
+import os
+from typing import Optional
+
+
+def env_int(name: str, default: int) -> int:
+    """ Read an integer environment variable.
+
+    :param name: name of the variable
+    :param default: value if the variable is not set
+    :return: integer value
+    """
+    return int(os.environ.get(name, default))
+
+
+def env_float(name: str, default: float) -> float:
+    """ Read a float environment variable.
+
+    :param name: name of the variable
+    :param default: value if the variable is not set
+    :return: float value
+    """
+    return float(os.environ.get(name, default))
+
+
+def env_str(name: str, default: str) -> str:
+    """ Read a string environment variable.
+
+    :param name: name of the variable
+    :param default: value if the variable is not set
+    :return: string value
+    """
+    return os.environ.get(name, default)
+
+
+def env_optional_float(name: str) -> Optional[float]:
+    """ Read a float environment variable which may be unset.
+
+    :param name: name of the variable
+    :return: float value, None if the variable is not set or empty
+    """
+    value = os.environ.get(name)
+    return float(value) if value else None
+
+
+# Processes forked by python -m ui.prefork, each serving the app with the models loaded once before forking
+WORKERS = env_int("WORKERS", 1)
+
+# Serving path of the prediction endpoints: CPU-bound inference runs in a bounded thread pool, at most
+# MAX_IN_FLIGHT requests are admitted, others wait up to ADMISSION_TIMEOUT_MS then get a 503. Cores are shared
+# between WORKERS processes
+INFERENCE_WORKERS = env_int("INFERENCE_WORKERS", max(1, min(4, (os.cpu_count() or 1) // max(1, WORKERS))))
+MAX_IN_FLIGHT = env_int("MAX_IN_FLIGHT", 256)
+ADMISSION_TIMEOUT_MS = env_float("ADMISSION_TIMEOUT_MS", 1000.0)
+# Latency added to /predict_score_no_ui without blocking the event loop, e.g. 2000 for the autoscaling demo
+ARTIFICIAL_LATENCY_MS = env_float("ARTIFICIAL_LATENCY_MS", 0.0)
+
+# Micro-batching of /predict_score_no_ui requests
+BATCH_MAX_SIZE = env_int("BATCH_MAX_SIZE", 64)
+BATCH_MAX_WAIT_MS = env_float("BATCH_MAX_WAIT_MS", 2.0)
+BATCH_MAX_QUEUE_SIZE = env_int("BATCH_MAX_QUEUE_SIZE", 1024)
+
+# Cache of predictions of repeated clients, 0 entries disables it
+CACHE_MAX_ENTRIES = env_int("CACHE_MAX_ENTRIES", 10000)
+CACHE_TTL_SECONDS = env_float("CACHE_TTL_SECONDS", 300.0)
+# Cache of explanations of /explain and /explain_batch, same TTL, 0 entries disables it
+EXPLAIN_CACHE_MAX_ENTRIES = env_int("EXPLAIN_CACHE_MAX_ENTRIES", 10000)
+
+# Bulk predictions of /predict_batch and /predict_stream
+STREAM_CHUNK_SIZE = env_int("STREAM_CHUNK_SIZE", 1000)
+STREAM_SPOOL_MAX_BYTES = env_int("STREAM_SPOOL_MAX_BYTES", 8 * 1024 * 1024)
+
+# Probability of BAD above which a client is predicted BAD, overrides the threshold chosen at training when set
+DECISION_THRESHOLD = env_optional_float("DECISION_THRESHOLD")
+
+# Candidate model served next to the primary one: ROUTING_MODE "canary" scores CANARY_FRACTION of clients with it,
+# "shadow" scores every request again with it in a background thread to compare decisions, "off" ignores it
+CANDIDATE_MODEL_PATH = env_str("CANDIDATE_MODEL_PATH", "")
+ROUTING_MODE = env_str("ROUTING_MODE", "off")
+CANARY_FRACTION = env_float("CANARY_FRACTION", 0.0)
+SHADOW_QUEUE_SIZE = env_int("SHADOW_QUEUE_SIZE", 1024)
+
+# User interface: versioned static files are cached STATIC_MAX_AGE_SECONDS by browsers, PAGE_CACHE_MAX_ENTRIES
+# rendered result pages are memoized, 0 disables it
+STATIC_MAX_AGE_SECONDS = env_int("STATIC_MAX_AGE_SECONDS", 365 * 24 * 3600)
+PAGE_CACHE_MAX_ENTRIES = env_int("PAGE_CACHE_MAX_ENTRIES", 1024)
+
+# Drift monitoring: served clients are summarized every DRIFT_INTERVAL_SECONDS in windows of DRIFT_WINDOW_ROWS clients
+# and compared with the training set, at most DRIFT_BUFFER_ROWS clients wait in between, others are not monitored
+DRIFT_WINDOW_ROWS = env_int("DRIFT_WINDOW_ROWS", 10000)
+DRIFT_INTERVAL_SECONDS = env_float("DRIFT_INTERVAL_SECONDS", 30.0)
+DRIFT_BUFFER_ROWS = env_int("DRIFT_BUFFER_ROWS", 10000)
@@ -0,0 +1,92 @@
+""" Stream a response while the request body is still being read, e.g. predictions of an upload."""
+from __future__ import annotations
+
+import asyncio
+import os
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, Optional
+
+from starlette.requests import ClientDisconnect
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+
+class SpooledPipe:
+    """ Bytes written by a producer and sent by a consumer at its own pace, in memory up to max_size, on disk beyond.
+
+    The producer never waits for the consumer: a client which only reads the response once its upload is sent gets
+    it from the spool, instead of blocking the upload while the server waits for it to read.
+    """
+
+    def __init__(self, max_size: int, read_size: int = 1 << 16) -> None:
+        """ Instantiate SpooledPipe.
+
+        :param max_size: bytes kept in memory before spooling to disk
+        :param read_size: maximum number of bytes of each piece given to the consumer
+        """
+        self.read_size = read_size
+        self._file = SpooledTemporaryFile(max_size=max_size)
+        self._read_position = 0
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        self._available = asyncio.Event()
+
+    def write(self, data: bytes) -> None:
+        """ Append bytes for the consumer, from the event loop.
+
+        :param data: bytes
+        :return: None
+        """
+        if data:
+            self._file.seek(0, os.SEEK_END)
+            self._file.write(data)
+            self._available.set()
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        """ Mark the end of the bytes, the consumer stops once it has read them.
+
+        :param error: error raised to the consumer instead, when the producer failed
+        :return: None
+        """
+        self._closed = True
+        self._error = error
+        self._available.set()
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        """ Pieces of bytes in the order they were written, as soon as they are.
+
+        :return: async iterator of bytes
+        """
+        try:
+            while True:
+                self._file.seek(self._read_position)
+                data = self._file.read(self.read_size)
+                if data:
+                    self._read_position += len(data)
+                    yield data
+                elif self._closed:
+                    if self._error is not None:
+                        raise self._error
+                    return
+                else:
+                    self._available.clear()
+                    await self._available.wait()
+        finally:
+            self._file.close()
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """ Streaming response whose body iterator reads the request body while the response is sent.
+
+    On ASGI servers older than spec 2.4, StreamingResponse listens for the disconnection of the client by receiving
+    messages, which would consume the request body. This one leaves them to request.stream(), which raises
+    ClientDisconnect when the client goes away.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect() from None
+        if self.background is not None:
+            await self.background()